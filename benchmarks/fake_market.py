@@ -0,0 +1,133 @@
+"""Offline market data provider serving bars from recorded or synthetic fixtures.
+
+Fixtures are BAR_DTYPE arrays (the history store's own format) saved as
+<SYMBOL>_1d.npy. When served, their timestamps are shifted so the last bar
+falls on today, so period windows like '1y' always contain the whole fixture.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+import marketData
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DAY = 86400
+
+
+def synthetic_bars(symbol, days=504, seed=0):
+    """Deterministic geometric Brownian motion bars, used when no recorded fixture exists."""
+    rng = np.random.default_rng([seed, *symbol.encode()])
+    drift, vol = rng.uniform(-0.0002, 0.0008), rng.uniform(0.01, 0.03)
+    closes = rng.uniform(20, 400) * np.exp(np.cumsum(rng.normal(drift, vol, days)))
+    bars = np.empty(days, dtype=marketData.BAR_DTYPE)
+    bars['ts'] = np.arange(days, dtype='<i8') * DAY
+    bars['close'] = closes
+    bars['open'] = closes * (1 + rng.normal(0, vol / 4, days))
+    bars['high'] = np.maximum(bars['open'], closes) * (1 + np.abs(rng.normal(0, vol / 4, days)))
+    bars['low'] = np.minimum(bars['open'], closes) * (1 - np.abs(rng.normal(0, vol / 4, days)))
+    bars['volume'] = rng.integers(100_000, 10_000_000, days)
+    return bars
+
+
+def record(symbols, directory=FIXTURES_DIR, days=730):
+    """Download real daily bars for symbols into fixture files. Needs network access."""
+    os.makedirs(directory, exist_ok=True)
+    frames = marketData.YFinanceProvider().bars(list(symbols), '1d', start=time.time() - days * DAY)
+    saved = []
+    for symbol in symbols:
+        bars = marketData.frame_to_bars(frames.get(symbol))
+        if len(bars):
+            np.save(os.path.join(directory, f"{symbol}_1d.npy"), bars)
+            saved.append(symbol)
+    return saved
+
+
+def write_replay(directory, symbols, minutes=390, seed=0):
+    """Write a replay recording: the fixtures' daily bars plus a synthetic session of minute quotes.
+
+    Quotes follow a random walk from each symbol's last close, starting at the
+    last fixture bar. Returns the number of quotes written.
+    """
+    market = FakeMarket(symbols, seed=seed)
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(directory, 'bars'), exist_ok=True)
+    start = None
+    columns = []
+    for symbol, bars in market.bars_by_symbol.items():
+        np.save(os.path.join(directory, 'bars', f"{symbol}_1d.npy"), bars)
+        start = int(bars['ts'][-1]) if start is None else max(start, int(bars['ts'][-1]))
+        columns.append(bars['close'][-1] * np.exp(np.cumsum(rng.normal(0, 0.0005, minutes))))
+    times = start + np.arange(minutes) * 60
+    with open(os.path.join(directory, 'quotes.csv'), 'w') as f:
+        for i, ts in enumerate(times):
+            for symbol, prices in zip(market.bars_by_symbol, columns):
+                f.write(f"{ts},{symbol},{prices[i]:.4f}\n")
+    with open(os.path.join(directory, 'news.jsonl'), 'w') as f:
+        for symbol in market.bars_by_symbol:
+            f.write(json.dumps({'ts': start, 'symbol': symbol, 'title': f"{symbol} opens the session"}) + '\n')
+    return minutes * len(columns)
+
+
+class FakeMarket(marketData.MarketDataProvider):
+    """Serves fixture bars as a market data provider, with timestamps ending today."""
+
+    name = 'fake'
+    def __init__(self, symbols, directory=FIXTURES_DIR, seed=0):
+        self.bars_by_symbol = {}
+        self.recorded = 0
+        today = int(time.time()) // DAY * DAY
+        for symbol in symbols:
+            path = os.path.join(directory, f"{symbol}_1d.npy")
+            if os.path.exists(path):
+                bars = np.load(path)
+                self.recorded += 1
+            else:
+                bars = synthetic_bars(symbol, seed=seed)
+            bars = bars.copy()
+            bars['ts'] += today - bars['ts'][-1]
+            self.bars_by_symbol[symbol] = bars
+        self.calls = 0
+
+    @property
+    def source(self):
+        if self.recorded == len(self.bars_by_symbol):
+            return 'recorded'
+        return 'synthetic' if self.recorded == 0 else 'mixed'
+
+    def bars(self, symbols, interval='1d', start=None, end=None):
+        self.calls += 1
+        frames = {}
+        for symbol in symbols:
+            bars = self.bars_by_symbol.get(symbol)
+            if bars is None or interval != '1d':
+                continue
+            mask = np.ones(len(bars), dtype=bool)
+            if start is not None:
+                mask &= bars['ts'] >= start
+            if end is not None:
+                mask &= bars['ts'] < end
+            if mask.any():
+                frames[symbol] = marketData.bars_to_frame(bars[mask])
+        return frames
+
+    def quote(self, symbol):
+        bars = self.bars_by_symbol.get(symbol)
+        return None if bars is None else round(float(bars['close'][-1]), 2)
+
+    def quotes(self, symbols):
+        return {symbol: price for symbol in symbols if (price := self.quote(symbol)) is not None}
+
+    def info(self, symbol):
+        return {'symbol': symbol, 'shortName': symbol} if symbol in self.bars_by_symbol else None
+
+    def news(self, symbol, count=5):
+        return []
+
+    def prices(self):
+        return {symbol: self.quote(symbol) for symbol in self.bars_by_symbol}
+
+    def install(self):
+        """Make this the process-wide market data provider."""
+        marketData.set_provider(self)
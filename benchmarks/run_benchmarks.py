@@ -0,0 +1,269 @@
+"""Micro-benchmarks for database.py and the logicFile analytics.
+
+Runs fully offline: the database is synthetic and market data comes from
+fake_market, either directly or replayed through marketData.ReplayProvider. Results are written as JSON, and a previous results file can be
+passed with --baseline to fail the run (exit code 1) on regressions. The run
+also fails if EXPLAIN QUERY PLAN shows an indexed query no longer using its index.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --users 1000 --positions 20000 --trades 200000
+    python benchmarks/run_benchmarks.py --baseline cache/benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --record-fixtures AAPL MSFT   # needs network
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'cache', 'benchmarks')
+DB_CACHE_DIR = os.path.join(RESULTS_DIR, 'db')
+
+# Everything the bot would write lives in a scratch directory, so the real
+# database, history store and rates file are never touched
+WORK_DIR = tempfile.mkdtemp(prefix='bench-')
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'user_data.db')
+os.environ['HISTORY_DIR'] = os.path.join(WORK_DIR, 'history')
+os.environ['RATES_FILE'] = os.path.join(WORK_DIR, 'rates.json')
+os.environ['CONSTITUENTS_DIR'] = os.path.join(WORK_DIR, 'constituents')
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+import database as db
+import synthetic_db
+
+DEFAULT_METRIC_SYMBOLS = ['AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOGL', 'META', 'TSLA', 'JPM', 'XOM', 'KO']
+
+
+def timed(fn, args_list, warmup=2):
+    """Call fn once per args tuple and return per-call timings in milliseconds."""
+    for args in args_list[:warmup]:
+        fn(*args)
+    times = []
+    for args in args_list[warmup:]:
+        start = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summarize(times):
+    ordered = sorted(times)
+    return {
+        'n': len(ordered),
+        'min_ms': round(ordered[0], 4),
+        'median_ms': round(statistics.median(ordered), 4),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        'mean_ms': round(statistics.fmean(ordered), 4),
+    }
+
+
+def database_benchmarks(args, rng):
+    """Time the hot database.py functions against a synthetic database."""
+    cached = os.path.join(DB_CACHE_DIR, f"users{args.users}-pos{args.positions}-trades{args.trades}"
+                                        f"-done{args.completed_trades}-seed{args.seed}.db")
+    if args.rebuild or not os.path.exists(cached):
+        print(f"Building synthetic database at {cached}...")
+        start = time.perf_counter()
+        synthetic_db.build(cached, args.users, args.positions, args.trades, args.completed_trades, args.seed)
+        print(f"  built in {time.perf_counter() - start:.1f}s")
+    synthetic_db.working_copy(cached, os.environ['DATABASE_PATH'])
+
+    n = args.repeat + 2
+    prices = {symbol: round(rng.uniform(5, 500), 2) for symbol in synthetic_db.load_symbols()}
+    users = [(rng.randint(1, args.users),) for _ in range(n)]
+    held = db.get_connection().execute(
+        'SELECT user_id, symbol FROM portfolios ORDER BY RANDOM() LIMIT ?', (n,)).fetchall()
+    symbols = list(prices)
+    # Cursors about 100 trades deep, to show deep pages cost the same as the first
+    deep_cursors = []
+    for user_id, in users:
+        row = db.get_connection().execute('''
+            SELECT timestamp, id FROM trades WHERE user_id = ?
+            ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET 100''', (user_id,)).fetchone()
+        deep_cursors.append((user_id, 10, row))
+
+    # Minute-spaced snapshots of every user, ending now, so the history reads below have rows
+    now = int(time.time())
+    snapshot_times = [(prices, now - (n - i) * 60) for i in range(n)]
+
+    return {
+        'db.get_leaderboard': timed(db.get_leaderboard, [(prices, 5, 0)] * n),
+        'db.get_trade_history': timed(db.get_trade_history, users),
+        'db.get_trade_history_page': timed(db.get_trade_history_page, [(user_id, 10) for user_id, in users]),
+        'db.get_trade_history_page_deep': timed(db.get_trade_history_page, deep_cursors),
+        'db.get_user_trade_stats': timed(db.get_user_trade_stats, users),
+        'db.get_best_trades': timed(db.get_best_trades, [(user_id, 5) for user_id, in users]),
+        'db.add_to_portfolio': timed(db.add_to_portfolio, [
+            (user_id, rng.choice(symbols), 1.0, round(rng.uniform(5, 500), 2)) for user_id, in users]),
+        # Synthetic positions hold at least one share, so a small sale always succeeds
+        'db.sell_from_portfolio': timed(db.sell_from_portfolio, [
+            (user_id, symbol, 0.01, prices[symbol]) for user_id, symbol in held]),
+        'db.record_networth_snapshot': timed(db.record_networth_snapshot, snapshot_times),
+        'db.get_networth_history': timed(db.get_networth_history, [(user_id, now - 86400) for user_id, in users]),
+    }
+
+
+def market_benchmarks(args, market):
+    """Time the logicFile metrics on fixture prices, after one cold call fills the history store."""
+    import logicFile
+
+    symbols = [(symbol,) for symbol in args.symbols]
+    calls = (symbols * (args.repeat // len(symbols) + 1))[:args.repeat]
+    results = {}
+    for name in ('annualized_return', 'annualized_volatility', 'get_Sharpe_ratio', 'investment_advice'):
+        results[f"logicFile.{name}"] = timed(getattr(logicFile, name), symbols + calls, warmup=len(symbols))
+    if market.calls > len(symbols):
+        print(f"Warning: the history store downloaded {market.calls} times for {len(symbols)} symbols")
+    return results
+
+
+def replay_benchmarks(args):
+    """Time bulk and single quotes through yfinanceMain against a replay recording."""
+    import fake_market
+    import marketData
+    import yfinanceMain as yfMain
+
+    directory = os.path.join(WORK_DIR, 'replay')
+    fake_market.write_replay(directory, args.symbols, seed=args.seed)
+    # One recorded session per wall-clock minute, so the clock moves while the benchmark runs
+    marketData.set_provider(marketData.ReplayProvider(directory, speed=390))
+    symbols = [(symbol,) for symbol in args.symbols]
+    calls = (symbols * (args.repeat // len(symbols) + 1))[:args.repeat]
+    results = {
+        'replay.get_bulk_stock_prices': timed(yfMain.get_bulk_stock_prices,
+                                              [(args.symbols, 100, False)] * (args.repeat + 2)),
+        'replay.fetch_stock_price': timed(yfMain._fetch_stock_price, symbols[:2] + calls),
+    }
+    median = statistics.median(results['replay.get_bulk_stock_prices'])
+    print(f"Replay serves about {len(args.symbols) / median * 1000:,.0f} quotes/s through get_bulk_stock_prices")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Benchmarks whose median got slower than baseline by more than threshold (and min_delta_ms)."""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        before, after = base['median_ms'], stats['median_ms']
+        if after > before * (1 + threshold) and after - before > min_delta_ms:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--positions', type=int, default=200_000)
+    parser.add_argument('--trades', type=int, default=2_000_000)
+    parser.add_argument('--completed-trades', type=int, default=None,
+                        help='rows in trade_analytics (default: half of --trades)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=50, help='timed calls per benchmark')
+    parser.add_argument('--symbols', nargs='+', default=DEFAULT_METRIC_SYMBOLS,
+                        help='symbols for the logicFile metrics')
+    parser.add_argument('--only', choices=('db', 'market'), help='run just one group')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the cached synthetic database')
+    parser.add_argument('--output', help='results file (default: cache/benchmarks/<timestamp>.json)')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fail if a median is this much slower than the baseline (default 0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='ignore slowdowns smaller than this, to absorb timer noise')
+    parser.add_argument('--record-fixtures', nargs='+', metavar='SYMBOL',
+                        help='download real bars for these symbols into benchmarks/fixtures and exit')
+    args = parser.parse_args()
+    if args.completed_trades is None:
+        args.completed_trades = args.trades // 2
+
+    if args.record_fixtures:
+        import fake_market
+        saved = fake_market.record(args.record_fixtures)
+        print(f"Recorded fixtures for: {', '.join(saved) or 'nothing'}")
+        return 0
+
+    rng = random.Random(args.seed)
+    plan_problems = []
+    timings, meta = {}, {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': db.sqlite3.sqlite_version,
+        'repeat': args.repeat,
+    }
+    if args.only in (None, 'db'):
+        meta['scale'] = {'users': args.users, 'positions': args.positions, 'trades': args.trades,
+                         'completed_trades': args.completed_trades, 'seed': args.seed}
+        timings.update(database_benchmarks(args, rng))
+        meta['schema_version'] = db.get_schema_version()
+        plan_problems = db.check_query_plans()
+        meta['query_plan_problems'] = {name: plan for name, plan in plan_problems}
+    if args.only in (None, 'market'):
+        import fake_market
+        with open(os.environ['RATES_FILE'], 'w') as f:
+            json.dump({'rates': {'13w': 0.04}, 'updated_at': time.time()}, f)
+        market = fake_market.FakeMarket(args.symbols, seed=args.seed)
+        market.install()
+        meta['fixtures'] = market.source
+        timings.update(market_benchmarks(args, market))
+        timings.update(replay_benchmarks(args))
+    db.close_connections()
+
+    results = {name: summarize(times) for name, times in timings.items()}
+    print(f"\n{'benchmark':<34}{'median ms':>12}{'p95 ms':>12}{'min ms':>12}")
+    for name, stats in results.items():
+        print(f"{name:<34}{stats['median_ms']:>12.3f}{stats['p95_ms']:>12.3f}{stats['min_ms']:>12.3f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if plan_problems:
+        print("\nQueries not using their index:")
+        for name, plan in plan_problems:
+            print(f"  {name}: {'; '.join(plan)}")
+        return 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('scale') != meta.get('scale'):
+            print("Warning: baseline was run at a different scale; comparisons may not be meaningful")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for name, before, after in regressions:
+                print(f"  {name}: {before:.3f} ms -> {after:.3f} ms ({(after / before - 1) * 100:+.0f}%)")
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
@@ -0,0 +1,117 @@
+"""Build a synthetic user_data.db at a configurable scale for the benchmarks."""
+import json
+import os
+import random
+import shutil
+from datetime import datetime, timedelta
+
+import database as db
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(db.__file__)), 'data', 'index_constituents.json')
+BATCH_SIZE = 50_000
+
+
+def load_symbols():
+    with open(SNAPSHOT_PATH) as f:
+        return json.load(f)['sp500']
+
+
+def use_database(path):
+    """Point database.py at another file, closing this thread's current connection."""
+    db.close_connections()
+    db.DB_PATH = path
+    db.init_db()
+
+
+def _batched(rows, c, sql):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            c.executemany(sql, batch)
+            batch = []
+    if batch:
+        c.executemany(sql, batch)
+
+
+def build(path, users, positions, trades, completed_trades, seed=0):
+    """Create a database at path with the given number of rows per table.
+
+    Positions are spread evenly across users (at most one per user and
+    symbol), trades and completed trades are spread randomly over users,
+    symbols and the last two years. The same seed always gives the same data.
+    """
+    rng = random.Random(seed)
+    symbols = load_symbols()
+    per_user = min(-(-positions // users), len(symbols))
+    now = datetime.now()
+    span = int(timedelta(days=730).total_seconds())
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    use_database(path)
+
+    def user_rows():
+        for user_id in range(1, users + 1):
+            funds = round(rng.uniform(1_000, 100_000), 2)
+            yield (user_id, f"user{user_id}", now - timedelta(days=rng.randint(0, 730)),
+                   round(funds * rng.uniform(0.2, 1.0), 2), funds)
+
+    def position_rows():
+        remaining = positions
+        for user_id in range(1, users + 1):
+            for symbol in rng.sample(symbols, min(per_user, remaining)):
+                shares = round(rng.uniform(1, 500), 4)
+                entry_price = round(rng.uniform(5, 500), 2)
+                yield (user_id, symbol, shares, entry_price, shares * entry_price)
+            remaining -= min(per_user, remaining)
+            if remaining == 0:
+                return
+
+    def trade_rows():
+        for _ in range(trades):
+            yield (rng.randint(1, users), rng.choice(symbols), rng.choice(('buy', 'sell')),
+                   round(rng.uniform(0.1, 100), 4), round(rng.uniform(5, 500), 2),
+                   now - timedelta(seconds=rng.randrange(span)))
+
+    def completed_trade_rows():
+        for _ in range(completed_trades):
+            shares = round(rng.uniform(0.1, 100), 4)
+            entry_price = round(rng.uniform(5, 500), 2)
+            sell_price = round(entry_price * rng.uniform(0.5, 1.6), 2)
+            profit_loss = (sell_price - entry_price) * shares
+            yield (rng.randint(1, users), rng.choice(symbols), entry_price, sell_price, shares,
+                   profit_loss, profit_loss / (entry_price * shares) * 100,
+                   now - timedelta(seconds=rng.randrange(span)))
+
+    conn = db.get_connection()
+    conn.execute('PRAGMA synchronous=OFF')
+    with db.transaction() as c:
+        _batched(user_rows(), c, '''
+            INSERT INTO users (user_id, username, join_date, total_funds, starting_funds)
+            VALUES (?, ?, ?, ?, ?)''')
+        _batched(position_rows(), c, '''
+            INSERT INTO portfolios (user_id, symbol, shares, entry_price, total_invested)
+            VALUES (?, ?, ?, ?, ?)''')
+        _batched(trade_rows(), c, '''
+            INSERT INTO trades (user_id, symbol, action, shares, price, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)''')
+        _batched(completed_trade_rows(), c, '''
+            INSERT INTO trade_analytics (user_id, symbol, entry_price, sell_price, shares,
+                                         profit_loss, profit_loss_pct, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''')
+    db.rebuild_trade_stats()
+    conn.execute('ANALYZE')
+    # Closing the last connection checkpoints the WAL into the main file
+    db.close_connections()
+
+
+def working_copy(source, target):
+    """Copy a built database to target so benchmarks that write never touch the cached build."""
+    db.close_connections()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    shutil.copyfile(source, target)
+    use_database(target)
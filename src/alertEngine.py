@@ -0,0 +1,155 @@
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+Alert = namedtuple('Alert', ['id', 'user_id', 'symbol', 'kind', 'threshold', 'base_price'])
+
+ALERT_KINDS = ('above', 'below', 'move')
+
+
+def trigger_levels(alert):
+    """Price levels an alert fires at as (upper, lower); either may be None.
+
+    'above' fires when the price reaches threshold or higher, 'below' when it
+    reaches threshold or lower, and 'move' when it moves threshold percent
+    either way from base_price.
+    """
+    if alert.kind == 'above':
+        return alert.threshold, None
+    if alert.kind == 'below':
+        return None, alert.threshold
+    if alert.kind == 'move':
+        change = alert.base_price * alert.threshold / 100
+        return alert.base_price + change, alert.base_price - change
+    raise ValueError(f"unknown alert kind: {alert.kind}")
+
+
+def already_met(kind, threshold, price):
+    """True if an 'above'/'below' alert at threshold would fire on price straight away.
+
+    Alerts only notify about a cross, so these are refused when created.
+    """
+    if kind == 'above':
+        return price >= threshold
+    if kind == 'below':
+        return price <= threshold
+    return False
+
+
+class AlertEngine:
+    """Per-symbol sorted trigger levels so each price tick costs O(log n + k).
+
+    For every symbol, two lists are sorted so that the alerts a tick fires
+    always form a tail slice. Upper levels are stored negated, so every level
+    at or below the price sorts to the end. Lower levels are stored as-is, so
+    every level at or above the price sorts to the end. A tick is then one
+    bisect per list plus removing the k fired entries from the end.
+    """
+
+    def __init__(self):
+        self._upper = {}  # symbol -> sorted [(-level, alert_id)]
+        self._lower = {}  # symbol -> sorted [(level, alert_id)]
+        self._alerts = {}  # alert_id -> Alert
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """Replace all alerts with rows of (id, user_id, symbol, kind, threshold, base_price)."""
+        with self._lock:
+            self._upper, self._lower, self._alerts = {}, {}, {}
+            for row in rows:
+                self._add(Alert(*row))
+
+    def _add(self, alert):
+        # Caller must hold the lock
+        upper, lower = trigger_levels(alert)
+        self._alerts[alert.id] = alert
+        if upper is not None:
+            insort(self._upper.setdefault(alert.symbol, []), (-upper, alert.id))
+        if lower is not None:
+            insort(self._lower.setdefault(alert.symbol, []), (lower, alert.id))
+
+    def add(self, alert):
+        with self._lock:
+            self._add(alert)
+
+    def _discard(self, book, key, entry):
+        # Caller must hold the lock
+        levels = book.get(key)
+        if not levels:
+            return
+        i = bisect_left(levels, entry)
+        if i < len(levels) and levels[i] == entry:
+            del levels[i]
+        if not levels:
+            del book[key]
+
+    def remove(self, alert_id):
+        """Stop tracking an alert. Returns the removed Alert or None."""
+        with self._lock:
+            alert = self._alerts.pop(alert_id, None)
+            if alert is None:
+                return None
+            upper, lower = trigger_levels(alert)
+            if upper is not None:
+                self._discard(self._upper, alert.symbol, (-upper, alert.id))
+            if lower is not None:
+                self._discard(self._lower, alert.symbol, (lower, alert.id))
+            return alert
+
+    def evaluate(self, prices):
+        """Fire and remove every alert triggered by a tick of {symbol: price}.
+
+        Returns:
+            List of (Alert, price) for the alerts that fired
+        """
+        fired = []
+        with self._lock:
+            for symbol, price in prices.items():
+                if price is None:
+                    continue
+                hit_ids = []
+                upper = self._upper.get(symbol)
+                if upper:
+                    i = bisect_left(upper, (-price,))
+                    hit_ids.extend(alert_id for _, alert_id in upper[i:])
+                    del upper[i:]
+                lower = self._lower.get(symbol)
+                if lower:
+                    i = bisect_left(lower, (price,))
+                    hit_ids.extend(alert_id for _, alert_id in lower[i:])
+                    del lower[i:]
+
+                for alert_id in hit_ids:
+                    alert = self._alerts.pop(alert_id, None)
+                    if alert is None:
+                        continue  # Both sides of a 'move' alert crossed in one tick
+                    if alert.kind == 'move':
+                        # Drop the side that didn't fire
+                        upper_level, lower_level = trigger_levels(alert)
+                        self._discard(self._upper, symbol, (-upper_level, alert.id))
+                        self._discard(self._lower, symbol, (lower_level, alert.id))
+                    fired.append((alert, price))
+
+                if symbol in self._upper and not self._upper[symbol]:
+                    del self._upper[symbol]
+                if symbol in self._lower and not self._lower[symbol]:
+                    del self._lower[symbol]
+        return fired
+
+    def restore(self, fired):
+        """Track alerts returned by evaluate() again, for when deleting them from the database failed."""
+        with self._lock:
+            for alert, price in fired:
+                self._add(alert)
+
+    def count(self):
+        return len(self._alerts)
+
+
+engine = AlertEngine()
+
+
+def describe(alert):
+    if alert.kind == 'move':
+        return f"{alert.symbol} moves ±{alert.threshold}% from ${alert.base_price}"
+    return f"{alert.symbol} {alert.kind} ${alert.threshold}"
@@ -0,0 +1,75 @@
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import matplotlib
+matplotlib.use('Agg')  # Use a non-interactive backend
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Rendered PNGs kept in memory
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', '256'))
+
+VALID_PERIODS = ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd')
+VALID_INTERVALS = ('1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '1d', '5d', '1wk', '1mo', '3mo')
+
+
+def render_line_chart(dates, values, title, ylabel='Price (USD)'):
+    """Render a line chart to PNG bytes.
+
+    Uses its own Figure rather than pyplot's global state, so it is safe to
+    call from several threads or worker processes at once.
+    """
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(dates, values)
+    ax.set_title(title)
+    ax.set_xlabel('Date')
+    ax.set_ylabel(ylabel)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    img_buffer = BytesIO()
+    fig.savefig(img_buffer, format='png', dpi=100)
+    return img_buffer.getvalue()
+
+
+class ChartCache:
+    """LRU cache of rendered PNG bytes.
+
+    Keys include the timestamp of the last bar, so a chart is reused until a
+    new bar arrives and is then rendered again.
+    """
+
+    def __init__(self, max_size=CHART_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+chart_cache = ChartCache()
+
+
+def chart_key(symbol, period, interval, last_bar):
+    return (symbol, period, interval, str(last_bar))
@@ -1,10 +1,92 @@
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-def init_db():
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
+import metrics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.getenv('DATABASE_PATH', os.path.join(PROJECT_ROOT, 'user_data.db'))
+# Page cache per connection in KiB, and the fsync level used with WAL
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+# Days net-worth snapshots are kept per minute, then per hour, before being rolled up further
+NETWORTH_MINUTE_RETENTION_DAYS = float(os.getenv('NETWORTH_MINUTE_RETENTION_DAYS', '2'))
+NETWORTH_HOUR_RETENTION_DAYS = float(os.getenv('NETWORTH_HOUR_RETENTION_DAYS', '60'))
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+
+class InsufficientFundsError(ValueError):
+    def __init__(self, required, available):
+        super().__init__(f"Insufficient funds: need ${round(required, 2)}, have ${available}")
+        self.required = required
+        self.available = available
+
+class InsufficientSharesError(ValueError):
+    def __init__(self, symbol, requested, owned):
+        super().__init__(f"Not enough shares of {symbol} to sell: requested {requested}, own {owned}")
+        self.symbol = symbol
+        self.requested = requested
+        self.owned = owned
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+def _connect():
+    # isolation_level=None leaves transaction control to transaction() below;
+    # cached_statements keeps prepared statements around for reuse
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None,
+                           check_same_thread=False, cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+def get_connection():
+    """Return this thread's long-lived connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+@contextmanager
+def transaction(immediate=False):
+    """Run the enclosed statements in one transaction and yield a cursor.
+
+    immediate=True takes the write lock up front (BEGIN IMMEDIATE) so
+    read-modify-write sequences cannot interleave with other writers.
+    Nested use joins the outer transaction.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
 
+def close_connections():
+    """Close every pooled connection, e.g. on shutdown."""
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+
+def _create_base_schema(c):
+    """Create the original tables. Uses IF NOT EXISTS, so it is a no-op on databases
+    created before migrations were versioned."""
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
               user_id INTEGER PRIMARY KEY,
@@ -52,36 +134,200 @@ def init_db():
             symbol TEXT,
             PRIMARY KEY (user_id, symbol)
             )''')
-    
-    conn.commit()
-    conn.close()
 
+    c.execute('''CREATE TABLE IF NOT EXISTS price_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            kind TEXT,
+            threshold REAL,
+            base_price REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            side TEXT,
+            order_type TEXT,
+            shares REAL,
+            limit_price REAL,
+            stop_price REAL,
+            status TEXT DEFAULT 'open',
+            fill_price REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP
+            )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS sentiment_cache (
+            headline_hash TEXT PRIMARY KEY,
+            model_id TEXT,
+            sentiment TEXT,
+            confidence REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''')
+
+def _add_trade_indexes(c):
+    """Index trades by (user_id, timestamp) and trade_analytics by (user_id, profit_loss_pct)."""
+    # Both end in the rowid (= id), so ties on timestamp are ordered by id too
+    c.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_time ON trades (user_id, timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_trade_analytics_user_pct ON trade_analytics (user_id, profit_loss_pct)')
+
+def _add_user_trade_stats(c):
+    """Create user_trade_stats and fill it from the existing trade_analytics rows."""
+    c.execute('''CREATE TABLE IF NOT EXISTS user_trade_stats (
+            user_id INTEGER PRIMARY KEY,
+            trade_count INTEGER,
+            wins INTEGER,
+            losses INTEGER,
+            total_profit_loss REAL,
+            mean_pct REAL,
+            m2_pct REAL,
+            best_pct REAL,
+            best_symbol TEXT,
+            worst_pct REAL,
+            worst_symbol TEXT,
+            updated_at TIMESTAMP
+            )''')
+    _rebuild_trade_stats(c)
+
+def _add_networth_history(c):
+    """Create networth_history, one (cash, equity) row per user and timestamp at minute, hour or day resolution."""
+    # WITHOUT ROWID keeps each row in the primary key b-tree, so a user's history is one contiguous range
+    c.execute('''CREATE TABLE IF NOT EXISTS networth_history (
+            user_id INTEGER,
+            ts INTEGER,
+            resolution INTEGER,
+            cash REAL,
+            equity REAL,
+            PRIMARY KEY (user_id, ts, resolution)
+            ) WITHOUT ROWID''')
+    # Lets downsampling find the expired rows of one resolution without a full scan
+    c.execute('CREATE INDEX IF NOT EXISTS idx_networth_history_resolution_ts ON networth_history (resolution, ts)')
+
+# Applied in order; the database's PRAGMA user_version is the number applied so far.
+# Only ever append to this list.
+MIGRATIONS = [
+    _create_base_schema,
+    _add_trade_indexes,
+    _add_user_trade_stats,
+    _add_networth_history,
+]
+
+def get_schema_version():
+    return get_connection().execute('PRAGMA user_version').fetchone()[0]
+
+def migrate():
+    """Apply pending migrations in place, each in its own transaction with its version bump."""
+    if get_schema_version() >= len(MIGRATIONS):
+        if get_schema_version() > len(MIGRATIONS):
+            print(f"Warning: database schema version {get_schema_version()} is newer than this code ({len(MIGRATIONS)})")
+        return
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        with transaction(immediate=True) as c:
+            # Re-read under the write lock in case another process migrated first
+            if c.execute('PRAGMA user_version').fetchone()[0] >= version:
+                continue
+            migration(c)
+            c.execute(f'PRAGMA user_version = {version}')
+        print(f"Applied database migration {version}: {migration.__name__.strip('_')}")
+
+TRADE_HISTORY_SQL = '''
+    SELECT symbol, action, shares, price, timestamp FROM trades
+    WHERE user_id = ?
+    ORDER BY timestamp DESC
+'''
+TRADE_HISTORY_FIRST_PAGE_SQL = '''
+    SELECT id, symbol, action, shares, price, timestamp FROM trades
+    WHERE user_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+TRADE_HISTORY_OLDER_SQL = '''
+    SELECT id, symbol, action, shares, price, timestamp FROM trades
+    WHERE user_id = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+TRADE_HISTORY_NEWER_SQL = '''
+    SELECT id, symbol, action, shares, price, timestamp FROM trades
+    WHERE user_id = ? AND (timestamp, id) > (?, ?)
+    ORDER BY timestamp ASC, id ASC
+    LIMIT ?
+'''
+BEST_TRADES_SQL = '''
+    SELECT symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp
+    FROM trade_analytics
+    WHERE user_id = ?
+    ORDER BY profit_loss_pct DESC
+    LIMIT ?
+'''
+WORST_TRADES_SQL = '''
+    SELECT symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp
+    FROM trade_analytics
+    WHERE user_id = ?
+    ORDER BY profit_loss_pct ASC
+    LIMIT ?
+'''
+NETWORTH_HISTORY_SQL = '''
+    SELECT ts, cash, equity FROM networth_history
+    WHERE user_id = ? AND ts >= ?
+    ORDER BY ts
+'''
+
+# (query, sql, sample parameters, index the plan must use)
+QUERY_PLAN_CHECKS = (
+    ('get_trade_history', TRADE_HISTORY_SQL, (0,), 'idx_trades_user_time'),
+    ('get_trade_history_page (first)', TRADE_HISTORY_FIRST_PAGE_SQL, (0, 11), 'idx_trades_user_time'),
+    ('get_trade_history_page (older)', TRADE_HISTORY_OLDER_SQL, (0, '', 0, 11), 'idx_trades_user_time'),
+    ('get_trade_history_page (newer)', TRADE_HISTORY_NEWER_SQL, (0, '', 0, 11), 'idx_trades_user_time'),
+    ('get_best_trades', BEST_TRADES_SQL, (0, 5), 'idx_trade_analytics_user_pct'),
+    ('get_worst_trades', WORST_TRADES_SQL, (0, 5), 'idx_trade_analytics_user_pct'),
+    ('get_networth_history', NETWORTH_HISTORY_SQL, (0, 0), 'PRIMARY KEY'),
+)
+
+def check_query_plans():
+    """EXPLAIN QUERY PLAN the indexed queries and report any that don't use their index
+    or still sort in a temp b-tree.
+
+    Returns:
+        List of (query, plan lines) for the queries whose plan is wrong; empty if all are fine
+    """
+    problems = []
+    conn = get_connection()
+    for name, sql, params, index in QUERY_PLAN_CHECKS:
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+        if not any(index in line for line in plan) or any('TEMP B-TREE' in line for line in plan):
+            problems.append((name, plan))
+    return problems
+
+def init_db():
+    migrate()
+    for name, plan in check_query_plans():
+        print(f"Warning: {name} is not using its index: {'; '.join(plan)}")
+
+@metrics.timed('db')
 def add_user(user_id, username, funds):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('''
-        INSERT OR IGNORE INTO users (user_id, username, join_date, total_funds, starting_funds)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_id, username, datetime.now(), funds, funds))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('''
+            INSERT OR IGNORE INTO users (user_id, username, join_date, total_funds, starting_funds)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, username, datetime.now(), funds, funds))
 
+@metrics.timed('db')
 def get_user_funds(user_id):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT total_funds FROM users WHERE user_id = ?', (user_id,))
+    c = get_connection().execute('SELECT total_funds FROM users WHERE user_id = ?', (user_id,))
     result = c.fetchone()
-    conn.close()
     return round(result[0], 2) if result else None
 
+@metrics.timed('db')
 def get_user_starting_funds(user_id):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT starting_funds FROM users WHERE user_id = ?', (user_id,))
+    c = get_connection().execute('SELECT starting_funds FROM users WHERE user_id = ?', (user_id,))
     result = c.fetchone()
-    conn.close()
     return round(result[0], 2) if result else None
 
+@metrics.timed('db')
 def get_user_stock_total(user_id, current_prices):
     """Calculate current total value of stocks in portfolio.
     
@@ -92,11 +338,8 @@ def get_user_stock_total(user_id, current_prices):
     Returns:
         Total current value of all holdings
     """
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT symbol, shares FROM portfolios WHERE user_id = ?', (user_id,))
+    c = get_connection().execute('SELECT symbol, shares FROM portfolios WHERE user_id = ?', (user_id,))
     holdings = c.fetchall()
-    conn.close()
     
     total_value = 0
     for symbol, shares in holdings:
@@ -105,17 +348,13 @@ def get_user_stock_total(user_id, current_prices):
     
     return round(total_value, 2)
 
+@metrics.timed('db')
 def update_user_funds(user_id, new_funds):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('UPDATE users SET total_funds = ? WHERE user_id = ?', (new_funds, user_id))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('UPDATE users SET total_funds = ? WHERE user_id = ?', (new_funds, user_id))
 
-def add_to_portfolio(user_id, symbol, shares, entry_price):
-    """Add shares to portfolio, calculate weighted average entry price."""
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
+def _add_position(c, user_id, symbol, shares, entry_price):
+    """Upsert a position with a weighted average entry price. Returns (shares, entry_price)."""
     total_invested = shares * entry_price
     c.execute('''
         SELECT shares, entry_price, total_invested FROM portfolios 
@@ -129,25 +368,22 @@ def add_to_portfolio(user_id, symbol, shares, entry_price):
             INSERT INTO portfolios (user_id, symbol, shares, entry_price, total_invested)
             VALUES (?, ?, ?, ?, ?)
         ''', (user_id, symbol, shares, entry_price, total_invested))
-    else:
-        # Add to existing position, calculate weighted average
-        existing_shares, existing_price, existing_total = existing
-        total_shares = existing_shares + shares
-        avg_price = (existing_shares * existing_price + shares * entry_price) / total_shares
-        total_invested = existing_total + total_invested
-        c.execute('''
-            UPDATE portfolios
-            SET shares = ?, entry_price = ?, total_invested = ?
-            WHERE user_id = ? AND symbol = ?
-        ''', (total_shares, avg_price, total_invested, user_id, symbol))
-    
-    conn.commit()
-    conn.close()
+        return shares, entry_price
 
-def sell_from_portfolio(user_id, symbol, shares, sell_price):
-    """Sell shares from portfolio."""
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
+    # Add to existing position, calculate weighted average
+    existing_shares, existing_price, existing_total = existing
+    total_shares = existing_shares + shares
+    avg_price = (existing_shares * existing_price + shares * entry_price) / total_shares
+    total_invested = existing_total + total_invested
+    c.execute('''
+        UPDATE portfolios
+        SET shares = ?, entry_price = ?, total_invested = ?
+        WHERE user_id = ? AND symbol = ?
+    ''', (total_shares, avg_price, total_invested, user_id, symbol))
+    return total_shares, avg_price
+
+def _remove_position(c, user_id, symbol, shares, sell_price):
+    """Reduce a position and record the completed trade. Returns (remaining_shares, profit_loss)."""
     c.execute('''
         SELECT shares, entry_price, total_invested FROM portfolios 
         WHERE user_id = ? AND symbol = ?
@@ -155,109 +391,309 @@ def sell_from_portfolio(user_id, symbol, shares, sell_price):
     existing = c.fetchone()
     
     if existing is None:
-        conn.close()
-        raise ValueError("Position doesn't exist")
+        raise InsufficientSharesError(symbol, shares, 0)
     
     previous_shares, entry_price, total_invested = existing
     if previous_shares < shares:
-        conn.close()
-        raise ValueError("Not enough shares to sell")
+        raise InsufficientSharesError(symbol, shares, previous_shares)
     
-    log_completed_trade(user_id, symbol, entry_price, sell_price, shares)
+    profit_loss = _insert_completed_trade(c, user_id, symbol, entry_price, sell_price, shares)
     
     if previous_shares == shares:
         # Sold all shares, delete position
         c.execute('DELETE FROM portfolios WHERE user_id = ? AND symbol = ?', (user_id, symbol))
-    else:
-        # Sold some shares, update position
-        remaining_shares = previous_shares - shares
-        remaining_invested = total_invested * (remaining_shares / previous_shares)
-        c.execute('''
-            UPDATE portfolios
-            SET shares = ?, total_invested = ?
-            WHERE user_id = ? AND symbol = ?
-        ''', (remaining_shares, remaining_invested, user_id, symbol))
-    
-    conn.commit()
-    conn.close()
+        return 0, profit_loss
 
-def log_completed_trade(user_id, symbol, entry_price, sell_price, shares):
+    # Sold some shares, update position
+    remaining_shares = previous_shares - shares
+    remaining_invested = total_invested * (remaining_shares / previous_shares)
+    c.execute('''
+        UPDATE portfolios
+        SET shares = ?, total_invested = ?
+        WHERE user_id = ? AND symbol = ?
+    ''', (remaining_shares, remaining_invested, user_id, symbol))
+    return remaining_shares, profit_loss
+
+def _insert_completed_trade(c, user_id, symbol, entry_price, sell_price, shares):
     profit_loss = (sell_price - entry_price) * shares
     profit_loss_pct = (profit_loss / (entry_price * shares)) * 100 if entry_price * shares != 0 else 0
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
     c.execute('''
         INSERT INTO trade_analytics (user_id, symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp) 
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', (user_id, symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, datetime.now()))
-    conn.commit()
-    conn.close()
+    _update_trade_stats(c, user_id, symbol, profit_loss, profit_loss_pct)
+    return profit_loss
 
-def get_best_trades(user_id, top_n=5):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
+def _update_trade_stats(c, user_id, symbol, profit_loss, profit_loss_pct):
+    """Fold one completed trade into the user's user_trade_stats row.
+
+    The mean and variance of profit_loss_pct are kept with Welford's method
+    (mean and m2, the sum of squared deviations), which stays exact without
+    revisiting earlier trades.
+    """
+    c.execute('''
+        SELECT trade_count, mean_pct, m2_pct, best_pct, worst_pct FROM user_trade_stats WHERE user_id = ?
+    ''', (user_id,))
+    row = c.fetchone()
+    win, loss = int(profit_loss > 0), int(profit_loss < 0)
+    if row is None:
+        c.execute('''
+            INSERT INTO user_trade_stats (user_id, trade_count, wins, losses, total_profit_loss, mean_pct, m2_pct,
+                                          best_pct, best_symbol, worst_pct, worst_symbol, updated_at)
+            VALUES (?, 1, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?)
+        ''', (user_id, win, loss, profit_loss, profit_loss_pct, profit_loss_pct, symbol,
+              profit_loss_pct, symbol, datetime.now()))
+        return
+
+    count, mean, m2, best_pct, worst_pct = row
+    count += 1
+    delta = profit_loss_pct - mean
+    mean += delta / count
+    m2 += delta * (profit_loss_pct - mean)
     c.execute('''
-        SELECT symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp 
-        FROM trade_analytics 
-        WHERE user_id = ? 
-        ORDER BY profit_loss_pct DESC 
-        LIMIT ?
-    ''', (user_id, top_n))
-    trades = c.fetchall()
-    conn.close()
-    return trades
+        UPDATE user_trade_stats
+        SET trade_count = ?, wins = wins + ?, losses = losses + ?, total_profit_loss = total_profit_loss + ?,
+            mean_pct = ?, m2_pct = ?,
+            best_pct = CASE WHEN ? > best_pct THEN ? ELSE best_pct END,
+            best_symbol = CASE WHEN ? > best_pct THEN ? ELSE best_symbol END,
+            worst_pct = CASE WHEN ? < worst_pct THEN ? ELSE worst_pct END,
+            worst_symbol = CASE WHEN ? < worst_pct THEN ? ELSE worst_symbol END,
+            updated_at = ?
+        WHERE user_id = ?
+    ''', (count, win, loss, profit_loss, mean, m2,
+          profit_loss_pct, profit_loss_pct, profit_loss_pct, symbol,
+          profit_loss_pct, profit_loss_pct, profit_loss_pct, symbol,
+          datetime.now(), user_id))
 
-def get_worst_trades(user_id, top_n=5):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
+def _rebuild_trade_stats(c):
+    # Two passes (mean, then squared deviations from it) give the same m2 as Welford's method.
+    # The best/worst symbol is looked up per user; ties go to the earliest trade, as in _update_trade_stats.
+    c.execute('DELETE FROM user_trade_stats')
     c.execute('''
-              SELECT symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp
-              FROM trade_analytics
-              WHERE user_id = ?
-              ORDER BY profit_loss_pct ASC
-              LIMIT ?
-              ''', (user_id, top_n))
-    trades = c.fetchall()
-    conn.close()
-    return trades
+        WITH agg AS (
+            SELECT user_id, COUNT(*) AS n, SUM(profit_loss > 0) AS wins, SUM(profit_loss < 0) AS losses,
+                   SUM(profit_loss) AS total, AVG(profit_loss_pct) AS mean,
+                   MAX(profit_loss_pct) AS best, MIN(profit_loss_pct) AS worst
+            FROM trade_analytics GROUP BY user_id
+        ), spread AS (
+            SELECT t.user_id, SUM((t.profit_loss_pct - a.mean) * (t.profit_loss_pct - a.mean)) AS m2
+            FROM trade_analytics t JOIN agg a ON a.user_id = t.user_id
+            GROUP BY t.user_id
+        )
+        INSERT INTO user_trade_stats (user_id, trade_count, wins, losses, total_profit_loss, mean_pct, m2_pct,
+                                      best_pct, best_symbol, worst_pct, worst_symbol, updated_at)
+        SELECT agg.user_id, agg.n, agg.wins, agg.losses, agg.total, agg.mean, spread.m2,
+               agg.best, (SELECT t.symbol FROM trade_analytics t
+                          WHERE t.user_id = agg.user_id AND t.profit_loss_pct = agg.best
+                          ORDER BY t.id LIMIT 1),
+               agg.worst, (SELECT t.symbol FROM trade_analytics t
+                           WHERE t.user_id = agg.user_id AND t.profit_loss_pct = agg.worst
+                           ORDER BY t.id LIMIT 1),
+               ?
+        FROM agg
+        JOIN spread ON spread.user_id = agg.user_id
+    ''', (datetime.now(),))
 
-def log_trade(user_id, symbol, action, shares, price):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
+def rebuild_trade_stats():
+    """Recompute user_trade_stats from trade_analytics, e.g. after rows were bulk loaded."""
+    with transaction(immediate=True) as c:
+        _rebuild_trade_stats(c)
+
+@metrics.timed('db')
+def get_user_trade_stats(user_id):
+    """A user's aggregate trading stats from one row lookup, or None if they have no completed trades.
+
+    Returns:
+        dict with trade_count, wins, losses, win_rate, total_profit_loss, mean_pct,
+        std_pct (sample standard deviation, 0 for a single trade), best/worst_pct and best/worst_symbol
+    """
+    c = get_connection().execute('''
+        SELECT trade_count, wins, losses, total_profit_loss, mean_pct, m2_pct,
+               best_pct, best_symbol, worst_pct, worst_symbol
+        FROM user_trade_stats WHERE user_id = ?
+    ''', (user_id,))
+    row = c.fetchone()
+    if row is None:
+        return None
+    count, wins, losses, total, mean, m2, best_pct, best_symbol, worst_pct, worst_symbol = row
+    return {
+        'trade_count': count,
+        'wins': wins,
+        'losses': losses,
+        'win_rate': wins / count * 100,
+        'total_profit_loss': total,
+        'mean_pct': mean,
+        'std_pct': (m2 / (count - 1)) ** 0.5 if count > 1 else 0.0,
+        'best_pct': best_pct,
+        'best_symbol': best_symbol,
+        'worst_pct': worst_pct,
+        'worst_symbol': worst_symbol,
+    }
+
+def _insert_trade(c, user_id, symbol, action, shares, price):
     c.execute('''
         INSERT INTO trades (user_id, symbol, action, shares, price)
         VALUES (?, ?, ?, ?, ?)
     ''', (user_id, symbol, action, shares, price))
-    conn.commit()
-    conn.close()
 
+@metrics.timed('db')
+def add_to_portfolio(user_id, symbol, shares, entry_price):
+    """Add shares to portfolio, calculate weighted average entry price."""
+    with transaction(immediate=True) as c:
+        _add_position(c, user_id, symbol, shares, entry_price)
+
+@metrics.timed('db')
+def sell_from_portfolio(user_id, symbol, shares, sell_price):
+    """Sell shares from portfolio."""
+    with transaction(immediate=True) as c:
+        _remove_position(c, user_id, symbol, shares, sell_price)
+
+@metrics.timed('db')
+def log_completed_trade(user_id, symbol, entry_price, sell_price, shares):
+    with transaction() as c:
+        _insert_completed_trade(c, user_id, symbol, entry_price, sell_price, shares)
+
+def _get_funds_for_update(c, user_id):
+    c.execute('SELECT total_funds FROM users WHERE user_id = ?', (user_id,))
+    result = c.fetchone()
+    if result is None:
+        raise ValueError("User doesn't exist")
+    return result[0]
+
+@metrics.timed('db')
+def execute_buy(user_id, symbol, shares, price):
+    """Buy shares as one transaction: funds check, cash debit, position upsert and trade log.
+
+    Raises:
+        InsufficientFundsError: if the user can't afford shares * price
+
+    Returns:
+        dict with the new cash balance, the resulting position and the total cost
+    """
+    total_cost = shares * price
+    with transaction(immediate=True) as c:
+        funds = _get_funds_for_update(c, user_id)
+        if round(funds, 2) < total_cost:
+            raise InsufficientFundsError(total_cost, round(funds, 2))
+        c.execute('UPDATE users SET total_funds = total_funds - ? WHERE user_id = ?', (total_cost, user_id))
+        position_shares, entry_price = _add_position(c, user_id, symbol, shares, price)
+        _insert_trade(c, user_id, symbol, 'buy', shares, price)
+    return {
+        'funds': round(funds - total_cost, 2),
+        'shares': position_shares,
+        'entry_price': entry_price,
+        'total': total_cost,
+    }
+
+@metrics.timed('db')
+def execute_sell(user_id, symbol, shares, price):
+    """Sell shares as one transaction: position check, cash credit, position update,
+    trade log and trade analytics row.
+
+    Raises:
+        InsufficientSharesError: if the user holds fewer than shares of symbol
+
+    Returns:
+        dict with the new cash balance, the remaining shares, the realized P&L and the total revenue
+    """
+    total_revenue = shares * price
+    with transaction(immediate=True) as c:
+        funds = _get_funds_for_update(c, user_id)
+        remaining_shares, profit_loss = _remove_position(c, user_id, symbol, shares, price)
+        c.execute('UPDATE users SET total_funds = total_funds + ? WHERE user_id = ?', (total_revenue, user_id))
+        _insert_trade(c, user_id, symbol, 'sell', shares, price)
+    return {
+        'funds': round(funds + total_revenue, 2),
+        'shares': remaining_shares,
+        'profit_loss': round(profit_loss, 2),
+        'total': total_revenue,
+    }
+
+@metrics.timed('db')
+def get_best_trades(user_id, top_n=5):
+    c = get_connection().execute(BEST_TRADES_SQL, (user_id, top_n))
+    return c.fetchall()
+
+@metrics.timed('db')
+def get_worst_trades(user_id, top_n=5):
+    c = get_connection().execute(WORST_TRADES_SQL, (user_id, top_n))
+    return c.fetchall()
+
+@metrics.timed('db')
+def log_trade(user_id, symbol, action, shares, price):
+    with transaction() as c:
+        _insert_trade(c, user_id, symbol, action, shares, price)
+
+@metrics.timed('db')
 def get_portfolio(user_id):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT symbol, shares, entry_price, total_invested FROM portfolios WHERE user_id = ?', (user_id,))
-    portfolio = c.fetchall()
-    conn.close()
-    return portfolio
+    c = get_connection().execute('SELECT symbol, shares, entry_price, total_invested FROM portfolios WHERE user_id = ?', (user_id,))
+    return c.fetchall()
+
+@metrics.timed('db')
+def get_held_symbols(user_ids=None):
+    """Distinct symbols currently held in any portfolio, or only in the portfolios of user_ids."""
+    if user_ids is None:
+        c = get_connection().execute('SELECT DISTINCT symbol FROM portfolios')
+    else:
+        user_ids = list(user_ids)
+        placeholders = ', '.join('?' * len(user_ids))
+        c = get_connection().execute(f'SELECT DISTINCT symbol FROM portfolios WHERE user_id IN ({placeholders})', user_ids)
+    return [row[0] for row in c.fetchall()]
 
+@metrics.timed('db')
+def get_tracked_symbols():
+    """Distinct symbols that are held in a portfolio, on a watchlist, or have a price alert or resting order."""
+    c = get_connection().execute('''
+        SELECT symbol FROM portfolios
+        UNION SELECT symbol FROM watchlist
+        UNION SELECT symbol FROM price_alerts
+        UNION SELECT symbol FROM orders WHERE status IN ('open', 'triggered')
+    ''')
+    return [row[0] for row in c.fetchall()]
+
+@metrics.timed('db')
 def get_trade_history(user_id):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT symbol, action, shares, price, timestamp FROM trades WHERE user_id = ? ORDER BY timestamp DESC', (user_id,))
-    trades = c.fetchall()
-    conn.close()
-    return trades
+    c = get_connection().execute(TRADE_HISTORY_SQL, (user_id,))
+    return c.fetchall()
+
+@metrics.timed('db')
+def get_trade_history_page(user_id, limit=10, before=None, after=None):
+    """One page of a user's trades, newest first, keyset-paginated on (timestamp, id).
+
+    Pass the (timestamp, id) of the current page's last row as before to get
+    the next, older page, or of its first row as after to get the previous,
+    newer page. Each page is one index range scan of at most limit + 1 rows,
+    so deep pages cost the same as the first.
+
+    Returns:
+        (rows, has_more): rows are (id, symbol, action, shares, price, timestamp)
+        newest first; has_more tells whether more rows lie beyond the page in
+        the direction read
+    """
+    conn = get_connection()
+    if after is not None:
+        rows = conn.execute(TRADE_HISTORY_NEWER_SQL, (user_id, after[0], after[1], limit + 1)).fetchall()
+        return rows[:limit][::-1], len(rows) > limit
+    if before is not None:
+        rows = conn.execute(TRADE_HISTORY_OLDER_SQL, (user_id, before[0], before[1], limit + 1)).fetchall()
+    else:
+        rows = conn.execute(TRADE_HISTORY_FIRST_PAGE_SQL, (user_id, limit + 1)).fetchall()
+    return rows[:limit], len(rows) > limit
 
+@metrics.timed('db')
 def remove_user(user_id):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM portfolios WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM trades WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM watchlist WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM trade_analytics WHERE user_id = ?', (user_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM portfolios WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM trades WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM watchlist WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM trade_analytics WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM price_alerts WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM orders WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM user_trade_stats WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM networth_history WHERE user_id = ?', (user_id,))
 
+@metrics.timed('db')
 def calculate_user_net_worth(user_id, current_prices):
     funds = get_user_funds(user_id)
     stock_total = get_user_stock_total(user_id, current_prices)
@@ -265,43 +701,281 @@ def calculate_user_net_worth(user_id, current_prices):
         return None
     return round(funds + stock_total, 2)
 
-def get_leaderboard(current_prices):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT user_id FROM users')
-    users = c.fetchall()
-    user_dict = {}
-    for user_id in users:
-        net_worth = calculate_user_net_worth(user_id[0], current_prices)
-        if net_worth is not None:
-            user_dict[user_id[0]] = net_worth
-    conn.close()
-    # Sort users by net worth
-    sorted_leaderboard = sorted(user_dict.items(), key=lambda x: x[1], reverse=True)
-    return sorted_leaderboard[:5]
+def _load_price_table(c, current_prices):
+    """Load current prices into this connection's temp table so they can be joined in SQL."""
+    c.execute('CREATE TEMP TABLE IF NOT EXISTS price_snapshot (symbol TEXT PRIMARY KEY, price REAL)')
+    c.execute('DELETE FROM temp.price_snapshot')
+    c.executemany('INSERT INTO temp.price_snapshot (symbol, price) VALUES (?, ?)', current_prices.items())
+
+@metrics.timed('db')
+def get_leaderboard(current_prices, top_n=5, offset=0):
+    """Rank users by net worth (cash + holdings valued at current_prices) in one query.
+
+    Args:
+        current_prices: dict like {"AAPL": 160.50, "TSLA": 245.30}; unpriced holdings count as 0
+        top_n: number of users to return
+        offset: number of top-ranked users to skip, for paging
+
+    Returns:
+        List of (user_id, net_worth) tuples, highest net worth first
+    """
+    with transaction() as c:
+        _load_price_table(c, current_prices)
+        c.execute('''
+            SELECT u.user_id, ROUND(u.total_funds + COALESCE(h.stock_value, 0), 2) AS net_worth
+            FROM users u
+            LEFT JOIN (
+                SELECT p.user_id, SUM(p.shares * ps.price) AS stock_value
+                FROM portfolios p
+                JOIN temp.price_snapshot ps ON ps.symbol = p.symbol
+                GROUP BY p.user_id
+            ) h ON h.user_id = u.user_id
+            WHERE u.total_funds IS NOT NULL
+            ORDER BY net_worth DESC, u.user_id
+            LIMIT ? OFFSET ?
+        ''', (top_n, offset))
+        return c.fetchall()
+
+@metrics.timed('db')
+def record_networth_snapshot(current_prices, ts=None):
+    """Append a (cash, equity) row for every user, valued at current_prices, in one statement.
+
+    Holdings without a current price are valued at their entry price, so a
+    missed quote doesn't show up as a drop in the chart. Rows land at minute
+    resolution; a second snapshot within the same minute replaces the first.
+
+    Returns:
+        Number of users snapshotted
+    """
+    ts = int(ts if ts is not None else time.time()) // MINUTE * MINUTE
+    with transaction() as c:
+        _load_price_table(c, current_prices)
+        c.execute('''
+            INSERT OR REPLACE INTO networth_history (user_id, ts, resolution, cash, equity)
+            SELECT u.user_id, ?, ?, u.total_funds, COALESCE(h.equity, 0)
+            FROM users u
+            LEFT JOIN (
+                SELECT p.user_id, SUM(p.shares * COALESCE(ps.price, p.entry_price)) AS equity
+                FROM portfolios p
+                LEFT JOIN temp.price_snapshot ps ON ps.symbol = p.symbol
+                GROUP BY p.user_id
+            ) h ON h.user_id = u.user_id
+            WHERE u.total_funds IS NOT NULL
+        ''', (ts, MINUTE))
+        return c.rowcount
+
+def _roll_up(c, resolution, to_resolution, cutoff):
+    """Replace rows of resolution older than cutoff with the last row of each to_resolution bucket."""
+    cutoff = int(cutoff) // to_resolution * to_resolution  # Only whole buckets
+    # A bare column next to MAX() comes from the row holding the maximum, so each bucket keeps its closing value
+    c.execute('''
+        INSERT OR REPLACE INTO networth_history (user_id, ts, resolution, cash, equity)
+        SELECT user_id, bucket, ?, cash, equity FROM (
+            SELECT user_id, ts / ? * ? AS bucket, cash, equity, MAX(ts)
+            FROM networth_history
+            WHERE resolution = ? AND ts < ?
+            GROUP BY user_id, bucket
+        )
+    ''', (to_resolution, to_resolution, to_resolution, resolution, cutoff))
+    c.execute('DELETE FROM networth_history WHERE resolution = ? AND ts < ?', (resolution, cutoff))
+    return c.rowcount
+
+@metrics.timed('db')
+def downsample_networth_history(now=None):
+    """Roll minute snapshots older than NETWORTH_MINUTE_RETENTION_DAYS up to hours, and
+    hours older than NETWORTH_HOUR_RETENTION_DAYS up to days. Daily rows are kept forever.
+
+    Returns:
+        Number of finer-grained rows removed
+    """
+    now = now if now is not None else time.time()
+    with transaction() as c:
+        removed = _roll_up(c, MINUTE, HOUR, now - NETWORTH_MINUTE_RETENTION_DAYS * DAY)
+        removed += _roll_up(c, HOUR, DAY, now - NETWORTH_HOUR_RETENTION_DAYS * DAY)
+    return removed
+
+@metrics.timed('db')
+def get_networth_history(user_id, since=0):
+    """A user's net-worth snapshots since the given epoch seconds, oldest first.
+
+    Recent rows are per minute, older ones per hour or per day, depending on
+    how far downsampling has got.
 
+    Returns:
+        List of (ts, cash, equity) tuples
+    """
+    c = get_connection().execute(NETWORTH_HISTORY_SQL, (user_id, int(since)))
+    return c.fetchall()
+
+@metrics.timed('db')
+def count_users():
+    return get_connection().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+@metrics.timed('db')
 def add_to_watchlist(user_id, symbol):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('INSERT OR IGNORE INTO watchlist (user_id, symbol) VALUES (?, ?)', (user_id, symbol))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('INSERT OR IGNORE INTO watchlist (user_id, symbol) VALUES (?, ?)', (user_id, symbol))
 
+@metrics.timed('db')
 def remove_from_watchlist(user_id, symbol):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('DELETE FROM watchlist WHERE user_id = ? AND symbol = ?', (user_id, symbol))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('DELETE FROM watchlist WHERE user_id = ? AND symbol = ?', (user_id, symbol))
 
+@metrics.timed('db')
 def get_watchlist(user_id):
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT symbol FROM watchlist WHERE user_id = ?', (user_id,))
-    symbols = c.fetchall()
-    conn.close()
-    return [symbol[0] for symbol in symbols]
+    c = get_connection().execute('SELECT symbol FROM watchlist WHERE user_id = ?', (user_id,))
+    return [symbol[0] for symbol in c.fetchall()]
 
-# Initialize the database when the module is imported
-init_db()
+@metrics.timed('db')
+def add_price_alert(user_id, symbol, kind, threshold, base_price=None):
+    """Store a price alert. kind is 'above', 'below' or 'move' (threshold is then a percent). Returns its id."""
+    with transaction() as c:
+        c.execute('''
+            INSERT INTO price_alerts (user_id, symbol, kind, threshold, base_price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, symbol, kind, threshold, base_price))
+        return c.lastrowid
+
+@metrics.timed('db')
+def get_price_alerts(user_id):
+    c = get_connection().execute(
+        'SELECT id, symbol, kind, threshold, base_price FROM price_alerts WHERE user_id = ? ORDER BY id', (user_id,))
+    return c.fetchall()
+
+@metrics.timed('db')
+def get_all_price_alerts():
+    c = get_connection().execute('SELECT id, user_id, symbol, kind, threshold, base_price FROM price_alerts')
+    return c.fetchall()
+
+@metrics.timed('db')
+def remove_price_alert(user_id, alert_id):
+    """Delete one of a user's alerts. Returns True if it existed."""
+    with transaction() as c:
+        c.execute('DELETE FROM price_alerts WHERE id = ? AND user_id = ?', (alert_id, user_id))
+        return c.rowcount > 0
 
+@metrics.timed('db')
+def delete_price_alerts(alert_ids):
+    """Delete fired alerts in one transaction."""
+    with transaction() as c:
+        c.executemany('DELETE FROM price_alerts WHERE id = ?', [(alert_id,) for alert_id in alert_ids])
+
+@metrics.timed('db')
+def add_order(user_id, symbol, side, order_type, shares, limit_price=None, stop_price=None):
+    """Store a resting order. side is 'buy' or 'sell'; order_type is 'limit', 'stop' or 'stop_limit'. Returns its id."""
+    with transaction() as c:
+        c.execute('''
+            INSERT INTO orders (user_id, symbol, side, order_type, shares, limit_price, stop_price, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, symbol, side, order_type, shares, limit_price, stop_price, datetime.now()))
+        return c.lastrowid
+
+@metrics.timed('db')
+def get_open_orders(user_id):
+    c = get_connection().execute('''
+        SELECT id, symbol, side, order_type, shares, limit_price, stop_price, status
+        FROM orders WHERE user_id = ? AND status IN ('open', 'triggered') ORDER BY id
+    ''', (user_id,))
+    return c.fetchall()
+
+@metrics.timed('db')
+def get_all_open_orders():
+    c = get_connection().execute('''
+        SELECT id, user_id, symbol, side, order_type, shares, limit_price, stop_price, status = 'triggered'
+        FROM orders WHERE status IN ('open', 'triggered')
+    ''')
+    return c.fetchall()
+
+@metrics.timed('db')
+def cancel_order(user_id, order_id):
+    """Cancel one of a user's resting orders. Returns True if it was still open."""
+    with transaction() as c:
+        c.execute('''
+            UPDATE orders SET status = 'cancelled', updated_at = ?
+            WHERE id = ? AND user_id = ? AND status IN ('open', 'triggered')
+        ''', (datetime.now(), order_id, user_id))
+        return c.rowcount > 0
+
+@metrics.timed('db')
+def mark_orders_triggered(order_ids):
+    """Record that stop-limit orders hit their stop and now rest as limit orders."""
+    with transaction() as c:
+        c.executemany(
+            "UPDATE orders SET status = 'triggered', updated_at = ? WHERE id = ? AND status = 'open'",
+            [(datetime.now(), order_id) for order_id in order_ids])
+
+@metrics.timed('db')
+def fill_order(order_id, price):
+    """Fill a resting order at price in one transaction with the trade it creates.
+
+    An order the user can no longer cover (not enough cash or shares) is
+    marked 'rejected' instead.
+
+    Returns:
+        dict with 'status' ('filled' or 'rejected') plus the execute_buy/execute_sell
+        result or a 'reason', or None if the order was no longer open
+    """
+    try:
+        with transaction(immediate=True) as c:
+            c.execute('''
+                SELECT user_id, symbol, side, shares FROM orders
+                WHERE id = ? AND status IN ('open', 'triggered')
+            ''', (order_id,))
+            row = c.fetchone()
+            if row is None:
+                return None
+            user_id, symbol, side, shares = row
+            execute = execute_buy if side == 'buy' else execute_sell
+            result = execute(user_id, symbol, shares, price)
+            c.execute('''
+                UPDATE orders SET status = 'filled', fill_price = ?, updated_at = ? WHERE id = ?
+            ''', (price, datetime.now(), order_id))
+    except (InsufficientFundsError, InsufficientSharesError) as e:
+        with transaction() as c:
+            c.execute("UPDATE orders SET status = 'rejected', updated_at = ? WHERE id = ?", (datetime.now(), order_id))
+        return {'status': 'rejected', 'reason': str(e)}
+    result['status'] = 'filled'
+    return result
+
+@metrics.timed('db')
+def fill_orders(fills):
+    """Fill [(order_id, price), ...], each in its own transaction.
+
+    Returns:
+        List of (order_id, result) where result is as for fill_order, or an
+        exception for fills that failed unexpectedly
+    """
+    results = []
+    for order_id, price in fills:
+        try:
+            results.append((order_id, fill_order(order_id, price)))
+        except Exception as e:
+            print(f"Error filling order {order_id}: {e}")
+            results.append((order_id, e))
+    return results
+
+@metrics.timed('db')
+def get_cached_sentiments(headline_hashes):
+    """Look up stored FinBERT results. Returns {headline_hash: (sentiment, confidence)}."""
+    found = {}
+    conn = get_connection()
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(headline_hashes), 500):
+        chunk = headline_hashes[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        c = conn.execute(f'SELECT headline_hash, sentiment, confidence FROM sentiment_cache WHERE headline_hash IN ({placeholders})', chunk)
+        for headline_hash, sentiment, confidence in c.fetchall():
+            found[headline_hash] = (sentiment, confidence)
+    return found
+
+@metrics.timed('db')
+def save_sentiments(rows):
+    """Store FinBERT results given as (headline_hash, model_id, sentiment, confidence) tuples."""
+    with transaction() as c:
+        c.executemany('''
+            INSERT OR REPLACE INTO sentiment_cache (headline_hash, model_id, sentiment, confidence)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+
+# Initialize the database when the module is imported
+init_db()
\ No newline at end of file
@@ -1,35 +1,228 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
 import headlineNewsScraper as hns
+import database as db
 
-# Load the pre-trained FinBERT model
-tokenizer = AutoTokenizer.from_pretrained("ProsusAI/finbert")
-model = AutoModelForSequenceClassification.from_pretrained("ProsusAI/finbert")
+MODEL_ID = "ProsusAI/finbert"
+# Torch intra-op threads used per forward pass (defaults to torch's own choice)
+FINBERT_NUM_THREADS = os.getenv("FINBERT_NUM_THREADS")
+# Maximum headlines per forward pass
+FINBERT_BATCH_SIZE = int(os.getenv("FINBERT_BATCH_SIZE", "32"))
+# Headlines kept in the in-memory front of the sentiment cache (SQLite holds the rest)
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "4096"))
 
 # Labels from the model (the order matters)
 labels = ["negative", "neutral", "positive"]
 
-def analyze_sentiment(text):
-    # Tokenize and get model outputs
-    inputs = tokenizer(text, return_tensors="pt", truncation=True)
-    outputs = model(**inputs)
+# torch, tokenizer and model are loaded lazily by _load_model()
+torch = None
+tokenizer = None
+model = None
+
+_ready = threading.Event()
+_load_lock = threading.Lock()
+_warmup_thread = None
+_load_seconds = None
+_load_error = None
+
+
+class ModelLoadingError(Exception):
+    """Raised when FinBERT is needed before it has finished loading."""
+
+    def __init__(self):
+        super().__init__("FinBERT is still loading, please try again shortly.")
+
+
+def _load_model():
+    """Import torch/transformers, load FinBERT and run one warm-up pass."""
+    global torch, tokenizer, model, _load_seconds, _load_error
+    with _load_lock:
+        if _ready.is_set():
+            return
+        started = time.monotonic()
+        try:
+            import torch as _torch
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+            if FINBERT_NUM_THREADS:
+                _torch.set_num_threads(int(FINBERT_NUM_THREADS))
+
+            # Load the pre-trained FinBERT model
+            _tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+            _model = AutoModelForSequenceClassification.from_pretrained(MODEL_ID)
+            _model.eval()
+
+            # First forward pass allocates kernels/buffers; pay for it here, not on a user's request
+            with _torch.inference_mode():
+                _model(**_tokenizer(["warm-up"], return_tensors="pt"))
+        except Exception as e:
+            _load_error = e
+            print(f"Error loading FinBERT: {e}")
+            return
+
+        torch, tokenizer, model = _torch, _tokenizer, _model
+        _load_error = None
+        _load_seconds = time.monotonic() - started
+        _ready.set()
+        print(f"FinBERT ready after {_load_seconds:.1f}s")
 
-    # Convert logits to probabilities
-    probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-    sentiment_idx = torch.argmax(probs).item()
 
+def start_warmup():
+    """Start loading FinBERT in a background thread. Safe to call repeatedly."""
+    global _warmup_thread
+    if _ready.is_set() or (_warmup_thread is not None and _warmup_thread.is_alive()):
+        return
+    _warmup_thread = threading.Thread(target=_load_model, name="finbert-warmup", daemon=True)
+    _warmup_thread.start()
+
+
+def model_status():
+    """Loading state of FinBERT: 'not started', 'loading', 'ready' or 'failed'."""
+    if _ready.is_set():
+        state = "ready"
+    elif _warmup_thread is not None and _warmup_thread.is_alive():
+        state = "loading"
+    elif _load_error is not None:
+        state = "failed"
+    else:
+        state = "not started"
     return {
-        "text": text,
-        "sentiment": labels[sentiment_idx],
-        "confidence": float(probs[0][sentiment_idx].detach())
+        "state": state,
+        "load_seconds": round(_load_seconds, 1) if _load_seconds is not None else None,
+        "error": str(_load_error) if _load_error is not None else None,
     }
 
-def analyze_stock_headlines(symbol):
-    headlines = hns.get_stock_headlines(symbol)
+
+def analyze_sentiment_batch(texts):
+    """Classify many texts with one padded forward pass per batch.
+
+    Raises ModelLoadingError (and starts loading) if FinBERT isn't ready yet.
+    """
+    if not _ready.is_set():
+        start_warmup()
+        raise ModelLoadingError()
+
+    results = []
+    for start in range(0, len(texts), FINBERT_BATCH_SIZE):
+        batch = texts[start:start + FINBERT_BATCH_SIZE]
+        # Pad to the longest text in the batch only
+        inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True)
+        with torch.inference_mode():
+            logits = model(**inputs).logits
+
+        # Convert logits to probabilities for the whole batch at once
+        probs = torch.softmax(logits, dim=-1)
+        confidences, sentiment_idxs = probs.max(dim=-1)
+
+        for text, sentiment_idx, confidence in zip(batch, sentiment_idxs.tolist(), confidences.tolist()):
+            results.append({
+                "text": text,
+                "sentiment": labels[sentiment_idx],
+                "confidence": confidence
+            })
+    return results
+
+def analyze_sentiment(text):
+    return analyze_sentiment_batch([text])[0]
+
+
+_sentiment_cache = OrderedDict()  # headline key -> (sentiment, confidence)
+_sentiment_cache_lock = threading.Lock()
+_sentiment_stats = {"memory_hits": 0, "db_hits": 0, "inferred": 0}
+
+
+def headline_key(text):
+    """Cache key for a headline: hash of the model ID and whitespace/case-normalized text."""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(f"{MODEL_ID}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def _remember(key, value):
+    # Caller must hold _sentiment_cache_lock
+    _sentiment_cache[key] = value
+    _sentiment_cache.move_to_end(key)
+    while len(_sentiment_cache) > SENTIMENT_CACHE_SIZE:
+        _sentiment_cache.popitem(last=False)
+
+
+def analyze_headlines_cached(texts):
+    """Classify texts, running FinBERT only on headlines not seen before.
+
+    Lookups go to the in-memory LRU first, then the sentiment_cache table;
+    only the remaining headlines are inferred (and then stored in both).
+
+    Returns:
+        (results, stats) where stats counts memory_hits, db_hits and inferred for this call
+    """
+    keys = [headline_key(text) for text in texts]
+    found = {}
+    with _sentiment_cache_lock:
+        for key in keys:
+            if key in _sentiment_cache:
+                _sentiment_cache.move_to_end(key)
+                found[key] = _sentiment_cache[key]
+    memory_hits = len(found)
+
+    missing = list(dict.fromkeys(key for key in keys if key not in found))
+    stored = db.get_cached_sentiments(missing) if missing else {}
+    found.update(stored)
+
+    to_infer = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            to_infer.setdefault(key, text)
+    if to_infer:
+        inferred = analyze_sentiment_batch(list(to_infer.values()))
+        new_rows = []
+        for key, result in zip(to_infer, inferred):
+            found[key] = (result["sentiment"], result["confidence"])
+            new_rows.append((key, MODEL_ID, result["sentiment"], result["confidence"]))
+        db.save_sentiments(new_rows)
+
+    with _sentiment_cache_lock:
+        for key in stored:
+            _remember(key, stored[key])
+        for key in to_infer:
+            _remember(key, found[key])
+        _sentiment_stats["memory_hits"] += memory_hits
+        _sentiment_stats["db_hits"] += len(stored)
+        _sentiment_stats["inferred"] += len(to_infer)
+
+    results = [
+        {"text": text, "sentiment": found[key][0], "confidence": found[key][1]}
+        for key, text in zip(keys, texts)
+    ]
+    stats = {"memory_hits": memory_hits, "db_hits": len(stored), "inferred": len(to_infer)}
+    return results, stats
+
+
+def get_sentiment_cache_stats():
+    """Cumulative sentiment cache counters and hit rate since startup."""
+    with _sentiment_cache_lock:
+        stats = dict(_sentiment_stats)
+        stats["size"] = len(_sentiment_cache)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["inferred"]
+    stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups * 100, 1) if lookups else 0.0
+    return stats
+
+
+def analyze_stock_headlines(symbol, headlines=None):
+    """Summarize the sentiment of symbol's headlines.
+
+    Pass headlines already fetched (e.g. on the I/O pool) to keep the
+    download off the model's thread; otherwise they are fetched here.
+    """
+    if headlines is None:
+        headlines = hns.get_stock_headlines(symbol)
     results = []
-    for headline in headlines:
-        sentiment_result = analyze_sentiment(headline)
-        results.append(sentiment_result)
+    if headlines:
+        results, stats = analyze_headlines_cached(headlines)
+        cached = stats["memory_hits"] + stats["db_hits"]
+        print(f"Sentiment cache for {symbol}: {cached}/{len(headlines)} hits "
+              f"({stats['memory_hits']} memory, {stats['db_hits']} db), {stats['inferred']} inferred")
     
     if not results:
         return "⚠️ No headlines found for analysis."
@@ -0,0 +1,65 @@
+# Discord rejects messages longer than this many characters
+DISCORD_MESSAGE_LIMIT = 2000
+
+# /help_investor is sent as one message per section so each stays under the limit
+HELP_SECTIONS = (
+    ('💼 Account & Trading', (
+        "`/investor <starting_funds>`: Become an investor with specified starting funds.",
+        "`/stop_grinding`: Remove investor role and data.",
+        "`/get_funds`: Check your available funds.",
+        "`/buy_shares <symbol> <shares>`: Buy a specific number of shares.",
+        "`/buy_dollars <symbol> <dollars>`: Buy shares worth a specific dollar amount.",
+        "`/sell_shares <symbol> <shares>`: Sell a specific number of shares.",
+        "`/sell_dollars <symbol> <dollars>`: Sell shares worth a specific dollar amount.",
+        "`/portfolio`: View your current portfolio.",
+        "`/trade_history`: View your trade history, newest first, with buttons to page through it.",
+    )),
+    ('📝 Orders', (
+        "`/limit_order <buy|sell> <symbol> <shares> <limit_price>`: Buy at or below / sell at or above a price.",
+        "`/stop_order <buy|sell> <symbol> <shares> <stop_price>`: Buy / sell at market once the price rises / falls to the stop.",
+        "`/stop_limit_order <buy|sell> <symbol> <shares> <stop_price> <limit_price>`: Place a limit order once the stop price is reached.",
+        "`/my_orders`: View your open orders.",
+        "`/cancel_order <id>`: Cancel an open order.",
+    )),
+    ('📈 Market Data', (
+        "`/price <symbol>`: Get current market price of a stock.",
+        "`/get_info <symbol>`: Get basic information about a stock.",
+        "`/search_stocks <query> <num_results>`: Search for stocks by 'popular', 'sp500', or 'nasdaq100'. Num results is optional (default 10). Tells you random stocks from the selected category.",
+        "`/screen <universe> <metric> <top_n>`: Rank 'popular', 'sp500' or 'nasdaq100' stocks by sharpe, return, volatility, drawdown or momentum (defaults: sp500 sharpe 10).",
+        "`/graph <symbol> <period> <interval>`: Get a graph of closing prices for a stock. Period and interval are optional (default 1mo 1d).",
+        "`/finBERTsays <symbol>`: Get FinBERT analysis of stock news.",
+        "`/advice <symbol>`: Get investment advice for a stock.",
+    )),
+    ('📊 Portfolio Analytics', (
+        "`/networth`: Check your total net worth (funds + stock value).",
+        "`/networth_history <period>`: Chart your net worth over time. Period is optional (default 1mo).",
+        "`/total_return`: Check your total return percentage since becoming an investor.",
+        "`/stats`: View your trading statistics (win rate, P&L, average return, best and worst trade).",
+        "`/get_best_trades <top_n>`: View your top N best trades (default 5).",
+        "`/get_worst_trades <top_n>`: View your top N worst trades (default 5).",
+    )),
+    ('👀 Watchlist & Alerts', (
+        "`/watchlist <symbol>`: Add a stock to your watchlist.",
+        "`/unwatch <symbol>`: Remove a stock from your watchlist.",
+        "`/my_watchlist`: View your current watchlist.",
+        "`/alert <symbol> <above|below|move> <value>`: Get a DM when a stock rises above / falls below a price it hasn't reached yet, or moves by a percent from now (e.g. `/alert AAPL move 5`).",
+        "`/my_alerts`: View your price alerts.",
+        "`/cancel_alert <id>`: Cancel a price alert.",
+    )),
+    ('🏆 Social & Admin', (
+        "`/leaderboard <page>`: View the top investors by net worth, 5 per page. Page is optional (default 1).",
+        "`/check_portfolio @user`: View another investor's portfolio.",
+        "`/compare_portfolio @user`: Compare your portfolio with another investor's portfolio.",
+        "`/bot_status`: Show bot startup time, FinBERT loading state, sentiment cache hit rate and worker pool queues.",
+        "`/bot_metrics <top_n>`: (Admins) Show latency percentiles per command, upstream call and database function.",
+    )),
+)
+
+
+def help_messages():
+    """The /help_investor text as one message per section."""
+    messages = []
+    for i, (title, lines) in enumerate(HELP_SECTIONS):
+        header = "📚 **Available Commands:**\n" if i == 0 else ""
+        messages.append(header + f"**{title}**\n" + "\n".join(f"- {line}" for line in lines))
+    return messages
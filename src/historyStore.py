@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import marketData
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_DIR = os.getenv('HISTORY_DIR', os.path.join(PROJECT_ROOT, 'cache', 'history'))
+# Seconds before stored bars are checked upstream for newer ones
+HISTORY_REFRESH_DAILY = float(os.getenv('HISTORY_REFRESH_DAILY', '3600'))
+HISTORY_REFRESH_INTRADAY = float(os.getenv('HISTORY_REFRESH_INTRADAY', '60'))
+
+BAR_DTYPE = marketData.BAR_DTYPE
+COLUMNS = marketData.COLUMNS
+
+DAY = 86400
+PERIOD_SECONDS = {
+    '1d': DAY, '5d': 5 * DAY, '1mo': 31 * DAY, '3mo': 92 * DAY, '6mo': 183 * DAY,
+    '1y': 366 * DAY, '2y': 731 * DAY, '5y': 1827 * DAY, '10y': 3653 * DAY,
+}
+# How far back Yahoo serves intraday bars
+INTRADAY_LIMIT_SECONDS = {
+    '1m': 7 * DAY, '2m': 59 * DAY, '5m': 59 * DAY, '15m': 59 * DAY, '30m': 59 * DAY,
+    '60m': 729 * DAY, '90m': 59 * DAY, '1h': 729 * DAY,
+}
+
+
+def period_start(period, now=None):
+    """Epoch seconds at the start of a yfinance-style period like '1mo' or '1y'."""
+    now = now or time.time()
+    if period == 'ytd':
+        year_start = datetime(datetime.now(timezone.utc).year, 1, 1, tzinfo=timezone.utc)
+        return int(year_start.timestamp())
+    if period not in PERIOD_SECONDS:
+        raise ValueError(f"unsupported period: {period}")
+    return int(now - PERIOD_SECONDS[period])
+
+
+class HistoryStore:
+    """Local OHLCV store keyed by (symbol, interval).
+
+    Bars live in one .npy file per key and are read back memory-mapped. Each
+    request only downloads what the file is missing: older bars when a longer
+    period is asked for, and bars after the last stored one once the refresh
+    interval has passed. Repeated reads within that interval never touch the
+    network, including for symbols Yahoo returned no bars for.
+    """
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._arrays = {}  # key -> memory-mapped bars
+        self._meta = {}  # key -> {'covered_from': ts, 'checked_at': ts}
+
+    def _paths(self, symbol, interval):
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', f"{symbol}_{interval}")
+        return os.path.join(self.directory, name + '.npy'), os.path.join(self.directory, name + '.json')
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _load(self, key):
+        # Caller must hold the key lock
+        if key in self._arrays:
+            return self._arrays[key], self._meta[key]
+        bars_path, meta_path = self._paths(*key)
+        if not (os.path.exists(bars_path) and os.path.exists(meta_path)):
+            return np.empty(0, dtype=BAR_DTYPE), None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        bars = np.load(bars_path, mmap_mode='r')
+        self._arrays[key], self._meta[key] = bars, meta
+        return bars, meta
+
+    def _save(self, key, bars, meta):
+        # Caller must hold the key lock; write to temp files then swap in atomically
+        os.makedirs(self.directory, exist_ok=True)
+        bars_path, meta_path = self._paths(*key)
+        with open(bars_path + '.tmp', 'wb') as f:
+            np.save(f, bars)
+        os.replace(bars_path + '.tmp', bars_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        self._arrays[key] = np.load(bars_path, mmap_mode='r')
+        self._meta[key] = meta
+
+    def _download(self, symbol, interval, start_ts, end_ts=None):
+        limit = INTRADAY_LIMIT_SECONDS.get(interval)
+        if limit is not None:
+            start_ts = max(start_ts, int(time.time() - limit))
+        if end_ts is not None and start_ts >= end_ts:
+            return np.empty(0, dtype=BAR_DTYPE)
+        frames = marketData.bars([symbol], interval, start_ts, end_ts)
+        return marketData.frame_to_bars(frames.get(symbol))
+
+    def _refresh_seconds(self, interval):
+        return HISTORY_REFRESH_DAILY if interval in ('1d', '5d', '1wk', '1mo', '3mo') else HISTORY_REFRESH_INTRADAY
+
+    def ensure(self, symbol, start_ts, interval='1d'):
+        """Make sure bars from start_ts up to now are stored, downloading only what's missing."""
+        key = (symbol, interval)
+        with self._key_lock(key):
+            bars, meta = self._load(key)
+            now = time.time()
+            if meta is None:
+                # Saved even when empty, so a symbol with no bars is only re-checked after the refresh interval
+                merged = self._download(symbol, interval, start_ts)
+                meta = {'covered_from': start_ts, 'checked_at': now}
+                self._save(key, merged, meta)
+                return self._arrays[key]
+
+            merged = np.asarray(bars)
+            changed = False
+            if start_ts < meta['covered_from'] - DAY:
+                # A longer period than before: fetch only the older bars
+                first_ts = int(merged['ts'][0]) if len(merged) else meta['covered_from']
+                merged = marketData.merge_bars(merged, self._download(symbol, interval, start_ts, first_ts))
+                meta = {**meta, 'covered_from': start_ts}
+                changed = True
+            if now - meta['checked_at'] >= self._refresh_seconds(interval):
+                # Re-fetch from the last stored bar, which may have been incomplete when saved
+                last_ts = int(merged['ts'][-1]) if len(merged) else meta['covered_from']
+                merged = marketData.merge_bars(merged, self._download(symbol, interval, last_ts))
+                meta = {**meta, 'checked_at': now}
+                changed = True
+            if changed:
+                self._save(key, merged, meta)
+            return self._arrays[key]
+
+    def _needs_download(self, key, start_ts, now):
+        with self._key_lock(key):
+            bars, meta = self._load(key)
+        if meta is None or start_ts < meta['covered_from'] - DAY:
+            return 'full', None
+        if now - meta['checked_at'] >= self._refresh_seconds(key[1]):
+            return 'update', int(bars['ts'][-1]) if len(bars) else meta['covered_from']
+        return None, None
+
+    def prefetch(self, symbols, period='1y', interval='1d', chunk_size=100):
+        """Bring many symbols up to date using one multi-ticker download per chunk.
+
+        Symbols that are new (or need a longer period) are fetched from the period
+        start; symbols that only need new bars are fetched from the oldest of their
+        last stored bars. Up-to-date symbols are skipped entirely.
+        """
+        start_ts = period_start(period)
+        now = time.time()
+        full, update, update_from = [], [], None
+        for symbol in dict.fromkeys(symbols):
+            need, last_ts = self._needs_download((symbol, interval), start_ts, now)
+            if need == 'full':
+                full.append(symbol)
+            elif need == 'update':
+                update.append(symbol)
+                update_from = last_ts if update_from is None else min(update_from, last_ts)
+
+        for group, group_start in ((full, start_ts), (update, update_from)):
+            for first in range(0, len(group), chunk_size):
+                chunk = group[first:first + chunk_size]
+                try:
+                    frames = marketData.bars(chunk, interval, group_start)
+                except Exception as e:
+                    print(f"Error prefetching history for {len(chunk)} symbols: {e}")
+                    continue
+                for symbol in chunk:
+                    self._store_download((symbol, interval), marketData.frame_to_bars(frames.get(symbol)), start_ts, now)
+
+    def _store_download(self, key, new, start_ts, now):
+        with self._key_lock(key):
+            bars, meta = self._load(key)
+            merged = marketData.merge_bars(np.asarray(bars), new)
+            covered_from = min(start_ts, meta['covered_from']) if meta else start_ts
+            self._save(key, merged, {'covered_from': covered_from, 'checked_at': now})
+
+    def get_close_matrix(self, symbols, period='1y', interval='1d'):
+        """Closing prices for many symbols as one 2-D array, read straight from the stored files.
+
+        Rows are the union of bar timestamps within the period, columns are the
+        symbols that have data. Gaps are forward-filled; values before a
+        symbol's first bar are NaN.
+
+        Returns:
+            (timestamps, symbols, matrix) with matrix of shape (len(timestamps), len(symbols))
+        """
+        start_ts = period_start(period)
+        columns, series = [], []
+        for symbol in dict.fromkeys(symbols):
+            key = (symbol, interval)
+            with self._key_lock(key):
+                bars, meta = self._load(key)
+            if len(bars) == 0:
+                continue
+            window = bars[np.searchsorted(bars['ts'], start_ts):]
+            if len(window):
+                columns.append(symbol)
+                series.append((window['ts'], window['close']))
+        if not series:
+            return np.empty(0, dtype='<i8'), [], np.empty((0, 0))
+
+        timestamps = np.unique(np.concatenate([ts for ts, _ in series]))
+        matrix = np.full((len(timestamps), len(columns)), np.nan)
+        for j, (ts, closes) in enumerate(series):
+            matrix[np.searchsorted(timestamps, ts), j] = closes
+
+        # Forward-fill gaps column-wise: carry the row index of the last valid value down
+        rows = np.where(~np.isnan(matrix), np.arange(len(timestamps))[:, None], 0)
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        matrix = matrix[rows, np.arange(len(columns))]
+        return timestamps, columns, matrix
+
+    def get_bars(self, symbol, period='1y', interval='1d'):
+        """OHLCV bars for symbol over period as a DataFrame indexed by UTC timestamp."""
+        start_ts = period_start(period)
+        bars = self.ensure(symbol, start_ts, interval)
+        if len(bars) == 0:
+            return pd.DataFrame(columns=list(COLUMNS.values()))
+        first = np.searchsorted(bars['ts'], start_ts)
+        window = bars[first:]
+        index = pd.to_datetime(window['ts'], unit='s')
+        return pd.DataFrame({column: np.asarray(window[field]) for field, column in COLUMNS.items()}, index=index)
+
+    def get_closes(self, symbol, period='1y', interval='1d'):
+        """Closing prices for symbol over period as a Series indexed by UTC timestamp."""
+        return self.get_bars(symbol, period, interval)['Close']
+
+
+store = HistoryStore()
+
+
+def get_bars(symbol, period='1y', interval='1d'):
+    return store.get_bars(symbol, period, interval)
+
+def get_closes(symbol, period='1y', interval='1d'):
+    return store.get_closes(symbol, period, interval)
+
+def prefetch(symbols, period='1y', interval='1d'):
+    store.prefetch(symbols, period, interval)
+
+def get_close_matrix(symbols, period='1y', interval='1d'):
+    return store.get_close_matrix(symbols, period, interval)
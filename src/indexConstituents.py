@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+from io import StringIO
+
+import pandas as pd
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONSTITUENTS_DIR = os.getenv('CONSTITUENTS_DIR', os.path.join(PROJECT_ROOT, 'cache', 'constituents'))
+# Seconds before a cached list is refreshed in the background
+CONSTITUENTS_TTL = float(os.getenv('CONSTITUENTS_TTL', str(24 * 3600)))
+# Seconds to wait before retrying after a failed refresh
+CONSTITUENTS_RETRY = 300
+# Offline copy shipped with the bot, used until a live list has been fetched
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'index_constituents.json')
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0 Safari/537.36"}
+
+
+def _fetch_sp500():
+    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+    resp = requests.get(url, headers=HEADERS, timeout=10)
+    resp.raise_for_status()
+    tables = pd.read_html(StringIO(resp.text))
+    df = tables[0]
+    col = "Symbol" if "Symbol" in df.columns else df.columns[0]
+    return df[col].astype(str).str.replace(".", "-", regex=False).tolist()
+
+def _fetch_nasdaq100():
+    url = "https://en.wikipedia.org/wiki/Nasdaq-100"
+    resp = requests.get(url, headers=HEADERS, timeout=10)
+    resp.raise_for_status()
+    tables = pd.read_html(StringIO(resp.text))
+    df = None
+    for t in tables:
+        cols = [c.lower() for c in t.columns.astype(str)]
+        if any(x in cols for x in ("ticker", "ticker symbol", "symbol")):
+            df = t
+            break
+    if df is None:
+        df = tables[0]
+    possible = [c for c in df.columns if c.lower() in ("ticker", "ticker symbol", "symbol")]
+    col = possible[0] if possible else df.columns[0]
+    return df[col].astype(str).str.replace(".", "-", regex=False).tolist()
+
+FETCHERS = {
+    'sp500': _fetch_sp500,
+    'nasdaq100': _fetch_nasdaq100,
+}
+INDEX_NAMES = {'sp500': 'S&P 500', 'nasdaq100': 'Nasdaq-100'}
+
+
+class ConstituentCache:
+    """Index constituent lists served from memory, then disk, then the bundled snapshot.
+
+    Lookups never wait on Wikipedia: a missing or expired list triggers a
+    background refresh and the best list on hand is returned immediately.
+    Each list is also kept as a frozenset for O(1) membership checks.
+    """
+
+    def __init__(self, directory=CONSTITUENTS_DIR, ttl=CONSTITUENTS_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._lists = {}  # index -> (tuple of symbols, frozenset of symbols, fetched_at)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._retry_at = {}  # index -> time before which failed refreshes aren't retried
+
+    def _path(self, index):
+        return os.path.join(self.directory, f"{index}.json")
+
+    def _set(self, index, symbols, fetched_at):
+        # Caller must hold the lock
+        symbols = tuple(symbols)
+        self._lists[index] = (symbols, frozenset(symbols), fetched_at)
+
+    def _load(self, index):
+        # Caller must hold the lock. Disk cache first, then the bundled snapshot (treated as expired).
+        try:
+            with open(self._path(index)) as f:
+                saved = json.load(f)
+            self._set(index, saved['symbols'], saved['fetched_at'])
+            return
+        except (OSError, ValueError, KeyError):
+            pass
+        try:
+            with open(SNAPSHOT_PATH) as f:
+                self._set(index, json.load(f)[index], 0.0)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading bundled {index} snapshot: {e}")
+            self._set(index, (), 0.0)
+
+    def refresh(self, index):
+        """Fetch a list from Wikipedia now and persist it. Keeps the old list on failure."""
+        try:
+            symbols = FETCHERS[index]()
+            if not symbols:
+                raise ValueError("empty constituent list")
+        except Exception as e:
+            print(f"Failed to fetch {index} list: {e}")
+            with self._lock:
+                self._retry_at[index] = time.time() + CONSTITUENTS_RETRY
+            return False
+        fetched_at = time.time()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(index)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'symbols': symbols, 'fetched_at': fetched_at}, f)
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            self._set(index, symbols, fetched_at)
+        return True
+
+    def _refresh_in_background(self, index):
+        # Caller must hold the lock
+        if index in self._refreshing:
+            return
+
+        def run():
+            try:
+                self.refresh(index)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(index)
+
+        self._refreshing.add(index)
+        threading.Thread(target=run, name=f"{index}-refresh", daemon=True).start()
+
+    def _entry(self, index):
+        if index not in FETCHERS:
+            raise ValueError(f"unknown source: {index}")
+        with self._lock:
+            if index not in self._lists:
+                self._load(index)
+            entry = self._lists[index]
+            now = time.time()
+            if now - entry[2] >= self.ttl and now >= self._retry_at.get(index, 0):
+                self._refresh_in_background(index)
+            return entry
+
+    def get(self, index):
+        """Constituent symbols of 'sp500' or 'nasdaq100' as a list."""
+        return list(self._entry(index)[0])
+
+    def contains(self, index, symbol):
+        return symbol in self._entry(index)[1]
+
+
+constituents = ConstituentCache()
+
+
+def get_constituents(index):
+    return constituents.get(index)
+
+def is_constituent(index, symbol):
+    return constituents.contains(index, symbol)
+
+def index_names(symbol):
+    """Names of the indexes whose cached lists include symbol, e.g. ['S&P 500', 'Nasdaq-100']."""
+    return [INDEX_NAMES[index] for index in FETCHERS if is_constituent(index, symbol)]
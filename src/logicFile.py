@@ -1,34 +1,8 @@
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend
-import matplotlib.pyplot as plt
-import yfinance as yf
-from io import BytesIO
-
-def graph_closing_prices(symbol, period='1mo', interval='1d'):
-    """Fetch closing prices for a given stock symbol."""
-    try:
-        rets = yf.download(tickers=symbol, period=period, interval=interval, auto_adjust=True)
-        closing_price = rets['Close']
-
-        # Plotting
-        plt.figure(figsize=(10, 5))
-        closing_price.plot(title=f'Closing Prices for {symbol}')
-        plt.xlabel('Date')
-        plt.ylabel('Price (USD)')
-        plt.tight_layout()
-
-        # Save plot to a BytesIO buffer
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=100)
-        img_buffer.seek(0)  # Rewind the buffer to the beginning
-        plt.close()  # Close the plot to free memory
-
-        return rets['Close'], img_buffer   
-    except Exception as e:
-        print(f"Error fetching closing prices for {symbol}: {e}")
-        return pd.Series(), None
+import historyStore
+import ratesService
+import metrics
 
 def _annualize_return(total_return, period_str):
     """Convert total return over a period to annualized return."""
@@ -45,14 +19,14 @@ def _annualize_return(total_return, period_str):
     annualized = (1 + total_return) ** periods_per_year - 1
     return annualized
 
+@metrics.timed('upstream', counted=False)
 def annualized_return(symbol, period='1y', interval='1d'):
     try:
-        rets = yf.download(tickers=symbol, period=period, interval=interval, auto_adjust=True)
-        daily_rets = rets['Close'].pct_change().dropna()
+        closes = historyStore.get_closes(symbol, period, interval)
+        if closes.empty:
+            raise ValueError("no price history")
+        daily_rets = closes.pct_change().dropna()
         total_return = (1 + daily_rets).prod() - 1
-        
-        if isinstance(total_return, pd.Series):
-            total_return = total_return.iloc[0]
 
         annualized = _annualize_return(total_return, period)
         annualized_pct = round(annualized * 100, 2)
@@ -61,13 +35,14 @@ def annualized_return(symbol, period='1y', interval='1d'):
         print(f"Error calculating annualized return for {symbol}: {e}")
         return None
 
+@metrics.timed('upstream', counted=False)
 def annualized_volatility(symbol, period='1y', interval='1d'):
     try:
-        rets = yf.download(tickers=symbol, period=period, interval=interval, auto_adjust=True)
-        daily_rets = rets['Close'].pct_change().dropna()
+        closes = historyStore.get_closes(symbol, period, interval)
+        if closes.empty:
+            raise ValueError("no price history")
+        daily_rets = closes.pct_change().dropna()
         annual_volatility = daily_rets.std() * (periods_per_year := 252) ** 0.5
-        if isinstance(annual_volatility, pd.Series):
-            annual_volatility = annual_volatility.iloc[0]
         volatility = round(annual_volatility * 100, 2)
         return volatility
     except Exception as e:
@@ -75,6 +50,7 @@ def annualized_volatility(symbol, period='1y', interval='1d'):
         return None
 
 
+@metrics.timed('upstream', counted=False)
 def get_Sharpe_ratio(symbol):
     """Calculate Sharpe ratio: (return - risk_free_rate) / volatility
     
@@ -90,10 +66,9 @@ def get_Sharpe_ratio(symbol):
         
         # Sharpe = (return - risk_free_rate) / volatility
 
-        #Calculate Risk Free Rate dynamically
+        # Risk free rate from the cached T-bill yield; never waits on Yahoo
 
-        irx = yf.Ticker("^IRX")
-        rfr = irx.history(period="1d")["Close"].iloc[-1] / 100 
+        rfr = ratesService.get_risk_free_rate()
 
         sharpe_ratio = (annualized_return_value / 100 - rfr) / (annualized_volatility_value / 100)
         return round(sharpe_ratio, 2)
@@ -101,6 +76,7 @@ def get_Sharpe_ratio(symbol):
         print(f"Error calculating Sharpe ratio for {symbol}: {e}")
         return None
 
+@metrics.timed('upstream', counted=False)
 def investment_advice(symbol):
     sharpe = get_Sharpe_ratio(symbol)
     ann_ret = annualized_return(symbol)
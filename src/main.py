@@ -1,20 +1,45 @@
 import discord
+import asyncio
 import requests
 from discord.ext import commands
 from dotenv import load_dotenv
 import os
 import random
-import sqlite3
+import time
+from datetime import datetime
+from io import BytesIO
+
+load_dotenv()
 
 import yfinanceMain as yfMain
 import database as db
-from finBERTAIlogic import analyze_stock_headlines
-from logicFile import investment_advice, graph_closing_prices
-
+import finBERTAIlogic as finbert
+import headlineNewsScraper as hns
+import ratesService
+import screener
+from logicFile import investment_advice
+import chartRenderer
+import historyStore
+import priceBoard
+import alertEngine
+import orderBook
+import metrics
+import helpText
+from workerPools import run_io, run_db, run_model, run_cpu, PoolBusyError, pool_status, shutdown_pools
 
 
-load_dotenv()
 DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
+STARTED_AT = time.monotonic()
+LEADERBOARD_PAGE_SIZE = int(os.getenv('LEADERBOARD_PAGE_SIZE', '5'))
+TRADE_HISTORY_PAGE_SIZE = int(os.getenv('TRADE_HISTORY_PAGE_SIZE', '10'))
+# Seconds the /trade_history paging buttons stay active
+TRADE_HISTORY_VIEW_TIMEOUT = 300
+# Seconds between background price refreshes
+PRICE_POLL_MARKET_HOURS = float(os.getenv('PRICE_POLL_MARKET_HOURS', '15'))
+PRICE_POLL_AFTER_HOURS = float(os.getenv('PRICE_POLL_AFTER_HOURS', '600'))
+# Seconds between net-worth snapshots of every user
+NETWORTH_SNAPSHOT_MARKET_HOURS = float(os.getenv('NETWORTH_SNAPSHOT_MARKET_HOURS', '300'))
+NETWORTH_SNAPSHOT_AFTER_HOURS = float(os.getenv('NETWORTH_SNAPSHOT_AFTER_HOURS', '3600'))
 intents = discord.Intents.default()
 
 intents.message_content = True
@@ -23,9 +48,86 @@ intents.members = True
 
 bot = commands.Bot(command_prefix='/', intents=intents)
 
+# Seconds from process start until the first on_ready; FinBERT loading is tracked separately
+time_to_ready = None
+price_poller = None
+networth_recorder = None
+
 @bot.event
 async def on_ready():
-    print(f'Bot is ready. Logged in as {bot.user}')
+    global time_to_ready, price_poller, networth_recorder
+    if time_to_ready is None:
+        time_to_ready = time.monotonic() - STARTED_AT
+    print(f'Bot is ready after {time_to_ready:.1f}s. Logged in as {bot.user}')
+    # Load FinBERT in the background now that the bot is online
+    finbert.start_warmup()
+    if ratesService.rates.is_stale():
+        ratesService.rates.refresh_in_background()
+    metrics.start_exporters()
+    if price_poller is None or price_poller.done():
+        alertEngine.engine.load(await run_db(db.get_all_price_alerts))
+        orderBook.book.load(await run_db(db.get_all_open_orders))
+        price_poller = asyncio.create_task(poll_prices())
+    if networth_recorder is None or networth_recorder.done():
+        networth_recorder = asyncio.create_task(record_networth())
+
+async def poll_prices():
+    """Keep the price board fresh for every tracked symbol, firing price alerts
+    and filling resting orders on each refresh.
+
+    Polls every PRICE_POLL_MARKET_HOURS seconds while the market is open and
+    every PRICE_POLL_AFTER_HOURS seconds otherwise.
+    """
+    while True:
+        try:
+            symbols = await run_db(db.get_tracked_symbols)
+            if symbols:
+                prices = await run_io(priceBoard.fetch_and_publish, symbols, False)
+                fired = alertEngine.engine.evaluate(prices)
+                if fired:
+                    await send_alert_notifications(fired)
+                fills, triggered = orderBook.book.match(prices)
+                if triggered:
+                    try:
+                        await run_db(db.mark_orders_triggered, [order.id for order in triggered])
+                    except Exception:
+                        orderBook.book.restore(fills, triggered)  # Still open in the database, so match again next tick
+                        raise
+                if fills:
+                    await execute_order_fills(fills)
+        except PoolBusyError:
+            pass  # Skip this round; commands are using the pools
+        except Exception as e:
+            print(f"Error polling prices: {e}")
+        await asyncio.sleep(PRICE_POLL_MARKET_HOURS if yfMain.is_market_open() else PRICE_POLL_AFTER_HOURS)
+
+async def record_networth():
+    """Snapshot every user's cash and equity in one bulk pass, then downsample old snapshots.
+
+    Runs every NETWORTH_SNAPSHOT_MARKET_HOURS seconds while the market is open
+    and every NETWORTH_SNAPSHOT_AFTER_HOURS seconds otherwise. Prices come from
+    the price board, which the poller keeps fresh.
+    """
+    while True:
+        try:
+            current_prices = await generate_current_prices()
+            await run_db(db.record_networth_snapshot, current_prices)
+            await run_db(db.downsample_networth_history)
+        except PoolBusyError:
+            pass  # Skip this round; commands are using the pools
+        except Exception as e:
+            print(f"Error recording net worth snapshots: {e}")
+        await asyncio.sleep(NETWORTH_SNAPSHOT_MARKET_HOURS if yfMain.is_market_open() else NETWORTH_SNAPSHOT_AFTER_HOURS)
+
+@bot.before_invoke
+async def start_command_metrics(ctx):
+    ctx.metrics_token = metrics.start_invocation(ctx.command.qualified_name)
+
+@bot.after_invoke
+async def finish_command_metrics(ctx):
+    token = getattr(ctx, 'metrics_token', None)
+    if token is not None:
+        metrics.finish_invocation(token, failed=ctx.command_failed)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -34,31 +136,129 @@ async def on_command_error(ctx, error):
         await ctx.send("⚠️ You need to be an Investor to use this command. Use `/investor` to get the role.")
     elif isinstance(error, commands.CommandNotFound):
         await ctx.send("⚠️ Command not found. Use `/help_investor` for available commands.")
+    elif isinstance(error, commands.MissingPermissions):
+        await ctx.send("⚠️ This command is for server admins only.")
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(f"⚠️ Missing required argument: {error.param}")
     elif isinstance(error, commands.BadArgument):
         await ctx.send("⚠️ Invalid argument provided.")
+    elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, PoolBusyError):
+        # Commands re-raise PoolBusyError past their own catch-all so every one gets this reply
+        await ctx.send("⏳ The bot is busy right now, please try again in a moment.")
     else:
         await ctx.send(f"⚠️ An error occurred: {error}")
         print(f"Error: {error}")
 
-def generate_current_prices():
-    conn = sqlite3.connect('user_data.db')
-    c = conn.cursor()
-    c.execute('SELECT DISTINCT symbol FROM portfolios')
-    symbols = [row[0] for row in c.fetchall()]
-    conn.close()
-
-    current_prices = {}
-    for symbol in symbols:
-        price = yfMain.get_stock_price(symbol)
-        if price is not None:
-            current_prices[symbol] = price
+async def get_discord_user(user_id):
+    """A user from the client cache, falling back to a timed API call."""
+    user = bot.get_user(user_id)
+    if user is None:
+        with metrics.track('discord', 'fetch_user'):
+            user = await bot.fetch_user(user_id)
+    return user
+
+async def send_dms(header, lines_by_user):
+    """Send each user one DM of header plus their lines, split to stay under Discord's 2000 chars."""
+    async def notify(user_id, lines):
+        try:
+            user = await get_discord_user(user_id)
+            message = header + "\n"
+            for line in lines:
+                if len(message) + len(line) + 1 > 2000:
+                    await user.send(message)
+                    message = ""
+                message += line + "\n"
+            await user.send(message)
+        except Exception as e:
+            print(f"Error sending DM to {user_id}: {e}")
+
+    await asyncio.gather(*(notify(user_id, lines) for user_id, lines in lines_by_user.items()))
+
+async def send_alert_notifications(fired):
+    """Delete fired alerts in one write and send each user a single DM listing theirs."""
+    try:
+        await run_db(db.delete_price_alerts, [alert.id for alert, price in fired])
+    except Exception:
+        alertEngine.engine.restore(fired)  # Still in the database, so they fire again on the next tick
+        raise
+    by_user = {}
+    for alert, price in fired:
+        by_user.setdefault(alert.user_id, []).append(f"- {alertEngine.describe(alert)} (now ${price})")
+    await send_dms("🔔 **Price alerts triggered:**", by_user)
+
+async def execute_order_fills(fills):
+    """Fill matched orders in the database and DM each user the outcome of theirs."""
+    orders = {order.id: (order, price) for order, price in fills}
+    try:
+        results = await run_db(db.fill_orders, [(order.id, price) for order, price in fills])
+    except Exception:
+        orderBook.book.restore(fills, [])  # Still open (or triggered) in the database, so retry on the next tick
+        raise
+    by_user = {}
+    for order_id, result in results:
+        order, price = orders[order_id]
+        if isinstance(result, Exception):
+            orderBook.book.add(order)  # Still open in the database, so retry on the next tick
+            continue
+        if result is None:
+            continue  # Cancelled while being matched
+        if result['status'] == 'filled':
+            line = (f"- ✅ #{order_id} {orderBook.describe(order)} filled at ${price} "
+                    f"for a total of ${round(result['total'], 2)}")
+        else:
+            line = f"- ⚠️ #{order_id} {orderBook.describe(order)} rejected: {result['reason']}"
+        by_user.setdefault(order.user_id, []).append(line)
+    await send_dms("📈 **Orders executed:**", by_user)
+
+async def get_prices(symbols):
+    """Prices for symbols from the price board, fetching only missing or stale ones."""
+    current_prices, missing = priceBoard.board.get_many(symbols)
+    if missing:
+        current_prices.update(await run_io(priceBoard.fetch_and_publish, missing))
     return current_prices
 
+async def generate_current_prices():
+    """Prices for every held symbol; only needed when ranking all users."""
+    symbols = await run_db(db.get_held_symbols)
+    return await get_prices(symbols)
+
+async def price_snapshot(*user_ids):
+    """Prices for just the symbols these users hold, resolved once and shared by the whole command."""
+    symbols = await run_db(db.get_held_symbols, user_ids)
+    return await get_prices(symbols)
+
+async def render_closing_chart(symbol, period, interval):
+    """PNG bytes of a closing price chart: data from the history store, rendering in the
+    cpu process pool, and identical requests within one bar served from the chart cache."""
+    closes = await run_io(historyStore.get_closes, symbol, period, interval)
+    if closes.empty:
+        return None
+    key = chartRenderer.chart_key(symbol, period, interval, closes.index[-1])
+    png = chartRenderer.chart_cache.get(key)
+    if png is None:
+        png = await run_cpu(chartRenderer.render_line_chart, closes.index.to_numpy(), closes.to_numpy(),
+                            f'Closing Prices for {symbol}')
+        chartRenderer.chart_cache.put(key, png)
+    return png
+
+async def render_networth_chart(user_id, name, period):
+    """PNG bytes of a user's net worth over period, drawn from stored snapshots without fetching
+    any quotes. Returns None if there are no snapshots in the period yet."""
+    rows = await run_db(db.get_networth_history, user_id, historyStore.period_start(period))
+    if not rows:
+        return None
+    key = chartRenderer.chart_key(f"networth:{user_id}", period, 'snapshots', rows[-1][0])
+    png = chartRenderer.chart_cache.get(key)
+    if png is None:
+        dates = [datetime.fromtimestamp(ts) for ts, cash, equity in rows]
+        values = [cash + equity for ts, cash, equity in rows]
+        png = await run_cpu(chartRenderer.render_line_chart, dates, values, f'Net Worth of {name}', 'Net Worth (USD)')
+        chartRenderer.chart_cache.put(key, png)
+    return png
+
 def calculate_roi(portfolio, current_prices, starting_funds):
-    total_invested = sum(entry_price * shares for symbol, shares, entry_price in portfolio)
-    current_value = sum(current_prices.get(symbol, 0) * shares for symbol, shares, entry_price in portfolio)
+    total_invested = sum(invested for symbol, shares, entry_price, invested in portfolio)
+    current_value = sum(current_prices.get(symbol, 0) * shares for symbol, shares, entry_price, invested in portfolio)
     total_value = current_value + (starting_funds - total_invested)
     roi = ((total_value - starting_funds) / starting_funds) * 100 if starting_funds > 0 else 0
     return round(roi, 2)
@@ -75,9 +275,10 @@ async def investor(ctx, starting_funds):
             if starting_funds <= 0:
                 await ctx.send(f"⚠️ {ctx.author.mention}, starting funds must be greater than 0.")
                 return
+            # Store the user first so a busy pool can't leave a role without an account
+            await run_db(db.add_user, ctx.author.id, ctx.author.name, starting_funds)
             await ctx.author.add_roles(role)
             await ctx.send(f"✅ {ctx.author.mention}, you are now an investor, escape the 9 to 5!")
-            db.add_user(ctx.author.id, ctx.author.name, starting_funds)
         except ValueError:
             await ctx.send(f"⚠️ {ctx.author.mention}, please provide a valid number for starting funds.")
     else:
@@ -90,16 +291,16 @@ async def stop_grinding(ctx):
         if role not in ctx.author.roles:
             await ctx.send(f"⚠️ {ctx.author.mention}, you are not an investor.")
             return
+        await run_db(db.remove_user, ctx.author.id)
         await ctx.author.remove_roles(role)
         await ctx.send(f"✅ {ctx.author.mention}, you are no longer an investor. Back to the trenches!")
-        db.remove_user(ctx.author.id)
     else:
         await ctx.send("⚠️ Investor role not found. Please contact an admin.")
 
 @bot.command()
 async def price(ctx, symbol):
     """Get the current market price of a stock."""
-    stock_price = yfMain.get_stock_price(symbol.upper())
+    stock_price = await run_io(yfMain.get_stock_price, symbol.upper())
     if stock_price is not None:
         await ctx.send(f"The current price of {symbol.upper()} is ${stock_price}")
     else:
@@ -109,11 +310,13 @@ async def price(ctx, symbol):
 @commands.has_role('Investor')
 async def get_funds(ctx):
     try:
-        funds = db.get_user_funds(ctx.author.id)
+        funds = await run_db(db.get_user_funds, ctx.author.id)
         if funds is not None:
             await ctx.send(f"💰 {ctx.author.mention}, your available funds are: ${funds}")
         else:
             await ctx.send(f" You are broke.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching funds: {e}")
 
@@ -121,8 +324,15 @@ async def get_funds(ctx):
 @commands.has_role('Investor')
 async def finBERTsays(ctx, symbol):
     try:
-        analysis = analyze_stock_headlines(symbol.upper())
+        # Download on the I/O pool so the single model worker only runs inference
+        headlines = await run_io(hns.get_stock_headlines, symbol.upper())
+        # Cached headlines are answered even while the model is still loading
+        analysis = await run_model(finbert.analyze_stock_headlines, symbol.upper(), headlines)
         await ctx.send(f"FinBERT Analysis loading for {symbol.upper()}:\n{analysis}")
+    except finbert.ModelLoadingError:
+        await ctx.send("⏳ FinBERT is still loading, please try again in a moment.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching FinBERT analysis for {symbol.upper()}: {e}")
 
@@ -130,20 +340,28 @@ async def finBERTsays(ctx, symbol):
 @commands.has_role('Investor')
 async def advice(ctx, symbol):
     try:
-        advice_text = investment_advice(symbol.upper())
+        advice_text = await run_io(investment_advice, symbol.upper())
         await ctx.send(f"Investment Advice for {symbol.upper()}:\n{advice_text}")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching investment advice for {symbol.upper()}: {e}")
 
 @bot.command()
 @commands.has_role('Investor')
-async def graph(ctx, symbol):
+async def graph(ctx, symbol, period: str = '1mo', interval: str = '1d'):
     try:
-        closing_prices, img_buffer = graph_closing_prices(symbol.upper())
-        if img_buffer is None:
+        if period not in chartRenderer.VALID_PERIODS or interval not in chartRenderer.VALID_INTERVALS:
+            await ctx.send(f"⚠️ Invalid period or interval. Periods: {', '.join(chartRenderer.VALID_PERIODS)}. "
+                           f"Intervals: {', '.join(chartRenderer.VALID_INTERVALS)}.")
+            return
+        png = await render_closing_chart(symbol.upper(), period, interval)
+        if png is None:
             await ctx.send("⚠️ Could not generate graph. Please check the symbol and try again.")
         else:
-            await ctx.send(file=discord.File(img_buffer, filename="graph.png"))
+            await ctx.send(file=discord.File(BytesIO(png), filename="graph.png"))
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error generating graph for {symbol.upper()}: {e}")
 
@@ -151,19 +369,19 @@ async def graph(ctx, symbol):
 @commands.has_role('Investor')
 async def buy_shares(ctx, symbol: str, shares: float):
     try:
-        current_price = yfMain.get_stock_price(symbol.upper())
+        current_price = await run_io(yfMain.get_stock_price, symbol.upper())
         if current_price is None:
             await ctx.send(f"⚠️ Could not fetch price for {symbol.upper()}. Please check the symbol and try again.")
             return
         total_cost = current_price * shares
-        user_funds = db.get_user_funds(ctx.author.id)
-        if user_funds is None or user_funds < total_cost:
-            await ctx.send(f"⚠️ Insufficient funds to buy {shares} shares of {symbol.upper()}. You need ${total_cost}, but have ${user_funds}.")
+        try:
+            await run_db(db.execute_buy, ctx.author.id, symbol.upper(), shares, current_price)
+        except db.InsufficientFundsError as e:
+            await ctx.send(f"⚠️ Insufficient funds to buy {shares} shares of {symbol.upper()}. You need ${total_cost}, but have ${e.available}.")
             return
-        db.update_user_funds(ctx.author.id, user_funds - total_cost)
-        db.add_to_portfolio(ctx.author.id, symbol.upper(), shares, current_price)
-        db.log_trade(ctx.author.id, symbol.upper(), 'buy', shares, current_price)
         await ctx.send(f"✅ Successfully bought {shares} shares of {symbol.upper()} at ${current_price} per share for a total of ${total_cost}.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error buying shares for {symbol.upper()}: {e}")
 
@@ -171,19 +389,19 @@ async def buy_shares(ctx, symbol: str, shares: float):
 @commands.has_role('Investor')
 async def buy_dollars(ctx, symbol: str, dollars: float):
     try:
-        current_price = yfMain.get_stock_price(symbol.upper())
+        current_price = await run_io(yfMain.get_stock_price, symbol.upper())
         if current_price is None:
             await ctx.send(f"⚠️ Could not fetch price for {symbol.upper()}. Please check the symbol and try again.")
             return
         shares_to_buy = dollars / current_price
-        user_funds = db.get_user_funds(ctx.author.id)
-        if user_funds is None or user_funds < dollars:
-            await ctx.send(f"⚠️ Insufficient funds to buy ${dollars} worth of {symbol.upper()}. You have ${user_funds}.")
+        try:
+            await run_db(db.execute_buy, ctx.author.id, symbol.upper(), shares_to_buy, current_price)
+        except db.InsufficientFundsError as e:
+            await ctx.send(f"⚠️ Insufficient funds to buy ${dollars} worth of {symbol.upper()}. You have ${e.available}.")
             return
-        db.update_user_funds(ctx.author.id, user_funds - dollars)
-        db.add_to_portfolio(ctx.author.id, symbol.upper(), shares_to_buy, current_price)
-        db.log_trade(ctx.author.id, symbol.upper(), 'buy', shares_to_buy, current_price)
         await ctx.send(f"✅ Successfully bought {shares_to_buy} shares of {symbol.upper()} at ${current_price} per share for a total of ${dollars}.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error buying shares for {symbol.upper()}: {e}")
 
@@ -191,26 +409,19 @@ async def buy_dollars(ctx, symbol: str, dollars: float):
 @commands.has_role('Investor')
 async def sell_shares(ctx, symbol: str, shares: float):
     try:
-        current_price = yfMain.get_stock_price(symbol.upper())
+        current_price = await run_io(yfMain.get_stock_price, symbol.upper())
         if current_price is None:
             await ctx.send(f"⚠️ Could not fetch price for {symbol.upper()}. Please check the symbol and try again.")
             return
-        portfolio = db.get_portfolio(ctx.author.id)
-        owned_shares = 0
-        for sym, sh, entry_price, total_invested in portfolio:
-            if sym == symbol.upper():
-                owned_shares = sh
-                break
-        if owned_shares < shares:
-            await ctx.send(f"⚠️ You do not own enough shares of {symbol.upper()} to sell {shares} shares. You own {owned_shares} shares.")
-            return
-        total_revenue = current_price * shares
-        user_funds = db.get_user_funds(ctx.author.id)
-        new_user_funds = user_funds + total_revenue
-        db.update_user_funds(ctx.author.id, new_user_funds)
-        db.sell_from_portfolio(ctx.author.id, symbol.upper(), shares, current_price)
-        db.log_trade(ctx.author.id, symbol.upper(), 'sell', shares, current_price)
+        try:
+            result = await run_db(db.execute_sell, ctx.author.id, symbol.upper(), shares, current_price)
+        except db.InsufficientSharesError as e:
+            await ctx.send(f"⚠️ You do not own enough shares of {symbol.upper()} to sell {shares} shares. You own {e.owned} shares.")
+            return
+        total_revenue = result['total']
         await ctx.send(f"✅ Successfully sold {shares} shares of {symbol.upper()} at ${current_price} per share for a total of ${total_revenue}.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error selling shares for {symbol.upper()}: {e}")
 
@@ -219,57 +430,194 @@ async def sell_shares(ctx, symbol: str, shares: float):
 async def sell_dollars(ctx, symbol: str, dollars: float):
     try:
         ticker = symbol.upper()
-        current_price = yfMain.get_stock_price(ticker)
+        current_price = await run_io(yfMain.get_stock_price, ticker)
         if current_price is None:
             await ctx.send(f"⚠️ Could not fetch price for {ticker}. Please check the symbol and try again.")
             return
         shares_to_sell = dollars /  current_price
-        portfolio = db.get_portfolio(ctx.author.id)
-        owned_shares = 0
-        for sym, sh, entry_price, total_invested in portfolio:
-            if sym == symbol.upper():
-                owned_shares = sh
-                break
-        if owned_shares < shares_to_sell:
-            await ctx.send(f"⚠️ You do not own enough shares of {ticker} to sell ${dollars} worth. You own {owned_shares} shares.")
-            return
-        total_revenue = current_price * shares_to_sell
-        user_funds = db.get_user_funds(ctx.author.id)
-        new_user_funds = user_funds + total_revenue
-        db.update_user_funds(ctx.author.id, new_user_funds)
-        db.sell_from_portfolio(ctx.author.id, ticker, shares_to_sell, current_price)
-        db.log_trade(ctx.author.id, ticker, 'sell', shares_to_sell, current_price)
+        try:
+            result = await run_db(db.execute_sell, ctx.author.id, ticker, shares_to_sell, current_price)
+        except db.InsufficientSharesError as e:
+            await ctx.send(f"⚠️ You do not own enough shares of {ticker} to sell ${dollars} worth. You own {e.owned} shares.")
+            return
+        total_revenue = result['total']
         await ctx.send(f"✅ Successfully sold {shares_to_sell} shares of {ticker} at ${current_price} per share for a total of ${total_revenue}.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error selling shares for {ticker}: {e}")
 
+async def place_order(ctx, side, order_type, symbol, shares, limit_price=None, stop_price=None):
+    ticker = symbol.upper()
+    try:
+        side = side.lower()
+        if side not in orderBook.ORDER_SIDES:
+            await ctx.send("⚠️ Order side must be 'buy' or 'sell'.")
+            return
+        if shares <= 0 or any(p is not None and p <= 0 for p in (limit_price, stop_price)):
+            await ctx.send("⚠️ Shares and prices must be greater than 0.")
+            return
+        current_price = (await get_prices([ticker])).get(ticker)
+        if current_price is None:
+            await ctx.send(f"⚠️ Could not fetch price for {ticker}. Please check the symbol and try again.")
+            return
+        order_id = await run_db(db.add_order, ctx.author.id, ticker, side, order_type, shares, limit_price, stop_price)
+        order = orderBook.Order(order_id, ctx.author.id, ticker, side, order_type, shares, limit_price, stop_price, False)
+        orderBook.book.add(order)
+        await ctx.send(f"📝 {ctx.author.mention}, order #{order_id} placed: {orderBook.describe(order)}. "
+                       f"{ticker} is at ${current_price}; you'll get a DM when it executes.")
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error placing order for {ticker}: {e}")
+
+@bot.command()
+@commands.has_role('Investor')
+async def limit_order(ctx, side: str, symbol: str, shares: float, limit_price: float):
+    await place_order(ctx, side, 'limit', symbol, shares, limit_price=limit_price)
+
+@bot.command()
+@commands.has_role('Investor')
+async def stop_order(ctx, side: str, symbol: str, shares: float, stop_price: float):
+    await place_order(ctx, side, 'stop', symbol, shares, stop_price=stop_price)
+
+@bot.command()
+@commands.has_role('Investor')
+async def stop_limit_order(ctx, side: str, symbol: str, shares: float, stop_price: float, limit_price: float):
+    await place_order(ctx, side, 'stop_limit', symbol, shares, limit_price=limit_price, stop_price=stop_price)
+
+@bot.command()
+@commands.has_role('Investor')
+async def my_orders(ctx):
+    try:
+        rows = await run_db(db.get_open_orders, ctx.author.id)
+        if not rows:
+            await ctx.send(f"📝 {ctx.author.mention}, you have no open orders.")
+            return
+        message = f"📝 {ctx.author.mention}, your open orders:\n"
+        for order_id, symbol, side, order_type, shares, limit_price, stop_price, status in rows:
+            order = orderBook.Order(order_id, ctx.author.id, symbol, side, order_type, shares,
+                                    limit_price, stop_price, status == 'triggered')
+            message += f"- #{order_id}: {orderBook.describe(order)}\n"
+        await ctx.send(message)
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error fetching orders: {e}")
+
+@bot.command()
+@commands.has_role('Investor')
+async def cancel_order(ctx, order_id: int):
+    try:
+        if not await run_db(db.cancel_order, ctx.author.id, order_id):
+            await ctx.send(f"⚠️ {ctx.author.mention}, you have no open order #{order_id}.")
+            return
+        orderBook.book.remove(order_id)
+        await ctx.send(f"✅ {ctx.author.mention}, order #{order_id} cancelled.")
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error cancelling order: {e}")
+
 @bot.command()
 @commands.has_role('Investor')
 async def portfolio(ctx):
     try:
-        portfolio = db.get_portfolio(ctx.author.id)
+        portfolio = await run_db(db.get_portfolio, ctx.author.id)
         if not portfolio:
             await ctx.send(f"📂 {ctx.author.mention}, your portfolio is empty.")
             return
+        current_prices = await get_prices([row[0] for row in portfolio])
         message = f"📂 {ctx.author.mention}, your portfolio:\n"
         for symbol, shares, entry_price, total_invested in portfolio:
-            message += f"- {symbol}: {shares} shares, Entry Price: ${round(entry_price, 2)}, Total Invested: ${round(total_invested, 2)}\n"
+            message += f"- {symbol}: {shares} shares, Entry Price: ${round(entry_price, 2)}, Total Invested: ${round(total_invested, 2)}"
+            if symbol in current_prices:
+                message += f", Current Price: ${current_prices[symbol]}, Value: ${round(shares * current_prices[symbol], 2)}"
+            message += "\n"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching portfolio: {e}")
 
+class TradeHistoryView(discord.ui.View):
+    """Newer/Older buttons for /trade_history.
+
+    The view keeps only the rows on screen; each button press reads the next
+    page from the keyset cursor at the edge of the current one.
+    """
+
+    def __init__(self, owner, rows, has_older):
+        super().__init__(timeout=TRADE_HISTORY_VIEW_TIMEOUT)
+        self.owner = owner
+        self.page = 1
+        self.message = None
+        self._show(rows, has_newer=False, has_older=has_older)
+
+    def _show(self, rows, has_newer, has_older):
+        self.rows = rows
+        self.newer.disabled = not has_newer
+        self.older.disabled = not has_older
+
+    def render(self):
+        message = f"📜 {self.owner.mention}, your trade history (page {self.page}):\n"
+        for trade_id, symbol, action, shares, price, timestamp in self.rows:
+            message += f"- {symbol}: {action} {shares} shares at ${price} on {timestamp}\n"
+        return message
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.owner.id:
+            await interaction.response.send_message("⚠️ Use `/trade_history` to page through your own trades.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label='◀ Newer', style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction, button):
+        trade_id, timestamp = self.rows[0][0], self.rows[0][5]
+        rows, has_more = await run_db(db.get_trade_history_page, self.owner.id, TRADE_HISTORY_PAGE_SIZE,
+                                      after=(timestamp, trade_id))
+        if rows:
+            self.page -= 1
+            self._show(rows, has_newer=has_more, has_older=True)
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    @discord.ui.button(label='Older ▶', style=discord.ButtonStyle.secondary)
+    async def older(self, interaction, button):
+        trade_id, timestamp = self.rows[-1][0], self.rows[-1][5]
+        rows, has_more = await run_db(db.get_trade_history_page, self.owner.id, TRADE_HISTORY_PAGE_SIZE,
+                                      before=(timestamp, trade_id))
+        if rows:
+            self.page += 1
+            self._show(rows, has_newer=True, has_older=has_more)
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    async def on_error(self, interaction, error, item):
+        message = ("⏳ The bot is busy right now, please try again in a moment." if isinstance(error, PoolBusyError)
+                   else f"⚠️ Error fetching trade history: {error}")
+        if not interaction.response.is_done():
+            await interaction.response.send_message(message, ephemeral=True)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
 @bot.command()
 @commands.has_role('Investor')
 async def trade_history(ctx):
     try:
-        trades = db.get_trade_history(ctx.author.id)
+        trades, has_older = await run_db(db.get_trade_history_page, ctx.author.id, TRADE_HISTORY_PAGE_SIZE)
         if not trades:
             await ctx.send(f"📜 {ctx.author.mention}, you have no trade history.")
             return
-        message = f"📜 {ctx.author.mention}, your trade history:\n"
-        for symbol, action, shares, price, timestamp in trades:
-            message += f"- {symbol}: {action} {shares} shares at ${price} on {timestamp}\n"
-        await ctx.send(message)
+        view = TradeHistoryView(ctx.author, trades, has_older)
+        view.message = await ctx.send(view.render(), view=view)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching trade history: {e}")
 
@@ -277,7 +625,7 @@ async def trade_history(ctx):
 @commands.has_role('Investor')
 async def get_info(ctx, symbol):
     try:
-        info = yfMain.get_stock_info(symbol.upper())
+        info = await run_io(yfMain.get_stock_info, symbol.upper())
         if info is None:
             await ctx.send(f"⚠️ Could not fetch info for {symbol.upper()}. Please check the symbol and try again.")
             return
@@ -285,6 +633,8 @@ async def get_info(ctx, symbol):
         for key, value in info.items():
             message += f"- {key}: {value}\n"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching stock info for {symbol.upper()}: {e}")
 
@@ -294,7 +644,7 @@ async def search_stocks(ctx, query, num_results: int = 10):
         if query.lower() not in ["popular", "sp500", "nasdaq100"]:
             await ctx.send("⚠️ Invalid query. Please use 'popular', 'sp500', or 'nasdaq100'.")
             return
-        symbols = yfMain.list_all_stocks(query.lower())
+        symbols = await run_io(yfMain.list_all_stocks, query.lower())
         if not symbols:
             await ctx.send(f"⚠️ No stocks found for query '{query}'.")
             return
@@ -305,26 +655,59 @@ async def search_stocks(ctx, query, num_results: int = 10):
         
         message = f"🔍 {num_results} stocks from '{query}':\n" + ", ".join(symbols)
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error searching stocks for query '{query}': {e}")
 
 @bot.command()
-async def leaderboard(ctx):
+async def screen(ctx, universe: str = 'sp500', metric: str = 'sharpe', top_n: int = 10):
+    try:
+        universe, metric = universe.lower(), metric.lower()
+        if universe not in ["popular", "sp500", "nasdaq100"]:
+            await ctx.send("⚠️ Invalid universe. Please use 'popular', 'sp500', or 'nasdaq100'.")
+            return
+        if metric not in screener.METRICS:
+            await ctx.send(f"⚠️ Invalid metric. Please use one of: {', '.join(screener.METRICS)}.")
+            return
+        top_n = max(1, min(top_n, 25))
+        await ctx.send(f"🔎 Screening {universe} by {metric}...")
+        ranked = await run_io(screener.screen, universe, metric, top_n)
+        if not ranked:
+            await ctx.send(f"⚠️ No price history available for '{universe}'.")
+            return
+        message = f"🔎 **Top {len(ranked)} {universe} stocks by {metric} (1y):**\n"
+        for rank, (symbol, values) in enumerate(ranked, start=1):
+            message += (f"{rank}. {symbol} - Sharpe: {values['sharpe']} | Return: {values['return']}% | "
+                        f"Vol: {values['volatility']}% | Max DD: {values['drawdown']}% | Mom: {values['momentum']}%\n")
+        await ctx.send(message)
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error screening '{universe}': {e}")
+
+@bot.command()
+async def leaderboard(ctx, page: int = 1):
     try:
-        current_prices = generate_current_prices()
+        page = max(page, 1)
+        offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+        current_prices = await generate_current_prices()
         
         # Get leaderboard with current prices
-        leaderboard = db.get_leaderboard(current_prices)
+        leaderboard = await run_db(db.get_leaderboard, current_prices, LEADERBOARD_PAGE_SIZE, offset)
         if not leaderboard:
             await ctx.send("⚠️ No users found for leaderboard.")
             return
-        message = "🏆 **Leaderboard - Top Investors by Net Worth:**\n"
-        rank = 1
+        total_pages = -(-(await run_db(db.count_users)) // LEADERBOARD_PAGE_SIZE)
+        message = f"🏆 **Leaderboard - Top Investors by Net Worth (page {page}/{total_pages}):**\n"
+        rank = offset + 1
         for user_id, net_worth in leaderboard:
-            user = await bot.fetch_user(user_id)
+            user = await get_discord_user(user_id)
             message += f"{rank}. {user.name} - Net Worth: ${net_worth}\n"
             rank += 1
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching leaderboard: {e}")
 
@@ -332,27 +715,49 @@ async def leaderboard(ctx):
 @commands.has_role('Investor')
 async def networth(ctx):
     try:
-        current_prices = generate_current_prices()
-        net_worth = db.calculate_user_net_worth(ctx.author.id, current_prices)
+        current_prices = await price_snapshot(ctx.author.id)
+        net_worth = await run_db(db.calculate_user_net_worth, ctx.author.id, current_prices)
         if net_worth is None:
             await ctx.send(f"⚠️ Could not calculate net worth for {ctx.author.mention}.")
             return
         await ctx.send(f"💼 {ctx.author.mention}, your total net worth is: ${net_worth}")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error calculating net worth: {e}")
 
+@bot.command()
+@commands.has_role('Investor')
+async def networth_history(ctx, period: str = '1mo'):
+    try:
+        if period not in chartRenderer.VALID_PERIODS:
+            await ctx.send(f"⚠️ Invalid period. Periods: {', '.join(chartRenderer.VALID_PERIODS)}.")
+            return
+        png = await render_networth_chart(ctx.author.id, ctx.author.name, period)
+        if png is None:
+            await ctx.send(f"📉 {ctx.author.mention}, there is no net worth history for that period yet. "
+                           f"Snapshots are taken every few minutes.")
+        else:
+            await ctx.send(file=discord.File(BytesIO(png), filename="networth.png"))
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error generating net worth history: {e}")
+
 @bot.command()
 @commands.has_role('Investor')
 async def total_return(ctx):
     try:
-        current_prices = generate_current_prices()
-        user_networth = db.calculate_user_net_worth(ctx.author.id, current_prices)
-        starting_funds = db.get_user_starting_funds(ctx.author.id)
+        current_prices = await price_snapshot(ctx.author.id)
+        user_networth = await run_db(db.calculate_user_net_worth, ctx.author.id, current_prices)
+        starting_funds = await run_db(db.get_user_starting_funds, ctx.author.id)
         if user_networth is None or starting_funds is None:
             await ctx.send(f"⚠️ Could not calculate total return for {ctx.author.mention}.")
             return
         total_return = round(((user_networth - starting_funds) / starting_funds) * 100, 2)
         await ctx.send(f"📈 {ctx.author.mention}, your total return since becoming an investor is {total_return}%")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error calculating total return: {e}")
 
@@ -360,8 +765,10 @@ async def total_return(ctx):
 @commands.has_role('Investor')
 async def watchlist(ctx, symbol):
     try:
-        db.add_to_watchlist(ctx.author.id, symbol.upper())
+        await run_db(db.add_to_watchlist, ctx.author.id, symbol.upper())
         await ctx.send(f"✅ {ctx.author.mention}, {symbol.upper()} has been added to your watchlist.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error adding {symbol.upper()} to watchlist: {e}")
 
@@ -369,8 +776,10 @@ async def watchlist(ctx, symbol):
 @commands.has_role('Investor')
 async def unwatch(ctx, symbol):
     try:
-        db.remove_from_watchlist(ctx.author.id, symbol.upper())
+        await run_db(db.remove_from_watchlist, ctx.author.id, symbol.upper())
         await ctx.send(f"✅ {ctx.author.mention}, {symbol.upper()} has been removed from your watchlist.")
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error removing {symbol.upper()} from watchlist: {e}")
 
@@ -378,19 +787,82 @@ async def unwatch(ctx, symbol):
 @commands.has_role('Investor')
 async def my_watchlist(ctx):
     try:
-        symbols = db.get_watchlist(ctx.author.id)
+        symbols = await run_db(db.get_watchlist, ctx.author.id)
         if not symbols:
             await ctx.send(f"📃 {ctx.author.mention}, your watchlist is empty.")
             return
         await ctx.send(f"📃 {ctx.author.mention}, your watchlist is:\n" + "\n".join(symbols))
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching watchlist: {e}")
 
+@bot.command()
+@commands.has_role('Investor')
+async def alert(ctx, symbol, kind, value: float):
+    try:
+        symbol, kind = symbol.upper(), kind.lower()
+        if kind not in alertEngine.ALERT_KINDS:
+            await ctx.send("⚠️ Alert type must be 'above', 'below' or 'move'.")
+            return
+        if value <= 0:
+            await ctx.send("⚠️ Alert value must be greater than 0.")
+            return
+        current_price = (await get_prices([symbol])).get(symbol)
+        if current_price is None:
+            await ctx.send(f"⚠️ Could not fetch price for {symbol}. Please check the symbol and try again.")
+            return
+        if alertEngine.already_met(kind, value, current_price):
+            side = 'above' if kind == 'above' else 'below'
+            await ctx.send(f"⚠️ {symbol} is already at or {side} ${value} (now ${current_price}). "
+                           f"Alerts fire when the price crosses the level, so pick one {side} the current price.")
+            return
+        base_price = current_price if kind == 'move' else None
+        alert_id = await run_db(db.add_price_alert, ctx.author.id, symbol, kind, value, base_price)
+        new_alert = alertEngine.Alert(alert_id, ctx.author.id, symbol, kind, value, base_price)
+        alertEngine.engine.add(new_alert)
+        await ctx.send(f"🔔 {ctx.author.mention}, alert #{alert_id} set: {alertEngine.describe(new_alert)} (now ${current_price}). You'll get a DM when it triggers.")
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error setting alert for {symbol.upper()}: {e}")
+
+@bot.command()
+@commands.has_role('Investor')
+async def my_alerts(ctx):
+    try:
+        rows = await run_db(db.get_price_alerts, ctx.author.id)
+        if not rows:
+            await ctx.send(f"🔔 {ctx.author.mention}, you have no price alerts.")
+            return
+        message = f"🔔 {ctx.author.mention}, your price alerts:\n"
+        for alert_id, symbol, kind, threshold, base_price in rows:
+            message += f"- #{alert_id}: {alertEngine.describe(alertEngine.Alert(alert_id, ctx.author.id, symbol, kind, threshold, base_price))}\n"
+        await ctx.send(message)
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error fetching alerts: {e}")
+
+@bot.command()
+@commands.has_role('Investor')
+async def cancel_alert(ctx, alert_id: int):
+    try:
+        if not await run_db(db.remove_price_alert, ctx.author.id, alert_id):
+            await ctx.send(f"⚠️ {ctx.author.mention}, you have no alert #{alert_id}.")
+            return
+        alertEngine.engine.remove(alert_id)
+        await ctx.send(f"✅ {ctx.author.mention}, alert #{alert_id} cancelled.")
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        await ctx.send(f"⚠️ Error cancelling alert: {e}")
+
 @bot.command()
 @commands.has_role('Investor')
 async def get_best_trades(ctx, top_n: int = 5):
     try:
-        trades = db.get_best_trades(ctx.author.id, top_n)
+        trades = await run_db(db.get_best_trades, ctx.author.id, top_n)
         if not trades:
             await ctx.send(f"📜 {ctx.author.mention}, you have no trade history.")
             return
@@ -398,6 +870,8 @@ async def get_best_trades(ctx, top_n: int = 5):
         for symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp in trades:
             message += f"- {symbol}: Bought at ${entry_price}, Sold at ${sell_price}, Shares: {shares}, P/L: ${profit_loss} ({profit_loss_pct}%) on {timestamp}\n"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching best trades: {e}")
 
@@ -405,7 +879,7 @@ async def get_best_trades(ctx, top_n: int = 5):
 @commands.has_role('Investor')
 async def get_worst_trades(ctx, top_n: int = 5):
     try:
-        trades = db.get_worst_trades(ctx.author.id, top_n)
+        trades = await run_db(db.get_worst_trades, ctx.author.id, top_n)
         if not trades:
             await ctx.send(f"📜 {ctx.author.mention}, you have no trade history.")
             return
@@ -413,6 +887,8 @@ async def get_worst_trades(ctx, top_n: int = 5):
         for symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct, timestamp in trades:
             message += f"- {symbol}: Bought at ${entry_price}, Sold at ${sell_price}, Shares: {shares}, P/L: ${profit_loss} ({profit_loss_pct}%) on {timestamp}\n"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching worst trades: {e}")
 
@@ -420,27 +896,23 @@ async def get_worst_trades(ctx, top_n: int = 5):
 @commands.has_role('Investor')
 async def stats(ctx):
     try:
-        trades = db.get_trade_history(ctx.author.id)
-        if not trades:
-            await ctx.send(f"📊 You haven't made any trades yet.")
-            return
-        
-        completed_trades = db.get_best_trades(ctx.author.id, 999)  # Get all trades
-        if not completed_trades:
+        stats = await run_db(db.get_user_trade_stats, ctx.author.id)
+        if stats is None:
             await ctx.send(f"📊 You haven't completed any trades yet.")
             return
-        
-        total_trades = len(completed_trades)
-        winning_trades = sum(1 for t in completed_trades if t[4] > 0)  # profit_loss > 0
-        total_profit_loss = sum(t[4] for t in completed_trades)
-        win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-        
+
         message = f"📊 **Your Trading Stats:**\n"
-        message += f"Total Trades: {total_trades}\n"
-        message += f"Winning Trades: {winning_trades}\n"
-        message += f"Win Rate: {win_rate:.1f}%\n"
-        message += f"Total P&L: ${total_profit_loss:.2f}\n"
+        message += f"Total Trades: {stats['trade_count']}\n"
+        message += f"Winning Trades: {stats['wins']}\n"
+        message += f"Losing Trades: {stats['losses']}\n"
+        message += f"Win Rate: {stats['win_rate']:.1f}%\n"
+        message += f"Total P&L: ${stats['total_profit_loss']:.2f}\n"
+        message += f"Average Return per Trade: {stats['mean_pct']:.2f}% (std dev {stats['std_pct']:.2f}%)\n"
+        message += f"Best Trade: {stats['best_symbol']} {stats['best_pct']:.2f}%\n"
+        message += f"Worst Trade: {stats['worst_symbol']} {stats['worst_pct']:.2f}%\n"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error fetching stats: {e}")
 
@@ -454,15 +926,19 @@ async def check_portfolio(ctx, user: discord.Member):
         if not discord.utils.get(ctx.guild.roles, name = 'Investor') in user.roles:
             await ctx.send(f"⚠️ {user.mention} is not an investor.")
             return
-        portfolio = db.get_portfolio(user.id)
+        portfolio = await run_db(db.get_portfolio, user.id)
         if not portfolio:
             await ctx.send(f"📂 {user.mention}'s portfolio is empty.")
             return
+        current_prices = await get_prices([row[0] for row in portfolio])
         message = f"📂 {user.mention}'s portfolio:\n"
-        for symbol, shares, entry_price in portfolio:
+        for symbol, shares, entry_price, total_invested in portfolio:
             message += f"- {symbol}: {shares} shares at ${entry_price}\n"
-        message += f"\nTotal Net Worth: ${db.calculate_user_net_worth(user.id, generate_current_prices())}"
+        net_worth = await run_db(db.calculate_user_net_worth, user.id, current_prices)
+        message += f"\nTotal Net Worth: ${net_worth}"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error checking portfolio: {e}")
 
@@ -477,8 +953,8 @@ async def compare_portfolio(ctx, user: discord.Member):
             await ctx.send(f"⚠️ {user.mention} is not an investor.")
             return
         
-        user_portfolio = db.get_portfolio(ctx.author.id)
-        other_portfolio = db.get_portfolio(user.id)
+        user_portfolio = await run_db(db.get_portfolio, ctx.author.id)
+        other_portfolio = await run_db(db.get_portfolio, user.id)
         
         if not user_portfolio:
             await ctx.send(f"📂 {ctx.author.mention}, your portfolio is empty.")
@@ -487,58 +963,95 @@ async def compare_portfolio(ctx, user: discord.Member):
             await ctx.send(f"📂 {user.mention}'s portfolio is empty.")
             return
         
+        # One snapshot for both users, so shared symbols are fetched once and both sides see the same prices
+        current_prices = await get_prices([row[0] for row in user_portfolio + other_portfolio])
         message = f"📊 **Portfolio Comparison between {ctx.author.mention} and {user.mention}:**\n\n"
         
         message += f"**{ctx.author.mention}'s Portfolio:**\n"
-        for symbol, shares, entry_price in user_portfolio:
+        for symbol, shares, entry_price, total_invested in user_portfolio:
             message += f"- {symbol}: {shares} shares at ${entry_price}\n"
         
         message += f"\n**{user.mention}'s Portfolio:**\n"
-        for symbol, shares, entry_price in other_portfolio:
+        for symbol, shares, entry_price, total_invested in other_portfolio:
             message += f"- {symbol}: {shares} shares at ${entry_price}\n"
 
+        user_net_worth = await run_db(db.calculate_user_net_worth, ctx.author.id, current_prices)
+        other_net_worth = await run_db(db.calculate_user_net_worth, user.id, current_prices)
+        user_starting_funds = await run_db(db.get_user_starting_funds, ctx.author.id)
+        other_starting_funds = await run_db(db.get_user_starting_funds, user.id)
+
         message += f"\nTotal Net Worth:\n"
-        message += f"- {ctx.author.mention}: ${db.calculate_user_net_worth(ctx.author.id, generate_current_prices())}\n"
-        message += f"- {user.mention}: ${db.calculate_user_net_worth(user.id, generate_current_prices())}\n"
+        message += f"- {ctx.author.mention}: ${user_net_worth}\n"
+        message += f"- {user.mention}: ${other_net_worth}\n"
         message += f"- Return on Investment Comparison:\n"
-        message += f"- {ctx.author.mention}: {calculate_roi(user_portfolio, generate_current_prices(), db.get_user_starting_funds(ctx.author.id))}%\n"
-        message += f"- {user.mention}: {calculate_roi(other_portfolio, generate_current_prices(), db.get_user_starting_funds(user.id))}%\n"
+        message += f"- {ctx.author.mention}: {calculate_roi(user_portfolio, current_prices, user_starting_funds)}%\n"
+        message += f"- {user.mention}: {calculate_roi(other_portfolio, current_prices, other_starting_funds)}%\n"
         await ctx.send(message)
+    except PoolBusyError:
+        raise
     except Exception as e:
         await ctx.send(f"⚠️ Error comparing portfolios: {e}")
 
+@bot.command()
+async def bot_status(ctx):
+    model = finbert.model_status()
+    message = "🤖 **Bot Status:**\n"
+    message += f"- Time to ready: {time_to_ready:.1f}s\n" if time_to_ready is not None else "- Time to ready: n/a\n"
+    message += f"- FinBERT: {model['state']}"
+    if model['load_seconds'] is not None:
+        message += f" (loaded in {model['load_seconds']}s)"
+    if model['error']:
+        message += f" - {model['error']}"
+    cache = finbert.get_sentiment_cache_stats()
+    message += (f"\n- Sentiment cache: {cache['size']} headlines in memory, {cache['hit_rate']}% hit rate "
+                f"({cache['memory_hits']} memory, {cache['db_hits']} db, {cache['inferred']} inferred)")
+    message += "\n- Worker pools (queued/limit): " + ", ".join(
+        f"{name} {pending}/{limit}" for name, (pending, limit) in pool_status().items())
+    await ctx.send(message)
+
+def _format_ms(seconds):
+    return "n/a" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def bot_metrics(ctx, top_n: int = 5):
+    """Latency percentiles per command, upstream call and database function (admins only)."""
+    top_n = max(1, min(top_n, 15))
+    sections = (
+        ("Commands", 'command'),
+        ("Upstream calls", 'upstream'),
+        ("Database", 'db'),
+        ("Discord API", 'discord'),
+    )
+    message = "📈 **Bot Metrics** (count | mean | p50 | p95):\n"
+    for title, kind in sections:
+        rows = metrics.summary(kind, top_n)
+        if not rows:
+            continue
+        message += f"**{title}**\n"
+        for label, count, mean, p50, p95 in rows:
+            message += f"- {label}: {count} | {_format_ms(mean)} | {_format_ms(p50)} | {_format_ms(p95)}\n"
+    per_command = metrics.calls_per_command(top_n)
+    if per_command:
+        message += "**Calls per invocation** (upstream | db)\n"
+        for command, upstream, queries in per_command:
+            message += f"- {command}: {upstream:.1f} | {queries:.1f}\n"
+    errors = metrics.get_errors()
+    if errors:
+        message += "**Errors**: " + ", ".join(f"{command} {n}" for command, n in sorted(errors.items())) + "\n"
+    if len(message) > 2000:
+        message = message[:1990] + "\n..."
+    await ctx.send(message)
+
 @bot.command()
 async def help_investor(ctx):
-    help_message = """
-    📚 **Available Commands:**
-    - `/investor <starting_funds>`: Become an investor with specified starting funds.
-    - `/stop_grinding`: Remove investor role and data.
-    - `/price <symbol>`: Get current market price of a stock.
-    - `/get_funds`: Check your available funds.
-    - `/finBERTsays <symbol>`: Get FinBERT analysis of stock news.
-    - `/advice <symbol>`: Get investment advice for a stock.
-    - `/graph <symbol>`: Get a graph of closing prices for a stock.
-    - `/buy_shares <symbol> <shares>`: Buy a specific number of shares.
-    - `/buy_dollars <symbol> <dollars>`: Buy shares worth a specific dollar amount.
-    - `/sell_shares <symbol> <shares>`: Sell a specific number of shares.
-    - `/sell_dollars <symbol> <dollars>`: Sell shares worth a specific dollar amount.
-    - `/portfolio`: View your current portfolio.
-    - `/get_info <symbol>`: Get basic information about a stock.
-    - `/search_stocks <query> <num_results>`: Search for stocks by 'popular', 'sp500', or 'nasdaq100'. Num results is optional (default 10). Tells you random stocks from the selected category.
-    - `/trade_history`: View your trade history.
-    - `/leaderboard`: View the top investors by net worth. Displays top 5.
-    - `/networth`: Check your total net worth (funds + stock value).
-    - `/total_return`: Check your total return percentage since becoming an investor.
-    - `/watchlist <symbol>`: Add a stock to your watchlist.
-    - `/unwatch <symbol>`: Remove a stock from your watchlist.
-    - `/my_watchlist`: View your current watchlist.
-    - `/get_best_trades <top_n>`: View your top N best trades (default 5).
-    - `/get_worst_trades <top_n>`: View your top N worst trades (default 5).
-    - `/stats`: View your trading statistics. Caps out at reading 999 trades.
-    - `/check_portfolio @user`: View another investor's portfolio.
-    - `/compare_portfolio @user`: Compare your portfolio with another investor's portfolio.
-    """
-    await ctx.send(help_message)            
+    for message in helpText.help_messages():
+        await ctx.send(message)            
             
 
-bot.run(DISCORD_BOT_TOKEN)
\ No newline at end of file
+if __name__ == '__main__':
+    try:
+        bot.run(DISCORD_BOT_TOKEN)
+    finally:
+        shutdown_pools()
+        db.close_connections()
\ No newline at end of file
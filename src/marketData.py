@@ -0,0 +1,416 @@
+import csv
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import metrics
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 'yfinance' (live) or 'replay' (recorded files in REPLAY_DIR)
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'yfinance')
+REPLAY_DIR = os.getenv('REPLAY_DIR', os.path.join(PROJECT_ROOT, 'cache', 'replay'))
+# Recorded seconds replayed per wall-clock second
+REPLAY_SPEED = float(os.getenv('REPLAY_SPEED', '1'))
+# Epoch seconds in the recording to start from (default: its first quote)
+REPLAY_START = os.getenv('REPLAY_START')
+# When set, everything fetched from the provider is also saved here in replay format
+MARKET_DATA_RECORD_DIR = os.getenv('MARKET_DATA_RECORD_DIR')
+# Download threads yfinance may use within one multi-ticker request
+DOWNLOAD_THREADS = int(os.getenv('BULK_QUOTE_THREADS', '8'))
+
+# One record per bar; ts is the bar's start in epoch seconds (UTC)
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+
+def frame_to_bars(df):
+    """Convert one symbol's OHLCV frame into a BAR_DTYPE array."""
+    if df is None or df.empty:
+        return np.empty(0, dtype=BAR_DTYPE)
+    df = df.dropna(subset=['Close'])
+    index = df.index
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['ts'] = index.tz_convert('UTC').asi8 // 1_000_000_000
+    for field, column in COLUMNS.items():
+        bars[field] = df[column].to_numpy(dtype='f8') if column in df.columns else np.nan
+    return bars
+
+
+def bars_to_frame(bars):
+    """Inverse of frame_to_bars: a frame indexed by UTC timestamp."""
+    index = pd.to_datetime(np.asarray(bars['ts']), unit='s', utc=True)
+    return pd.DataFrame({column: np.asarray(bars[field]) for field, column in COLUMNS.items()}, index=index)
+
+
+def merge_bars(existing, new):
+    """Combine two bar arrays; bars from new replace any existing bars at the same or later time."""
+    if len(existing) == 0:
+        return new
+    if len(new) == 0:
+        return existing
+    if new['ts'][0] > existing['ts'][-1]:
+        return np.concatenate([existing, new])
+    # Overlap (or a backfill): keep existing bars outside new's range, new wins inside it
+    keep = (existing['ts'] < new['ts'][0]) | (existing['ts'] > new['ts'][-1])
+    merged = np.concatenate([existing[keep], new])
+    merged.sort(order='ts')
+    return merged
+
+
+class MarketDataProvider(ABC):
+    """Where quotes, bars, company info and headlines come from.
+
+    Implementations must define every method below (instantiating one that
+    doesn't raises TypeError). They return plain Python/pandas values and
+    raise on transport errors; callers decide how to report them.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def quote(self, symbol):
+        """Latest price for symbol, or None if there is none."""
+
+    @abstractmethod
+    def quotes(self, symbols):
+        """Latest prices for many symbols in one request, as {symbol: price} for those found."""
+
+    @abstractmethod
+    def bars(self, symbols, interval='1d', start=None, end=None):
+        """OHLCV bars from start up to (not including) end, in epoch seconds.
+
+        Returns:
+            {symbol: DataFrame} with Open/High/Low/Close/Volume columns and a UTC
+            DatetimeIndex, for the symbols that have data
+        """
+
+    @abstractmethod
+    def info(self, symbol):
+        """Company info as a dict (yfinance's Ticker.info keys), or None."""
+
+    @abstractmethod
+    def news(self, symbol, count=5):
+        """Up to count recent headline strings, newest first."""
+
+
+def _to_date(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance through yfinance."""
+
+    name = 'yfinance'
+
+    def __init__(self, threads=DOWNLOAD_THREADS):
+        self.threads = threads
+        # yf.download keeps its results in module-global state, so only one call may run
+        # at a time. Each call still fetches its tickers in parallel with yfinance's threads.
+        self._download_lock = threading.Lock()
+
+    def _download(self, symbols, **kwargs):
+        with self._download_lock:
+            data = yf.download(tickers=list(symbols), progress=False, auto_adjust=True,
+                               threads=min(self.threads, len(symbols)) if len(symbols) > 1 else False, **kwargs)
+        if data is None or data.empty:
+            return {}
+        if not isinstance(data.columns, pd.MultiIndex):
+            return {symbols[0]: data}
+        frames = {}
+        for symbol in data.columns.get_level_values(1).unique():
+            frame = data.xs(symbol, axis=1, level=1).dropna(how='all')
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+    def quote(self, symbol):
+        data = yf.Ticker(symbol).history(period='1d', interval='1m')
+        if data.empty:
+            return None
+        return float(data['Close'].iloc[-1])
+
+    def quotes(self, symbols):
+        prices = {}
+        for symbol, frame in self._download(symbols, period='1d', interval='1m').items():
+            closes = frame['Close'].dropna()
+            if not closes.empty:
+                prices[symbol] = float(closes.iloc[-1])
+        return prices
+
+    def bars(self, symbols, interval='1d', start=None, end=None):
+        kwargs = {'interval': interval}
+        if start is not None:
+            kwargs['start'] = _to_date(start)
+        else:
+            kwargs['period'] = 'max'
+        if end is not None:
+            kwargs['end'] = _to_date(end)
+        return self._download(symbols, **kwargs)
+
+    def info(self, symbol):
+        return yf.Ticker(symbol).info
+
+    def news(self, symbol, count=5):
+        headlines = []
+        for item in (yf.Ticker(symbol).news or [])[:count]:
+            # yfinance news items have different keys; try common ones
+            content = item.get('content') if isinstance(item.get('content'), dict) else item
+            title = content.get('title') or content.get('headline') or content.get('summary') or str(item)
+            if title:
+                headlines.append(title)
+        return headlines
+
+
+class ReplayProvider(MarketDataProvider):
+    """Replays a recording directory as if it were live, optionally faster than real time.
+
+    The recording holds quotes.csv (ts,symbol,price), bars/<SYMBOL>_<interval>.npy
+    (BAR_DTYPE), news.jsonl ({"ts", "symbol", "title"} per line) and info.json
+    ({symbol: info}). Replay starts at start (default: the first quote) and a
+    virtual clock advances speed recorded seconds per wall-clock second; only
+    data up to the virtual time is visible. Bar timestamps are shifted by a
+    constant so the replay start lines up with the wall clock, which keeps
+    period windows like '1y' meaningful. Lookups are a bisect over preloaded
+    lists, so quotes cost microseconds.
+    """
+
+    name = 'replay'
+
+    def __init__(self, directory=REPLAY_DIR, speed=REPLAY_SPEED, start=None):
+        self.directory = directory
+        self.speed = speed
+        self._quotes = {}  # symbol -> ([ts, ...], [price, ...]) sorted by ts
+        self._news = {}  # symbol -> ([ts, ...], [title, ...]) sorted by ts
+        self._bars = {}  # (symbol, interval) -> BAR_DTYPE array
+        self._lock = threading.Lock()
+        self._load_quotes()
+        self._load_news()
+        try:
+            with open(os.path.join(directory, 'info.json')) as f:
+                self._info = json.load(f)
+        except (OSError, ValueError):
+            self._info = {}
+
+        first_quote = min((ts[0] for ts, _ in self._quotes.values()), default=None)
+        self.start = float(start) if start is not None else (first_quote if first_quote is not None else time.time())
+        self.wall_start = time.time()
+        self.offset = int(self.wall_start - self.start)
+
+    def _load_quotes(self):
+        path = os.path.join(self.directory, 'quotes.csv')
+        if not os.path.exists(path):
+            return
+        with open(path, newline='') as f:
+            rows = sorted((float(ts), symbol, float(price)) for ts, symbol, price in csv.reader(f))
+        for ts, symbol, price in rows:
+            times, prices = self._quotes.setdefault(symbol, ([], []))
+            times.append(ts)
+            prices.append(price)
+
+    def _load_news(self):
+        path = os.path.join(self.directory, 'news.jsonl')
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            items = sorted((float(item['ts']), item['symbol'], item['title'])
+                           for item in map(json.loads, filter(str.strip, f)))
+        for ts, symbol, title in items:
+            times, titles = self._news.setdefault(symbol, ([], []))
+            times.append(ts)
+            titles.append(title)
+
+    def now(self):
+        """Current position of the replay clock, in recorded epoch seconds."""
+        return self.start + (time.time() - self.wall_start) * self.speed
+
+    def _load_bars(self, symbol, interval):
+        key = (symbol, interval)
+        with self._lock:
+            if key not in self._bars:
+                path = os.path.join(self.directory, 'bars', f"{symbol}_{interval}.npy")
+                self._bars[key] = np.load(path) if os.path.exists(path) else np.empty(0, dtype=BAR_DTYPE)
+            return self._bars[key]
+
+    def quote(self, symbol):
+        now = self.now()
+        recorded = self._quotes.get(symbol)
+        if recorded is not None:
+            i = bisect_right(recorded[0], now) - 1
+            if i >= 0:
+                return recorded[1][i]
+        # No quote recorded yet: fall back to the last visible bar
+        for interval in ('1m', '1d'):
+            bars = self._load_bars(symbol, interval)
+            i = np.searchsorted(bars['ts'], now, side='right') - 1
+            if i >= 0:
+                return float(bars['close'][i])
+        return None
+
+    def quotes(self, symbols):
+        prices = {}
+        for symbol in symbols:
+            price = self.quote(symbol)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    def bars(self, symbols, interval='1d', start=None, end=None):
+        # start/end are wall-clock times; recorded bars are shifted onto that timeline
+        visible_until = self.now() + self.offset
+        end = visible_until if end is None else min(end, visible_until)
+        frames = {}
+        for symbol in symbols:
+            bars = self._load_bars(symbol, interval)
+            if len(bars) == 0:
+                continue
+            shifted = bars['ts'] + self.offset
+            first = np.searchsorted(shifted, start) if start is not None else 0
+            last = np.searchsorted(shifted, end, side='right')
+            window = bars[first:last].copy()
+            if len(window):
+                window['ts'] += self.offset
+                frames[symbol] = bars_to_frame(window)
+        return frames
+
+    def info(self, symbol):
+        return self._info.get(symbol)
+
+    def news(self, symbol, count=5):
+        times, titles = self._news.get(symbol, ([], []))
+        visible = bisect_right(times, self.now())
+        return titles[max(0, visible - count):visible][::-1]
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes calls through to another provider and saves the results in replay format."""
+
+    name = 'recording'
+
+    def __init__(self, inner, directory):
+        self.inner = inner
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._seen_news = set()
+        os.makedirs(os.path.join(directory, 'bars'), exist_ok=True)
+        try:
+            with open(os.path.join(directory, 'info.json')) as f:
+                self._info = json.load(f)
+        except (OSError, ValueError):
+            self._info = {}
+
+    def _record_quotes(self, prices):
+        now = time.time()
+        with self._lock, open(os.path.join(self.directory, 'quotes.csv'), 'a', newline='') as f:
+            csv.writer(f).writerows((now, symbol, price) for symbol, price in prices.items())
+
+    def quote(self, symbol):
+        price = self.inner.quote(symbol)
+        if price is not None:
+            self._record_quotes({symbol: price})
+        return price
+
+    def quotes(self, symbols):
+        prices = self.inner.quotes(symbols)
+        self._record_quotes(prices)
+        return prices
+
+    def bars(self, symbols, interval='1d', start=None, end=None):
+        frames = self.inner.bars(symbols, interval, start, end)
+        with self._lock:
+            for symbol, frame in frames.items():
+                path = os.path.join(self.directory, 'bars', f"{symbol}_{interval}.npy")
+                existing = np.load(path) if os.path.exists(path) else np.empty(0, dtype=BAR_DTYPE)
+                np.save(path, merge_bars(existing, frame_to_bars(frame)))
+        return frames
+
+    def info(self, symbol):
+        data = self.inner.info(symbol)
+        if data is not None:
+            with self._lock:
+                self._info[symbol] = data
+                with open(os.path.join(self.directory, 'info.json'), 'w') as f:
+                    json.dump(self._info, f, default=str)
+        return data
+
+    def news(self, symbol, count=5):
+        headlines = self.inner.news(symbol, count)
+        now = time.time()
+        with self._lock, open(os.path.join(self.directory, 'news.jsonl'), 'a') as f:
+            for title in headlines:
+                if (symbol, title) not in self._seen_news:
+                    self._seen_news.add((symbol, title))
+                    f.write(json.dumps({'ts': now, 'symbol': symbol, 'title': title}) + '\n')
+        return headlines
+
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'replay': ReplayProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def create_provider(name=MARKET_DATA_PROVIDER, record_dir=MARKET_DATA_RECORD_DIR):
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown market data provider: {name}. Use one of: {', '.join(PROVIDERS)}")
+    provider = ReplayProvider(start=REPLAY_START) if name == 'replay' else PROVIDERS[name]()
+    if record_dir:
+        provider = RecordingProvider(provider, record_dir)
+    return provider
+
+
+def get_provider():
+    """The process-wide provider, created from the environment on first use."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_provider()
+            print(f"Market data provider: {_provider.name}")
+        return _provider
+
+
+def set_provider(provider):
+    """Swap the process-wide provider, e.g. for a replay or a test double."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+@metrics.timed('upstream', 'marketData.quote')
+def quote(symbol):
+    return get_provider().quote(symbol)
+
+@metrics.timed('upstream', 'marketData.quotes')
+def quotes(symbols):
+    return get_provider().quotes(symbols)
+
+@metrics.timed('upstream', 'marketData.bars')
+def bars(symbols, interval='1d', start=None, end=None):
+    return get_provider().bars(symbols, interval, start, end)
+
+@metrics.timed('upstream', 'marketData.info')
+def info(symbol):
+    return get_provider().info(symbol)
+
+@metrics.timed('upstream', 'marketData.news')
+def news(symbol, count=5):
+    return get_provider().news(symbol, count)
@@ -0,0 +1,298 @@
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Serve Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics when METRICS_PORT is set
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('METRICS_PORT')
+# Write Prometheus text to METRICS_FILE every METRICS_FILE_INTERVAL seconds when set
+METRICS_FILE = os.getenv('METRICS_FILE')
+METRICS_FILE_INTERVAL = float(os.getenv('METRICS_FILE_INTERVAL', '15'))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# kind -> (metric name, label name, help text)
+FAMILIES = {
+    'command': ('bot_command_seconds', 'command', 'Latency of bot commands'),
+    'upstream': ('bot_upstream_seconds', 'call', 'Latency of market data and analytics calls'),
+    'db': ('bot_db_query_seconds', 'query', 'Latency of database functions'),
+    'discord': ('bot_discord_seconds', 'call', 'Latency of Discord API calls made by the bot'),
+    'upstream_per_command': ('bot_command_upstream_calls', 'command', 'Upstream calls per command invocation'),
+    'db_per_command': ('bot_command_db_queries', 'command', 'Database functions called per command invocation'),
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within the bucket that contains it."""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= target and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Invocation:
+    """Counts of instrumented calls made while handling one command."""
+
+    __slots__ = ('command', 'started', 'counts')
+
+    def __init__(self, command):
+        self.command = command
+        self.started = time.perf_counter()
+        self.counts = {'upstream': 0, 'db': 0}
+
+
+# The command being handled, if any. Worker pools copy the context into their
+# threads, so calls made there are attributed to the right invocation.
+_invocation = contextvars.ContextVar('invocation', default=None)
+# Kinds with an instrumented call in progress in this context. A call made
+# inside another of the same kind (e.g. fill_order -> execute_buy) still
+# records its latency but is not counted again towards the invocation.
+_active_kinds = contextvars.ContextVar('active_kinds', default=frozenset())
+
+
+class Registry:
+    def __init__(self):
+        self._histograms = {}  # (kind, label) -> Histogram
+        self._errors = {}  # command -> failed invocations
+        self._lock = threading.Lock()
+
+    def observe(self, kind, label, value, counted=True):
+        buckets = COUNT_BUCKETS if kind.endswith('_per_command') else LATENCY_BUCKETS
+        with self._lock:
+            histogram = self._histograms.get((kind, label))
+            if histogram is None:
+                histogram = self._histograms[(kind, label)] = Histogram(buckets)
+            histogram.observe(value)
+            invocation = _invocation.get()
+            if counted and invocation is not None and kind in invocation.counts:
+                invocation.counts[kind] += 1
+
+    def record_error(self, command):
+        with self._lock:
+            self._errors[command] = self._errors.get(command, 0) + 1
+
+    def snapshot(self):
+        """Copies of every histogram as {kind: {label: Histogram}} plus {command: errors}."""
+        with self._lock:
+            families = {}
+            for (kind, label), histogram in self._histograms.items():
+                copy = Histogram(histogram.buckets)
+                copy.counts, copy.sum, copy.count = list(histogram.counts), histogram.sum, histogram.count
+                families.setdefault(kind, {})[label] = copy
+            return families, dict(self._errors)
+
+
+registry = Registry()
+
+
+def start_invocation(command):
+    """Mark the start of a command in the current context. Returns a token for finish_invocation."""
+    invocation = Invocation(command)
+    return invocation, _invocation.set(invocation)
+
+
+def finish_invocation(token, failed=False):
+    invocation, context_token = token
+    registry.observe('command', invocation.command, time.perf_counter() - invocation.started)
+    registry.observe('upstream_per_command', invocation.command, invocation.counts['upstream'])
+    registry.observe('db_per_command', invocation.command, invocation.counts['db'])
+    if failed:
+        registry.record_error(invocation.command)
+    try:
+        _invocation.reset(context_token)
+    except ValueError:
+        pass  # Finished from a different context than it started in
+
+
+def _enter(kind, counted):
+    """Mark kind as in progress. Returns a token if this is the outermost counted call of kind, else None."""
+    if not counted:
+        return None
+    active = _active_kinds.get()
+    if kind in active:
+        return None
+    return _active_kinds.set(active | {kind})
+
+
+def _exit(kind, label, start, token):
+    registry.observe(kind, label, time.perf_counter() - start, token is not None)
+    if token is not None:
+        _active_kinds.reset(token)
+
+
+@contextmanager
+def track(kind, name, counted=True):
+    """Time the enclosed block as one call of name."""
+    token = _enter(kind, counted)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _exit(kind, name, start, token)
+
+
+def timed(kind, name=None, counted=True):
+    """Decorator recording each call's latency under kind ('upstream', 'db', 'discord').
+
+    name defaults to module.function. Only the outermost of nested calls of
+    the same kind counts towards the per-command call counts. counted=False
+    leaves the call out of them entirely, for wrappers whose cost is made of
+    calls that are already counted themselves.
+    """
+    def decorator(func):
+        label = name or f"{func.__module__}.{func.__name__}"
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = _enter(kind, counted)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _exit(kind, label, start, token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _enter(kind, counted)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _exit(kind, label, start, token)
+        return wrapper
+    return decorator
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    families, errors = registry.snapshot()
+    lines = []
+    for kind, (metric, label_name, help_text) in FAMILIES.items():
+        histograms = families.get(kind)
+        if not histograms:
+            continue
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for label, histogram in sorted(histograms.items()):
+            label_text = f'{label_name}="{_escape(label)}"'
+            cumulative = 0
+            for bound, n in zip(histogram.buckets, histogram.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{label_text}}} {histogram.sum}')
+            lines.append(f'{metric}_count{{{label_text}}} {histogram.count}')
+    if errors:
+        lines.append("# HELP bot_command_errors_total Command invocations that raised an error")
+        lines.append("# TYPE bot_command_errors_total counter")
+        for command, n in sorted(errors.items()):
+            lines.append(f'bot_command_errors_total{{command="{_escape(command)}"}} {n}')
+    return '\n'.join(lines) + '\n'
+
+
+def summary(kind, top_n=10):
+    """Slowest labels of a kind by total time as [(label, count, mean_s, p50_s, p95_s)]."""
+    families, _ = registry.snapshot()
+    histograms = families.get(kind, {})
+    ranked = sorted(histograms.items(), key=lambda item: item[1].sum, reverse=True)[:top_n]
+    return [(label, h.count, h.sum / h.count, h.quantile(0.5), h.quantile(0.95)) for label, h in ranked]
+
+
+def calls_per_command(top_n=10):
+    """Mean upstream calls and database functions per invocation as [(command, upstream, db)]."""
+    families, _ = registry.snapshot()
+    upstream = families.get('upstream_per_command', {})
+    queries = families.get('db_per_command', {})
+    rows = [(command, h.sum / h.count, queries[command].sum / queries[command].count if command in queries else 0.0)
+            for command, h in upstream.items()]
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top_n]
+
+
+def get_errors():
+    return registry.snapshot()[1]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would otherwise print a line each
+
+
+def write_metrics_file(path=METRICS_FILE):
+    """Write the current metrics to path atomically, for node_exporter's textfile collector."""
+    with open(path + '.tmp', 'w') as f:
+        f.write(render_prometheus())
+    os.replace(path + '.tmp', path)
+
+
+_exporters_started = False
+
+
+def start_exporters():
+    """Start the HTTP endpoint and/or file writer configured by METRICS_PORT and METRICS_FILE."""
+    global _exporters_started
+    if _exporters_started:
+        return
+    _exporters_started = True
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, int(METRICS_PORT)), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+            print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except (OSError, ValueError) as e:
+            print(f"Error starting metrics endpoint: {e}")
+    if METRICS_FILE:
+        def run():
+            while True:
+                try:
+                    write_metrics_file(METRICS_FILE)
+                except OSError as e:
+                    print(f"Error writing metrics file: {e}")
+                time.sleep(METRICS_FILE_INTERVAL)
+
+        threading.Thread(target=run, name='metrics-file', daemon=True).start()
@@ -0,0 +1,201 @@
+import heapq
+import threading
+from collections import namedtuple
+
+Order = namedtuple('Order', ['id', 'user_id', 'symbol', 'side', 'order_type', 'shares',
+                             'limit_price', 'stop_price', 'triggered'])
+
+ORDER_SIDES = ('buy', 'sell')
+ORDER_TYPES = ('limit', 'stop', 'stop_limit')
+
+# Rebuild a symbol's heaps once cancelled entries outnumber live ones (and there are at least this many)
+COMPACT_MIN_DEAD = 64
+
+
+def resting_level(order):
+    """Where an order rests as (book, level): 'rising' orders fire when the price
+    reaches level or higher, 'falling' orders when it reaches level or lower.
+
+    Limit buys and stop sells wait for the price to fall; limit sells and stop
+    buys wait for it to rise. A stop-limit rests at its stop until triggered
+    and at its limit afterwards.
+    """
+    if order.order_type == 'stop' or (order.order_type == 'stop_limit' and not order.triggered):
+        return ('rising' if order.side == 'buy' else 'falling'), order.stop_price
+    return ('falling' if order.side == 'buy' else 'rising'), order.limit_price
+
+
+def limit_reached(order, price):
+    if order.side == 'buy':
+        return price <= order.limit_price
+    return price >= order.limit_price
+
+
+class OrderBook:
+    """Resting limit, stop and stop-limit orders in per-symbol price-ordered heaps.
+
+    Each symbol has a min-heap of levels for orders that fire on a rising
+    price and a min-heap of negated levels for orders that fire on a falling
+    price, so the next order to fire is always at the top. Ties fill in order
+    id (placement) order. Placing an order is one heappush; cancelling only
+    drops it from the id map and its heap entry is skipped when it surfaces,
+    with the symbol's heaps rebuilt once dead entries dominate. A price tick
+    pops just the orders it fires, however many others rest on the symbol.
+    """
+
+    def __init__(self):
+        self._rising = {}  # symbol -> heap [(level, order_id)]
+        self._falling = {}  # symbol -> heap [(-level, order_id)]
+        self._orders = {}  # order_id -> Order
+        self._dead = {}  # symbol -> cancelled entries still in its heaps
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """Replace all orders with rows of (id, user_id, symbol, side, order_type, shares,
+        limit_price, stop_price, triggered)."""
+        with self._lock:
+            self._rising, self._falling, self._orders, self._dead = {}, {}, {}, {}
+            for row in rows:
+                order = Order(*row[:-1], bool(row[-1]))
+                self._orders[order.id] = order
+                book, level = resting_level(order)
+                if book == 'rising':
+                    self._rising.setdefault(order.symbol, []).append((level, order.id))
+                else:
+                    self._falling.setdefault(order.symbol, []).append((-level, order.id))
+            for heap in list(self._rising.values()) + list(self._falling.values()):
+                heapq.heapify(heap)
+
+    def _push(self, order):
+        # Caller must hold the lock
+        self._orders[order.id] = order
+        book, level = resting_level(order)
+        if book == 'rising':
+            heapq.heappush(self._rising.setdefault(order.symbol, []), (level, order.id))
+        else:
+            heapq.heappush(self._falling.setdefault(order.symbol, []), (-level, order.id))
+
+    def add(self, order):
+        with self._lock:
+            self._push(order)
+
+    def remove(self, order_id):
+        """Stop tracking an order. Returns the removed Order or None."""
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                return None
+            symbol = order.symbol
+            self._dead[symbol] = self._dead.get(symbol, 0) + 1
+            live = len(self._rising.get(symbol, ())) + len(self._falling.get(symbol, ())) - self._dead[symbol]
+            if self._dead[symbol] >= COMPACT_MIN_DEAD and self._dead[symbol] > live:
+                self._compact(symbol)
+            return order
+
+    def _compact(self, symbol):
+        # Caller must hold the lock
+        for books in (self._rising, self._falling):
+            heap = [entry for entry in books.get(symbol, ()) if entry[1] in self._orders]
+            if heap:
+                heapq.heapify(heap)
+                books[symbol] = heap
+            else:
+                books.pop(symbol, None)
+        self._dead.pop(symbol, None)
+
+    def _pop_fired(self, heap, symbol, fires):
+        # Caller must hold the lock. Pops entries while fires(top key) holds, skipping cancelled ones.
+        fired = []
+        while heap and fires(heap[0][0]):
+            _, order_id = heapq.heappop(heap)
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                self._dead[symbol] = max(self._dead.get(symbol, 0) - 1, 0)
+                continue
+            fired.append(order)
+        return fired
+
+    def match(self, prices):
+        """Match one tick of {symbol: price} against every resting order in a single pass.
+
+        Stop-limit orders whose stop is hit either fill straight away, if the
+        same price also satisfies their limit, or go back on the book as limit
+        orders.
+
+        Returns:
+            (fills, triggered): fills is a list of (Order, price) to execute and
+            triggered is a list of stop-limit Orders that now rest at their limit
+        """
+        fills, triggered = [], []
+        with self._lock:
+            for symbol, price in prices.items():
+                if price is None:
+                    continue
+                fired = []
+                rising = self._rising.get(symbol)
+                if rising:
+                    fired.extend(self._pop_fired(rising, symbol, lambda level: level <= price))
+                falling = self._falling.get(symbol)
+                if falling:
+                    fired.extend(self._pop_fired(falling, symbol, lambda neg_level: -neg_level >= price))
+
+                for order in fired:
+                    if order.order_type == 'stop_limit' and not order.triggered:
+                        order = order._replace(triggered=True)
+                        triggered.append(order)
+                        if not limit_reached(order, price):
+                            self._push(order)
+                            continue
+                    fills.append((order, price))
+
+                for books in (self._rising, self._falling):
+                    if symbol in books and not books[symbol]:
+                        del books[symbol]
+                if not self._rising.get(symbol) and not self._falling.get(symbol):
+                    self._dead.pop(symbol, None)
+        return fills, triggered
+
+    def restore(self, fills, triggered):
+        """Put orders returned by match() back on the book as they were before it,
+        for when recording the match in the database failed.
+
+        Stop-limit orders in triggered go back to resting at their stop; pass an
+        empty triggered once the database has recorded them as triggered.
+        """
+        with self._lock:
+            originals = {order.id: order for order, price in fills}
+            for order in triggered:
+                originals[order.id] = order._replace(triggered=False)
+                if self._orders.pop(order.id, None) is not None:
+                    # match() re-queued it at its limit; drop that entry so it can't fire there
+                    book, level = resting_level(order)
+                    if book == 'rising':
+                        books, entry = self._rising, (level, order.id)
+                    else:
+                        books, entry = self._falling, (-level, order.id)
+                    heap = books[order.symbol]
+                    heap.remove(entry)
+                    heapq.heapify(heap)
+                    if not heap:
+                        del books[order.symbol]
+            for order in originals.values():
+                self._push(order)
+
+    def count(self):
+        return len(self._orders)
+
+
+book = OrderBook()
+
+
+def describe(order):
+    name = order.order_type.replace('_', '-')
+    if order.order_type == 'limit':
+        prices = f"limit ${order.limit_price}"
+    elif order.order_type == 'stop':
+        prices = f"stop ${order.stop_price}"
+    else:
+        prices = f"stop ${order.stop_price}, limit ${order.limit_price}"
+        if order.triggered:
+            prices += ", stop triggered"
+    return f"{name} {order.side} {order.shares} {order.symbol} ({prices})"
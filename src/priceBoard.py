@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+
+import yfinanceMain as yfMain
+
+# How old a board price may be before commands fetch their own quote
+PRICE_MAX_AGE_MARKET_HOURS = float(os.getenv('PRICE_MAX_AGE_MARKET_HOURS', '60'))
+PRICE_MAX_AGE_AFTER_HOURS = float(os.getenv('PRICE_MAX_AGE_AFTER_HOURS', '1800'))
+
+
+def default_max_age():
+    return PRICE_MAX_AGE_MARKET_HOURS if yfMain.is_market_open() else PRICE_MAX_AGE_AFTER_HOURS
+
+
+class PriceBoard:
+    """Latest known price per symbol with the wall-clock time it was fetched.
+
+    The background poller publishes to it; commands read from it and only go
+    upstream for symbols that are missing or older than the staleness bound.
+    """
+
+    def __init__(self):
+        self._prices = {}  # symbol -> (price, updated_at)
+        self._lock = threading.Lock()
+        self.last_published_at = None
+
+    def publish(self, prices, updated_at=None):
+        updated_at = updated_at or time.time()
+        with self._lock:
+            for symbol, price in prices.items():
+                if price is not None:
+                    self._prices[symbol] = (price, updated_at)
+            self.last_published_at = updated_at
+
+    def get(self, symbol, max_age=None):
+        max_age = default_max_age() if max_age is None else max_age
+        entry = self._prices.get(symbol)
+        if entry is None or time.time() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def get_many(self, symbols, max_age=None):
+        """Split symbols into fresh board prices and ones that need fetching.
+
+        Returns:
+            (prices, missing) where prices is {symbol: price} and missing is a list of symbols
+        """
+        max_age = default_max_age() if max_age is None else max_age
+        cutoff = time.time() - max_age
+        prices, missing = {}, []
+        for symbol in dict.fromkeys(symbols):
+            entry = self._prices.get(symbol)
+            if entry is not None and entry[1] >= cutoff:
+                prices[symbol] = entry[0]
+            else:
+                missing.append(symbol)
+        return prices, missing
+
+    def size(self):
+        return len(self._prices)
+
+
+board = PriceBoard()
+
+
+def fetch_and_publish(symbols, use_cache=True):
+    """Fetch prices for symbols in bulk and publish them to the board. Returns {symbol: price}."""
+    prices, failures = yfMain.get_bulk_stock_prices(symbols, use_cache=use_cache)
+    if failures:
+        print(f"Could not fetch prices for: {', '.join(sorted(failures))}")
+    board.publish(prices)
+    return prices
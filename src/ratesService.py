@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+
+import marketData
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RATES_FILE = os.getenv('RATES_FILE', os.path.join(PROJECT_ROOT, 'cache', 'rates.json'))
+# Annual risk-free rate (as a fraction) used until a real one has been fetched
+RISK_FREE_RATE_FALLBACK = float(os.getenv('RISK_FREE_RATE_FALLBACK', '0.04'))
+RATES_REFRESH_SECONDS = float(os.getenv('RATES_REFRESH_SECONDS', str(24 * 3600)))
+# Seconds to wait after a failed refresh before trying again
+RATES_RETRY = 300
+
+# Yahoo tickers for Treasury yields, quoted in percent. 13w T-bills are the risk-free rate.
+YIELD_CURVE_TICKERS = {'13w': '^IRX', '5y': '^FVX', '10y': '^TNX', '30y': '^TYX'}
+RISK_FREE_TENOR = '13w'
+
+
+class RatesService:
+    """Treasury yields refreshed at most once per RATES_REFRESH_SECONDS and saved to disk.
+
+    Reads never wait on Yahoo: a stale value triggers a background refresh and
+    the last known rate (or the configured fallback) is returned immediately.
+    After a failed refresh, reads wait RATES_RETRY seconds before trying again.
+    """
+
+    def __init__(self, path=RATES_FILE, fallback=RISK_FREE_RATE_FALLBACK):
+        self.path = path
+        self.fallback = fallback
+        self._rates = {}  # tenor -> annual rate as a fraction
+        self._updated_at = 0.0
+        self._retry_at = 0.0  # time before which a failed refresh isn't retried
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            self._rates = saved['rates']
+            self._updated_at = saved['updated_at']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'rates': self._rates, 'updated_at': self._updated_at}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def refresh(self):
+        """Fetch the yield curve now, in one download. Keeps the old values on failure."""
+        try:
+            frames = marketData.bars(list(YIELD_CURVE_TICKERS.values()), '1d', start=time.time() - 7 * 86400)
+            rates = {}
+            for tenor, ticker in YIELD_CURVE_TICKERS.items():
+                if ticker in frames:
+                    series = frames[ticker]['Close'].dropna()
+                    if not series.empty:
+                        rates[tenor] = round(float(series.iloc[-1]) / 100, 5)
+            if RISK_FREE_TENOR not in rates:
+                raise ValueError(f"no data for {YIELD_CURVE_TICKERS[RISK_FREE_TENOR]}")
+        except Exception as e:
+            print(f"Error refreshing Treasury rates: {e}")
+            with self._lock:
+                self._retry_at = time.time() + RATES_RETRY
+            return False
+
+        with self._lock:
+            self._rates = rates
+            self._updated_at = time.time()
+            self._save()
+        return True
+
+    def is_stale(self):
+        return time.time() - self._updated_at >= RATES_REFRESH_SECONDS
+
+    def refresh_in_background(self):
+        """Start a refresh thread unless one is already running."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name='rates-refresh', daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_if_stale(self):
+        if self.is_stale() and time.time() >= self._retry_at:
+            self.refresh_in_background()
+
+    def get_rate(self, tenor=RISK_FREE_TENOR):
+        self._refresh_if_stale()
+        with self._lock:
+            return self._rates.get(tenor, self.fallback if tenor == RISK_FREE_TENOR else None)
+
+    def get_yield_curve(self):
+        self._refresh_if_stale()
+        with self._lock:
+            return dict(self._rates)
+
+
+rates = RatesService()
+
+
+def get_risk_free_rate():
+    """Annual risk-free rate as a fraction (13-week T-bill yield)."""
+    return rates.get_rate()
+
+def get_yield_curve():
+    """Latest Treasury yields by tenor, e.g. {'13w': 0.0512, '10y': 0.0431}."""
+    return rates.get_yield_curve()
@@ -0,0 +1,87 @@
+import numpy as np
+
+import historyStore
+import ratesService
+import yfinanceMain as yfMain
+
+PERIODS_PER_YEAR = 252
+# Momentum skips the most recent month (about 21 trading days), the usual 12-1 convention
+MOMENTUM_SKIP = 21
+
+# Metric name -> True if higher is better
+METRICS = {
+    'return': True,
+    'volatility': False,
+    'sharpe': True,
+    'drawdown': True,  # max drawdown is negative, so closer to 0 ranks higher
+    'momentum': True,
+}
+
+
+def compute_metrics(matrix, risk_free_rate=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """Compute every metric for every column of a (time x symbol) close-price matrix at once.
+
+    Returns:
+        dict of metric name -> 1-D array with one value per column (NaN where undefined)
+    """
+    n_rows, n_cols = matrix.shape
+    cols = np.arange(n_cols)
+    valid = ~np.isnan(matrix)
+    first_idx = np.argmax(valid, axis=0)
+    first = matrix[first_idx, cols]
+    last = matrix[-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rets = matrix[1:] / matrix[:-1] - 1
+        n_rets = np.sum(~np.isnan(rets), axis=0)
+
+        total_return = last / first - 1
+        annual_return = (1 + total_return) ** (periods_per_year / np.where(n_rets > 0, n_rets, np.nan)) - 1
+        volatility = np.nanstd(rets, axis=0, ddof=1) * np.sqrt(periods_per_year)
+        sharpe = (annual_return - risk_free_rate) / np.where(volatility > 0, volatility, np.nan)
+
+        running_max = np.fmax.accumulate(matrix, axis=0)
+        drawdown = np.nanmin(matrix / running_max - 1, axis=0)
+
+        skip_row = max(n_rows - 1 - MOMENTUM_SKIP, 0)
+        momentum = matrix[skip_row] / first - 1
+        momentum[first_idx >= skip_row] = np.nan
+
+    return {
+        'return': annual_return * 100,
+        'volatility': volatility * 100,
+        'sharpe': sharpe,
+        'drawdown': drawdown * 100,
+        'momentum': momentum * 100,
+    }
+
+
+def rank(symbols, metrics, metric, top_n=10):
+    """Top symbols by metric as [(symbol, {metric: value, ...}), ...], skipping NaNs."""
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric: {metric}. Use one of: {', '.join(METRICS)}")
+    values = metrics[metric]
+    order = np.argsort(-values if METRICS[metric] else values, kind='stable')
+    ranked = []
+    for j in order:
+        if np.isnan(values[j]):
+            continue
+        ranked.append((symbols[j], {name: round(float(metrics[name][j]), 2) for name in METRICS}))
+        if len(ranked) == top_n:
+            break
+    return ranked
+
+
+def screen(universe='sp500', metric='sharpe', top_n=10, period='1y'):
+    """Rank every stock in a universe ('popular', 'sp500', 'nasdaq100') by metric."""
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric: {metric}. Use one of: {', '.join(METRICS)}")
+    symbols = yfMain.list_all_stocks(universe)
+    if not symbols:
+        return []
+    historyStore.prefetch(symbols, period)
+    timestamps, columns, matrix = historyStore.get_close_matrix(symbols, period)
+    if not columns:
+        return []
+    metrics = compute_metrics(matrix, ratesService.get_risk_free_rate())
+    return rank(columns, metrics, metric, top_n)
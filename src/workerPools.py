@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class PoolBusyError(Exception):
+    """Raised when a pool already has as much queued work as it accepts."""
+
+    def __init__(self, pool_name):
+        super().__init__("the bot is busy right now, please try again in a moment")
+        self.pool_name = pool_name
+
+
+class WorkerPool:
+    """A bounded executor that blocking work can be awaited on from the event loop.
+
+    At most max_pending calls may be queued or running at once; anything beyond
+    that is rejected with PoolBusyError instead of growing the backlog.
+    """
+
+    def __init__(self, name, max_workers, max_pending, use_processes=False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix=f"{self.name}-worker")
+            return self._executor
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the pool and await its result."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolBusyError(self.name)
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.use_processes:
+                call = functools.partial(func, *args, **kwargs)
+            else:
+                # run_in_executor doesn't carry context variables over; copy them so
+                # calls made in the worker are attributed to the awaiting command
+                call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+            return await loop.run_in_executor(self._get_executor(), call)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+# Network calls to Yahoo / Wikipedia
+io_pool = WorkerPool('io', _env_int('IO_WORKERS', 8), _env_int('IO_MAX_PENDING', 64))
+# SQLite reads and writes
+db_pool = WorkerPool('db', _env_int('DB_WORKERS', 2), _env_int('DB_MAX_PENDING', 128))
+# FinBERT inference; torch already spreads one forward pass over several cores
+model_pool = WorkerPool('model', _env_int('MODEL_WORKERS', 1), _env_int('MODEL_MAX_PENDING', 8))
+# Pure CPU work (charting, number crunching) that benefits from separate processes.
+# Functions run here must be importable module-level functions with picklable arguments.
+cpu_pool = WorkerPool('cpu', _env_int('CPU_WORKERS', max(2, (os.cpu_count() or 2) // 2)),
+                      _env_int('CPU_MAX_PENDING', 16), use_processes=True)
+
+POOLS = (io_pool, db_pool, model_pool, cpu_pool)
+
+
+async def run_io(func, *args, **kwargs):
+    return await io_pool.run(func, *args, **kwargs)
+
+async def run_db(func, *args, **kwargs):
+    return await db_pool.run(func, *args, **kwargs)
+
+async def run_model(func, *args, **kwargs):
+    return await model_pool.run(func, *args, **kwargs)
+
+async def run_cpu(func, *args, **kwargs):
+    return await cpu_pool.run(func, *args, **kwargs)
+
+
+def pool_status():
+    """Current queue depth for each pool, e.g. {'io': (3, 64), ...}."""
+    return {pool.name: (pool.pending, pool.max_pending) for pool in POOLS}
+
+
+def shutdown_pools():
+    for pool in POOLS:
+        pool.shutdown()
@@ -1,32 +1,219 @@
-import yfinance as yf
-import pandas as pd
-import requests
-from io import StringIO
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as dtime
+from zoneinfo import ZoneInfo
+import indexConstituents
+import marketData
+import metrics
 
+# Quote cache settings (seconds / entries), overridable from the environment
+QUOTE_TTL_MARKET_HOURS = float(os.getenv('QUOTE_TTL_MARKET_HOURS', '15'))
+QUOTE_TTL_AFTER_HOURS = float(os.getenv('QUOTE_TTL_AFTER_HOURS', '300'))
+QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', '2048'))
 
-def get_stock_price(symbol):
-    """Get the current market price of a stock"""
+# Bulk quote settings: symbols per upstream request
+BULK_CHUNK_SIZE = int(os.getenv('BULK_QUOTE_CHUNK_SIZE', '100'))
+
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+
+def is_market_open(now=None):
+    """Return True during regular NYSE trading hours (holidays are not considered)."""
+    now = now or datetime.now(MARKET_TZ)
+    if now.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+class _Flight:
+    """An upstream fetch in progress that other callers can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class QuoteCache:
+    """Process-wide LRU cache of latest prices with market-hours aware TTLs.
+
+    Concurrent misses for the same symbol are coalesced so only one caller
+    goes upstream while the rest wait for its result.
+    """
+
+    def __init__(self, max_size=QUOTE_CACHE_SIZE, ttl_market=QUOTE_TTL_MARKET_HOURS,
+                 ttl_after_hours=QUOTE_TTL_AFTER_HOURS):
+        self.max_size = max_size
+        self.ttl_market = ttl_market
+        self.ttl_after_hours = ttl_after_hours
+        self._entries = OrderedDict()  # symbol -> (price, fetched_at)
+        self._inflight = {}  # symbol -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def ttl(self):
+        return self.ttl_market if is_market_open() else self.ttl_after_hours
+
+    def _lookup(self, symbol, now, ttl):
+        # Caller must hold the lock
+        entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        price, fetched_at = entry
+        if now - fetched_at >= ttl:
+            del self._entries[symbol]
+            return None
+        self._entries.move_to_end(symbol)
+        return price
+
+    def _store(self, symbol, price, now):
+        # Caller must hold the lock
+        self._entries[symbol] = (price, now)
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, symbol, price):
+        if price is None:
+            return
+        with self._lock:
+            self._store(symbol, price, time.monotonic())
+
+    def get(self, symbol):
+        """Return a fresh cached price or None, without going upstream."""
+        ttl = self.ttl()
+        with self._lock:
+            price = self._lookup(symbol, time.monotonic(), ttl)
+            if price is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return price
+
+    def get_or_fetch(self, symbol, fetch):
+        """Return the cached price for symbol, calling fetch(symbol) on a miss."""
+        ttl = self.ttl()
+        with self._lock:
+            price = self._lookup(symbol, time.monotonic(), ttl)
+            if price is not None:
+                self.hits += 1
+                return price
+            flight = self._inflight.get(symbol)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = _Flight()
+                self._inflight[symbol] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            return flight.result
+
+        try:
+            flight.result = fetch(symbol)
+        finally:
+            with self._lock:
+                if flight.result is not None:
+                    self._store(symbol, flight.result, time.monotonic())
+                self._inflight.pop(symbol, None)
+            flight.event.set()
+        return flight.result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'size': len(self._entries),
+                'hit_rate': round((self.hits + self.coalesced) / lookups * 100, 1) if lookups else 0.0,
+            }
+
+
+quote_cache = QuoteCache()
+
+
+def get_quote_cache_stats():
+    """Hit/miss counters for the shared quote cache."""
+    return quote_cache.stats()
+
+
+def _fetch_stock_price(symbol):
+    """Fetch the latest price for a stock from the market data provider, bypassing the cache."""
     try:
-        ticker = yf.Ticker(symbol)
-        # Get the most recent data
-        data = ticker.history(period='1d', interval='1m')
-        
-        if data.empty:
+        current_price = marketData.quote(symbol)
+        if current_price is None:
             return None
-        
-        current_price = data['Close'].iloc[-1]
         return round(current_price, 2)
     
     except Exception as e:
         print(f"Error fetching price for {symbol}: {e}")
         return None
+
+@metrics.timed('upstream', counted=False)
+def get_stock_price(symbol):
+    """Get the current market price of a stock"""
+    return quote_cache.get_or_fetch(symbol, _fetch_stock_price)
     
-def get_multiple_stock_prices(symbols):
+def _download_chunk(symbols):
+    """Fetch the latest prices for a chunk of symbols with a single provider request."""
+    return {symbol: round(price, 2) for symbol, price in marketData.quotes(symbols).items()}
+
+@metrics.timed('upstream', counted=False)
+def get_bulk_stock_prices(symbols, chunk_size=BULK_CHUNK_SIZE, use_cache=True):
+    """Get current prices for many stocks, batching upstream requests.
+
+    Cached quotes are served directly (unless use_cache is False); the rest are
+    fetched in chunks of at most chunk_size symbols per upstream request.
+
+    Returns:
+        (prices, failures) where prices is {symbol: price} and failures is
+        {symbol: reason} for every symbol that could not be priced
+    """
     prices = {}
-    for symbol in symbols:
-        price = get_stock_price(symbol)
-        prices[symbol] = price
-    return prices
+    failures = {}
+    missing = []
+    for symbol in dict.fromkeys(symbols):
+        cached = quote_cache.get(symbol) if use_cache else None
+        if cached is not None:
+            prices[symbol] = cached
+        else:
+            missing.append(symbol)
+
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        try:
+            chunk_prices = _download_chunk(chunk)
+        except Exception as e:
+            print(f"Error fetching prices for {len(chunk)} symbols: {e}")
+            for symbol in chunk:
+                failures[symbol] = str(e)
+            continue
+        for symbol in chunk:
+            price = chunk_prices.get(symbol)
+            if price is None:
+                failures[symbol] = 'no price data'
+            else:
+                prices[symbol] = price
+                quote_cache.put(symbol, price)
+
+    return prices, failures
+
+def get_multiple_stock_prices(symbols):
+    prices, failures = get_bulk_stock_prices(symbols)
+    return {symbol: prices.get(symbol) for symbol in symbols}
 
 def calculate_percentage_change(old_price, symbol):
     current_price = get_stock_price(symbol)
@@ -65,8 +252,9 @@ def calculate_stocks_to_price(num_stocks, symbol):
 def get_stock_info(symbol):
     """Get basic information about a stock"""
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = marketData.info(symbol)
+        if info is None:
+            return None
         data = {
             'symbol': symbol,
             'shortName': info.get('shortName', 'N/A'),
@@ -79,6 +267,7 @@ def get_stock_info(symbol):
             'open': info.get('open', 'N/A'),
             'dayHigh': info.get('dayHigh', 'N/A'),
             'dayLow': info.get('dayLow', 'N/A'),
+            'indices': ', '.join(indexConstituents.index_names(symbol)) or 'N/A',
         }
         return data
     except Exception as e:
@@ -94,54 +283,18 @@ def list_all_stocks(source: str = "popular", limit: int | None = None):
     """
     Return a list of stock symbols from:
       - "popular"  : small hardcoded list
-      - "sp500"    : S&P 500 constituents from Wikipedia
-      - "nasdaq100": Nasdaq-100 constituents from Wikipedia
+      - "sp500"    : S&P 500 constituents (cached from Wikipedia)
+      - "nasdaq100": Nasdaq-100 constituents (cached from Wikipedia)
     """
     source = (source or "popular").lower()
-    symbols = []
 
     if source == "popular":
         symbols = get_current_most_popular_stocks()
-
-    elif source == "sp500":
-        url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-        try:
-            headers = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0 Safari/537.36"}
-            resp = requests.get(url, headers=headers, timeout=10)
-            resp.raise_for_status()
-            tables = pd.read_html(StringIO(resp.text))
-            df = tables[0]
-            col = "Symbol" if "Symbol" in df.columns else df.columns[0]
-            symbols = df[col].astype(str).str.replace(".", "-", regex=False).tolist()
-        except Exception as e:
-            print("Failed to fetch S&P 500 list:", e)
-            symbols = []
-
-    elif source == "nasdaq100":
-        url = "https://en.wikipedia.org/wiki/Nasdaq-100"
-        try:
-            headers = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0 Safari/537.36"}
-            resp = requests.get(url, headers=headers, timeout=10)
-            resp.raise_for_status()
-            tables = pd.read_html(StringIO(resp.text))
-            df = None
-            for t in tables:
-                cols = [c.lower() for c in t.columns.astype(str)]
-                if any(x in cols for x in ("ticker", "ticker symbol", "symbol")):
-                    df = t
-                    break
-            if df is None:
-                df = tables[0]
-            possible = [c for c in df.columns if c.lower() in ("ticker", "ticker symbol", "symbol")]
-            col = possible[0] if possible else df.columns[0]
-            symbols = df[col].astype(str).str.replace(".", "-", regex=False).tolist()
-        except Exception as e:
-            print("Failed to fetch Nasdaq-100 list:", e)
-            symbols = []
-
+    elif source in indexConstituents.FETCHERS:
+        symbols = indexConstituents.get_constituents(source)
     else:
         raise ValueError(f"unknown source: {source}")
 
     if limit:
         return symbols[:limit]
-    return symbols
\ No newline at end of file
+    return symbols
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Keep imports from touching the real database or caches
+_SCRATCH = tempfile.mkdtemp(prefix='bot-tests-')
+os.environ.setdefault('DATABASE_PATH', os.path.join(_SCRATCH, 'user_data.db'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+@pytest.fixture
+def database(tmp_path):
+    """database.py pointed at a fresh, fully migrated file for one test."""
+    import database as db
+    db.close_connections()
+    db.DB_PATH = str(tmp_path / 'user_data.db')
+    db.init_db()
+    yield db
+    db.close_connections()
@@ -0,0 +1,81 @@
+from alertEngine import Alert, AlertEngine, already_met, trigger_levels
+
+
+def engine_with(*alerts):
+    engine = AlertEngine()
+    engine.load(alerts)
+    return engine
+
+
+def fired_ids(fired):
+    return sorted(alert.id for alert, price in fired)
+
+
+def test_above_alerts_fire_as_a_tail_slice_of_negated_levels():
+    engine = engine_with(
+        Alert(1, 1, 'AAPL', 'above', 110, None),
+        Alert(2, 1, 'AAPL', 'above', 120, None),
+        Alert(3, 1, 'AAPL', 'above', 105, None),
+    )
+    # Negated, the lowest upper level is the last entry, so firing is a tail slice
+    assert engine._upper['AAPL'] == [(-120, 2), (-110, 1), (-105, 3)]
+    assert engine.evaluate({'AAPL': 104.99}) == []
+    assert fired_ids(engine.evaluate({'AAPL': 110})) == [1, 3]
+    assert engine._upper['AAPL'] == [(-120, 2)]
+    assert fired_ids(engine.evaluate({'AAPL': 130})) == [2]
+    assert 'AAPL' not in engine._upper and engine.count() == 0
+
+
+def test_below_alerts_fire_at_or_under_their_level():
+    engine = engine_with(Alert(1, 1, 'AAPL', 'below', 90, None), Alert(2, 1, 'AAPL', 'below', 80, None))
+    assert engine.evaluate({'AAPL': 90.01}) == []
+    assert fired_ids(engine.evaluate({'AAPL': 85})) == [1]
+    assert fired_ids(engine.evaluate({'AAPL': 10})) == [2]
+
+
+def test_ticks_only_touch_their_own_symbol():
+    engine = engine_with(Alert(1, 1, 'AAPL', 'above', 110, None), Alert(2, 1, 'MSFT', 'above', 110, None))
+    assert fired_ids(engine.evaluate({'MSFT': 200, 'TSLA': 1, 'AAPL': None})) == [2]
+    assert engine.count() == 1
+
+
+def test_move_alert_fires_once_and_drops_its_other_side():
+    alert = Alert(1, 1, 'AAPL', 'move', 5, 100)
+    assert trigger_levels(alert) == (105, 95)
+    engine = engine_with(alert)
+    assert engine.evaluate({'AAPL': 96}) == []
+    assert fired_ids(engine.evaluate({'AAPL': 106})) == [1]
+    assert 'AAPL' not in engine._upper and 'AAPL' not in engine._lower
+    assert engine.evaluate({'AAPL': 90}) == []
+
+
+def test_removed_alert_leaves_no_levels_behind():
+    engine = engine_with(Alert(1, 1, 'AAPL', 'move', 10, 100), Alert(2, 1, 'AAPL', 'above', 200, None))
+    assert engine.remove(1).id == 1
+    assert engine.remove(1) is None
+    assert engine._upper['AAPL'] == [(-200, 2)] and 'AAPL' not in engine._lower
+    assert engine.evaluate({'AAPL': 80}) == []
+
+
+def test_alerts_already_past_their_level_are_recognised():
+    assert already_met('above', 100, 100) and already_met('above', 100, 120)
+    assert not already_met('above', 100, 99.99)
+    assert already_met('below', 100, 100) and already_met('below', 100, 80)
+    assert not already_met('below', 100, 100.01)
+    assert not already_met('move', 5, 100)
+
+
+def test_restore_brings_back_alerts_whose_delete_failed():
+    engine = engine_with(
+        Alert(1, 1, 'AAPL', 'above', 110, None),
+        Alert(2, 1, 'AAPL', 'move', 5, 100),
+        Alert(3, 1, 'AAPL', 'above', 150, None),
+    )
+    fired = engine.evaluate({'AAPL': 111})
+    assert fired_ids(fired) == [1, 2] and engine.count() == 1
+
+    # delete_price_alerts raised, so the alerts are still stored and must fire again
+    engine.restore(fired)
+    assert engine.count() == 3
+    assert engine._lower['AAPL'] == [(95, 2)]
+    assert fired_ids(engine.evaluate({'AAPL': 111})) == [1, 2]
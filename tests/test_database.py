@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+# The tables as they were before migrations were versioned (user_version 0)
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, join_date TIMESTAMP,
+                        total_funds REAL, starting_funds REAL);
+    CREATE TABLE portfolios (user_id INTEGER, symbol TEXT, shares REAL, entry_price REAL,
+                             total_invested REAL, PRIMARY KEY (user_id, symbol));
+    CREATE TABLE trades (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, symbol TEXT, action TEXT,
+                         shares REAL, price REAL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE trade_analytics (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, symbol TEXT,
+                                  entry_price REAL, sell_price REAL, shares REAL, profit_loss REAL,
+                                  profit_loss_pct REAL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE watchlist (user_id INTEGER, symbol TEXT, PRIMARY KEY (user_id, symbol));
+
+    INSERT INTO users VALUES (1, 'alice', '2024-01-01 00:00:00', 900, 1000);
+    INSERT INTO portfolios VALUES (1, 'AAPL', 2, 100, 200);
+    INSERT INTO trades (user_id, symbol, action, shares, price) VALUES (1, 'AAPL', 'buy', 3, 100);
+    INSERT INTO trades (user_id, symbol, action, shares, price) VALUES (1, 'AAPL', 'sell', 1, 120);
+    INSERT INTO trade_analytics (user_id, symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct)
+        VALUES (1, 'AAPL', 100, 120, 1, 20, 20);
+    INSERT INTO trade_analytics (user_id, symbol, entry_price, sell_price, shares, profit_loss, profit_loss_pct)
+        VALUES (1, 'MSFT', 200, 190, 1, -10, -5);
+    INSERT INTO watchlist VALUES (1, 'TSLA');
+'''
+
+
+def names(conn, kind):
+    return {row[0] for row in conn.execute('SELECT name FROM sqlite_master WHERE type = ?', (kind,))}
+
+
+def test_nested_transaction_joins_the_outer_one(database):
+    conn = database.get_connection()
+    with database.transaction(immediate=True) as outer:
+        outer.execute("INSERT INTO watchlist VALUES (1, 'AAPL')")
+        with database.transaction() as inner:
+            inner.execute("INSERT INTO watchlist VALUES (1, 'MSFT')")
+        # Leaving the inner block neither committed nor closed the outer transaction
+        assert conn.in_transaction
+    assert not conn.in_transaction
+    assert database.get_watchlist(1) == ['AAPL', 'MSFT']
+
+
+def test_outer_rollback_undoes_a_nested_trade(database):
+    database.add_user(1, 'alice', 1000)
+    with pytest.raises(RuntimeError):
+        with database.transaction(immediate=True):
+            database.execute_buy(1, 'AAPL', 2, 100)
+            assert database.get_user_funds(1) == 800
+            raise RuntimeError('abort')
+    assert database.get_user_funds(1) == 1000
+    assert database.get_portfolio(1) == []
+    assert database.get_trade_history(1) == []
+
+
+def test_failed_trade_leaves_no_partial_writes(database, monkeypatch):
+    database.add_user(1, 'alice', 1000)
+
+    def fail(*args):
+        raise sqlite3.OperationalError('disk I/O error')
+    # The cash debit and position upsert have already run when the trade log insert fails
+    monkeypatch.setattr(database, '_insert_trade', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        database.execute_buy(1, 'AAPL', 2, 100)
+    assert database.get_user_funds(1) == 1000
+    assert database.get_portfolio(1) == []
+
+
+def test_fill_order_rolls_back_the_trade_if_the_order_update_fails(database, monkeypatch):
+    database.add_user(1, 'alice', 1000)
+    order_id = database.add_order(1, 'AAPL', 'buy', 'limit', 2, limit_price=100)
+    execute_buy = database.execute_buy
+
+    def buy_then_fail(*args):
+        execute_buy(*args)
+        raise RuntimeError('crashed before the order was marked filled')
+    monkeypatch.setattr(database, 'execute_buy', buy_then_fail)
+    with pytest.raises(RuntimeError):
+        database.fill_order(order_id, 99)
+
+    assert database.get_user_funds(1) == 1000
+    assert database.get_portfolio(1) == []
+    status = database.get_connection().execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()
+    assert status == ('open',)
+
+
+def test_migrations_upgrade_a_baseline_database(tmp_path, monkeypatch):
+    import database
+    path = str(tmp_path / 'user_data.db')
+    baseline = sqlite3.connect(path)
+    baseline.executescript(BASELINE_SCHEMA)
+    baseline.close()
+
+    database.close_connections()
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    try:
+        assert database.get_schema_version() == 0
+        database.init_db()
+        conn = database.get_connection()
+        assert database.get_schema_version() == len(database.MIGRATIONS) == 4
+        assert {'orders', 'price_alerts', 'sentiment_cache', 'user_trade_stats', 'networth_history'} <= names(conn, 'table')
+        assert {'idx_trades_user_time', 'idx_trade_analytics_user_pct'} <= names(conn, 'index')
+        assert database.check_query_plans() == []
+
+        # Existing rows are untouched and the trade stats were backfilled from them
+        assert database.get_user_funds(1) == 900
+        assert [row[:2] for row in database.get_portfolio(1)] == [('AAPL', 2)]
+        assert len(database.get_trade_history(1)) == 2
+        assert database.get_watchlist(1) == ['TSLA']
+        stats = database.get_user_trade_stats(1)
+        assert (stats['trade_count'], stats['wins'], stats['losses']) == (2, 1, 1)
+        assert (stats['best_symbol'], stats['worst_symbol']) == ('AAPL', 'MSFT')
+        assert stats['mean_pct'] == pytest.approx(7.5)
+
+        # Running again is a no-op
+        schema = conn.execute('SELECT sql FROM sqlite_master ORDER BY name').fetchall()
+        database.migrate()
+        assert database.get_schema_version() == 4
+        assert conn.execute('SELECT sql FROM sqlite_master ORDER BY name').fetchall() == schema
+    finally:
+        database.close_connections()
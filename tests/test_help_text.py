@@ -0,0 +1,23 @@
+import helpText
+
+
+def test_every_help_message_fits_in_one_discord_message():
+    messages = helpText.help_messages()
+    assert len(messages) == len(helpText.HELP_SECTIONS)
+    for message in messages:
+        assert len(message) <= helpText.DISCORD_MESSAGE_LIMIT
+
+
+def test_help_lists_each_command_once():
+    commands = [line.split('`')[1].split()[0] for _, lines in helpText.HELP_SECTIONS for line in lines]
+    assert len(commands) == len(set(commands))
+
+
+def test_help_covers_every_bot_command():
+    import os
+    import re
+    with open(os.path.join(os.path.dirname(helpText.__file__), 'main.py'), encoding='utf-8') as f:
+        source = f.read()
+    defined = set(re.findall(r"@bot\.command\(\)\s*\n(?:@[^\n]*\n)*async def (\w+)\(", source)) - {'help_investor'}
+    listed = {line.split('`')[1].split()[0].lstrip('/') for _, lines in helpText.HELP_SECTIONS for line in lines}
+    assert defined == listed
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('yfinance')
+
+import historyStore
+
+
+def test_symbols_without_bars_are_not_downloaded_again_until_the_refresh(tmp_path, monkeypatch):
+    downloads = []
+
+    def no_bars(symbols, interval, start, end=None):
+        downloads.append(list(symbols))
+        return {}
+    monkeypatch.setattr(historyStore.marketData, 'bars', no_bars)
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(historyStore.time, 'time', lambda: now[0])
+    store = historyStore.HistoryStore(str(tmp_path))
+
+    store.prefetch(['DEAD', 'GONE'])
+    assert downloads == [['DEAD', 'GONE']]
+    store.prefetch(['DEAD', 'GONE'])
+    assert store.get_closes('DEAD').empty
+    assert len(downloads) == 1
+
+    # Once the refresh interval passes they are checked again, as an update
+    now[0] += historyStore.HISTORY_REFRESH_DAILY
+    store.prefetch(['DEAD', 'GONE'])
+    assert downloads[1:] == [['DEAD', 'GONE']]
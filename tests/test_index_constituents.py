@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('requests')
+
+import indexConstituents
+
+
+@pytest.fixture
+def offline_cache(tmp_path, monkeypatch):
+    """A constituent cache that only has the bundled snapshot and never refreshes."""
+    cache = indexConstituents.ConstituentCache(directory=str(tmp_path))
+    monkeypatch.setattr(cache, '_refresh_in_background', lambda index: None)
+    monkeypatch.setattr(indexConstituents, 'constituents', cache)
+    return cache
+
+
+def test_membership_comes_from_the_bundled_snapshot(offline_cache):
+    assert indexConstituents.is_constituent('sp500', 'AAPL')
+    assert not indexConstituents.is_constituent('sp500', 'NOT-A-TICKER')
+    with pytest.raises(ValueError):
+        indexConstituents.is_constituent('dow30', 'AAPL')
+
+
+def test_index_names_lists_every_index_containing_the_symbol(offline_cache):
+    assert indexConstituents.index_names('AAPL') == ['S&P 500', 'Nasdaq-100']
+    assert indexConstituents.index_names('NOT-A-TICKER') == []
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('yfinance')
+
+import marketData
+
+
+def test_concrete_providers_implement_the_whole_interface():
+    for provider in (marketData.YFinanceProvider, marketData.ReplayProvider, marketData.RecordingProvider):
+        assert not provider.__abstractmethods__
+
+
+def test_incomplete_provider_fails_at_construction():
+    class QuotesOnly(marketData.MarketDataProvider):
+        def quote(self, symbol):
+            return 1.0
+
+    with pytest.raises(TypeError):
+        QuotesOnly()
+
+
+def test_replay_only_shows_data_up_to_the_virtual_clock(tmp_path, monkeypatch):
+    (tmp_path / 'quotes.csv').write_text('100,AAA,1.5\n160,AAA,1.6\n100,BBB,9\n')
+    (tmp_path / 'news.jsonl').write_text(''.join(json.dumps(item) + '\n' for item in (
+        {'ts': 100, 'symbol': 'AAA', 'title': 'first'},
+        {'ts': 200, 'symbol': 'AAA', 'title': 'later'},
+        {'ts': 150, 'symbol': 'AAA', 'title': 'second'},
+    )))
+    clock = [1000.0]
+    monkeypatch.setattr(marketData.time, 'time', lambda: clock[0])
+    replay = marketData.ReplayProvider(str(tmp_path), speed=60)
+
+    assert replay.start == 100
+    assert replay.quotes(['AAA', 'BBB', 'CCC']) == {'AAA': 1.5, 'BBB': 9.0}
+    assert replay.news('AAA') == ['first']
+
+    clock[0] += 1  # 60 recorded seconds later
+    assert replay.quote('AAA') == 1.6
+    assert replay.news('AAA') == ['second', 'first']
+    assert replay.news('AAA', count=1) == ['second']
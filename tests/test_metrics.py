@@ -0,0 +1,68 @@
+import asyncio
+
+import metrics
+
+
+@metrics.timed('db', name='test.inner')
+def inner():
+    pass
+
+
+@metrics.timed('db', name='test.outer')
+def outer():
+    inner()
+    inner()
+
+
+@metrics.timed('db', name='test.wrapper', counted=False)
+def uncounted_wrapper():
+    inner()
+    inner()
+
+
+@metrics.timed('upstream', name='test.fetch')
+async def fetch():
+    await asyncio.sleep(0)
+    inner()
+
+
+def counts_during(func):
+    token = metrics.start_invocation('test_command')
+    invocation = token[0]
+    try:
+        func()
+    finally:
+        metrics.finish_invocation(token)
+    return invocation.counts
+
+
+def latency_count(label):
+    families, _ = metrics.registry.snapshot()
+    histogram = families['db'].get(label)
+    return histogram.count if histogram else 0
+
+
+def test_nested_calls_of_one_kind_count_once():
+    before = latency_count('test.inner')
+    assert counts_during(outer)['db'] == 1
+    # The nested calls still record their latency
+    assert latency_count('test.inner') == before + 2
+
+
+def test_sequential_calls_each_count():
+    assert counts_during(lambda: (inner(), outer(), inner()))['db'] == 3
+
+
+def test_uncounted_wrapper_leaves_its_calls_counted():
+    assert counts_during(uncounted_wrapper)['db'] == 2
+
+
+def test_track_and_async_calls_nest_the_same_way():
+    def run():
+        with metrics.track('db', 'test.block'):
+            inner()
+        asyncio.run(fetch())
+    counts = counts_during(run)
+    # A db call inside an upstream call is a different kind, so both count
+    assert counts == {'db': 2, 'upstream': 1}
+    assert metrics._active_kinds.get() == frozenset()
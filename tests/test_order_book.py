@@ -0,0 +1,155 @@
+import orderBook
+from orderBook import Order, OrderBook
+
+
+def make_order(order_id, side, order_type, limit_price=None, stop_price=None, symbol='AAPL', triggered=False):
+    return Order(order_id, 1, symbol, side, order_type, 1.0, limit_price, stop_price, triggered)
+
+
+def book_with(*orders):
+    book = OrderBook()
+    for order in orders:
+        book.add(order)
+    return book
+
+
+def filled_ids(fills):
+    return [order.id for order, price in fills]
+
+
+def test_limit_buy_fills_at_or_below_its_limit():
+    book = book_with(make_order(1, 'buy', 'limit', limit_price=100))
+    assert book.match({'AAPL': 100.01}) == ([], [])
+    fills, triggered = book.match({'AAPL': 100})
+    assert filled_ids(fills) == [1] and triggered == []
+    assert book.count() == 0
+
+
+def test_limit_sell_fills_at_or_above_its_limit():
+    book = book_with(make_order(1, 'sell', 'limit', limit_price=100))
+    assert book.match({'AAPL': 99.99}) == ([], [])
+    assert filled_ids(book.match({'AAPL': 105})[0]) == [1]
+
+
+def test_stop_buy_fires_on_a_rise_and_stop_sell_on_a_fall():
+    book = book_with(make_order(1, 'buy', 'stop', stop_price=110), make_order(2, 'sell', 'stop', stop_price=90))
+    assert book.match({'AAPL': 100}) == ([], [])
+    assert filled_ids(book.match({'AAPL': 111})[0]) == [1]
+    assert filled_ids(book.match({'AAPL': 89})[0]) == [2]
+
+
+def test_one_tick_fires_only_the_levels_it_reaches_in_id_order():
+    book = book_with(
+        make_order(3, 'buy', 'limit', limit_price=95),
+        make_order(1, 'buy', 'limit', limit_price=95),
+        make_order(2, 'buy', 'limit', limit_price=90),
+        make_order(4, 'buy', 'limit', limit_price=95, symbol='MSFT'),
+    )
+    assert filled_ids(book.match({'AAPL': 94})[0]) == [1, 3]
+    assert book.count() == 2
+
+
+def test_stop_limit_that_misses_its_limit_is_requeued_at_the_limit():
+    # Stop buy at 110, limit 112: a gap up to 115 triggers the stop but is above the limit
+    book = book_with(make_order(1, 'buy', 'stop_limit', limit_price=112, stop_price=110))
+    fills, triggered = book.match({'AAPL': 115})
+    assert fills == []
+    assert [order.id for order in triggered] == [1] and triggered[0].triggered
+
+    # Now resting as a limit buy at 112: 113 does nothing, 112 fills
+    assert book.match({'AAPL': 113}) == ([], [])
+    fills, triggered = book.match({'AAPL': 112})
+    assert filled_ids(fills) == [1] and fills[0][0].triggered
+    assert triggered == []
+
+
+def test_stop_limit_fills_immediately_when_the_trigger_price_meets_its_limit():
+    book = book_with(make_order(1, 'sell', 'stop_limit', limit_price=88, stop_price=90))
+    fills, triggered = book.match({'AAPL': 89})
+    assert filled_ids(fills) == [1]
+    assert [order.id for order in triggered] == [1]
+
+
+def test_loaded_triggered_stop_limit_rests_at_its_limit():
+    book = OrderBook()
+    book.load([(1, 1, 'AAPL', 'buy', 'stop_limit', 1.0, 112, 110, 1)])
+    assert book.match({'AAPL': 113}) == ([], [])  # Past the stop, but above the limit it now rests at
+    assert filled_ids(book.match({'AAPL': 112})[0]) == [1]
+
+
+def test_cancelled_orders_are_skipped_when_their_level_is_reached():
+    book = book_with(make_order(1, 'buy', 'limit', limit_price=100), make_order(2, 'buy', 'limit', limit_price=100))
+    assert book.remove(1).id == 1
+    assert book.remove(1) is None
+    assert filled_ids(book.match({'AAPL': 99})[0]) == [2]
+    # The tombstone was popped with the live order, so nothing is left for the symbol
+    assert 'AAPL' not in book._rising and 'AAPL' not in book._falling and 'AAPL' not in book._dead
+
+
+def test_heaps_are_compacted_once_tombstones_dominate():
+    n = orderBook.COMPACT_MIN_DEAD * 2
+    book = book_with(*(make_order(i, 'buy', 'limit', limit_price=100 - i * 0.01) for i in range(n)))
+    for i in range(n - 1):
+        book.remove(i)
+    heap = book._falling['AAPL']
+    # Compaction kept the dead entries well below the threshold and dropped them from the heap
+    assert book._dead.get('AAPL', 0) < orderBook.COMPACT_MIN_DEAD
+    assert len(heap) - book._dead.get('AAPL', 0) == 1
+    assert filled_ids(book.match({'AAPL': 1})[0]) == [n - 1]
+
+
+def test_fill_order_rejects_an_order_the_user_can_no_longer_cover(database):
+    database.add_user(1, 'alice', 1000)
+    buy = database.add_order(1, 'AAPL', 'buy', 'limit', 10, limit_price=200)
+    sell = database.add_order(1, 'MSFT', 'sell', 'limit', 5, limit_price=300)
+
+    result = database.fill_order(buy, 200)
+    assert result['status'] == 'rejected' and 'Insufficient funds' in result['reason']
+    result = database.fill_order(sell, 300)
+    assert result['status'] == 'rejected' and 'Not enough shares' in result['reason']
+
+    statuses = dict(database.get_connection().execute('SELECT id, status FROM orders').fetchall())
+    assert statuses == {buy: 'rejected', sell: 'rejected'}
+    assert database.get_user_funds(1) == 1000
+    assert database.get_portfolio(1) == []
+    # Rejected orders are no longer open, so a second fill attempt is a no-op
+    assert database.fill_order(buy, 1) is None
+
+
+def test_fill_order_fills_and_records_the_trade(database):
+    database.add_user(1, 'alice', 1000)
+    order_id = database.add_order(1, 'AAPL', 'buy', 'limit', 2, limit_price=100)
+    result = database.fill_order(order_id, 99)
+    assert result['status'] == 'filled'
+    assert database.get_user_funds(1) == 802
+    assert database.get_connection().execute(
+        'SELECT status, fill_price FROM orders WHERE id = ?', (order_id,)).fetchone() == ('filled', 99)
+    assert [row[:2] for row in database.get_portfolio(1)] == [('AAPL', 2)]
+
+
+def test_restore_puts_matched_orders_back_when_recording_them_fails():
+    book = book_with(
+        make_order(1, 'buy', 'limit', limit_price=100),
+        make_order(2, 'buy', 'stop_limit', limit_price=112, stop_price=110, symbol='MSFT'),
+        make_order(3, 'sell', 'stop_limit', limit_price=95, stop_price=100, symbol='TSLA'),
+    )
+    prices = {'AAPL': 99, 'MSFT': 115, 'TSLA': 99}
+    fills, triggered = book.match(prices)
+    assert filled_ids(fills) == [1, 3] and [order.id for order in triggered] == [2, 3]
+
+    # mark_orders_triggered raised, so nothing was recorded: back to resting at the stops
+    book.restore(fills, triggered)
+    assert book.count() == 3
+    assert not any(order.triggered for order in book._orders.values())
+    assert book._rising['MSFT'] == [(110, 2)] and 'MSFT' not in book._falling
+    assert book.match(prices) == (fills, triggered)
+
+
+def test_restore_after_a_failed_fill_keeps_recorded_triggers():
+    book = book_with(make_order(1, 'sell', 'stop_limit', limit_price=88, stop_price=90))
+    fills, triggered = book.match({'AAPL': 89})
+    # mark_orders_triggered succeeded but fill_orders raised (e.g. PoolBusyError)
+    book.restore(fills, [])
+    assert book.count() == 1 and book._orders[1].triggered
+    fills, triggered = book.match({'AAPL': 89})
+    assert filled_ids(fills) == [1] and triggered == []
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('yfinance')
+
+import ratesService
+
+
+def test_failed_refresh_is_not_retried_until_the_backoff_passes(tmp_path, monkeypatch):
+    downloads = []
+
+    def failing_bars(*args, **kwargs):
+        downloads.append(args)
+        raise ConnectionError('Yahoo is down')
+    monkeypatch.setattr(ratesService.marketData, 'bars', failing_bars)
+    # Refresh inline instead of in a thread so the count is deterministic
+    monkeypatch.setattr(ratesService.RatesService, 'refresh_in_background', ratesService.RatesService.refresh)
+    now = [1_000_000.0]
+    monkeypatch.setattr(ratesService.time, 'time', lambda: now[0])
+
+    rates = ratesService.RatesService(path=str(tmp_path / 'rates.json'), fallback=0.03)
+    assert rates.get_rate() == 0.03
+    assert rates.get_yield_curve() == {}
+    assert rates.get_rate() == 0.03
+    assert len(downloads) == 1
+
+    now[0] += ratesService.RATES_RETRY
+    rates.get_rate()
+    assert len(downloads) == 2
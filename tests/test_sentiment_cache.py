@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('yfinance')
+
+import finBERTAIlogic as finbert
+
+
+@pytest.fixture
+def fake_model(database, monkeypatch):
+    """An empty sentiment cache in front of a 'model' that records what it was asked."""
+    inferred = []
+
+    def analyze(texts):
+        inferred.extend(texts)
+        return [{"text": text, "sentiment": "positive", "confidence": 0.9} for text in texts]
+    monkeypatch.setattr(finbert, 'analyze_sentiment_batch', analyze)
+    monkeypatch.setattr(finbert, '_sentiment_cache', OrderedDict())
+    monkeypatch.setattr(finbert, '_sentiment_stats', {"memory_hits": 0, "db_hits": 0, "inferred": 0})
+    return inferred
+
+
+def test_headlines_are_inferred_once_then_served_from_the_cache(fake_model, monkeypatch):
+    headlines = ["Apple beats estimates", "  apple BEATS estimates ", "Apple cuts prices"]
+    results, stats = finbert.analyze_headlines_cached(headlines)
+    assert stats == {"memory_hits": 0, "db_hits": 0, "inferred": 2}
+    assert fake_model == ["Apple beats estimates", "Apple cuts prices"]
+    assert [r["sentiment"] for r in results] == ["positive"] * 3
+
+    # Stats count distinct headlines, and the two spellings above are one headline
+    results, stats = finbert.analyze_headlines_cached(headlines)
+    assert stats == {"memory_hits": 2, "db_hits": 0, "inferred": 0}
+
+    # A restart empties memory, but the SQLite table still answers
+    monkeypatch.setattr(finbert, '_sentiment_cache', OrderedDict())
+    results, stats = finbert.analyze_headlines_cached(headlines)
+    assert stats == {"memory_hits": 0, "db_hits": 2, "inferred": 0}
+    assert len(fake_model) == 2
+
+    totals = finbert.get_sentiment_cache_stats()
+    assert totals["inferred"] == 2 and totals["size"] == 2
+    assert totals["hit_rate"] == round(4 / 6 * 100, 1)
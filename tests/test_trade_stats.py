@@ -0,0 +1,59 @@
+import random
+import statistics
+
+import pytest
+
+
+def sell_rounds(database, rng, user_id, symbols, rounds):
+    """Buy and then sell each time at a random gain or loss, recording every return."""
+    returns = []
+    for _ in range(rounds):
+        symbol = rng.choice(symbols)
+        entry = round(rng.uniform(10, 200), 2)
+        exit_price = round(entry * rng.choice((rng.uniform(0.5, 0.99), rng.uniform(1.01, 1.8), 1.0)), 2)
+        database.execute_buy(user_id, symbol, 2, entry)
+        database.execute_sell(user_id, symbol, 2, exit_price)
+        returns.append((symbol, (exit_price - entry) / entry * 100, (exit_price - entry) * 2))
+    return returns
+
+
+def snapshot(database):
+    rows = database.get_connection().execute('''
+        SELECT user_id, trade_count, wins, losses, total_profit_loss, mean_pct, m2_pct,
+               best_pct, best_symbol, worst_pct, worst_symbol
+        FROM user_trade_stats ORDER BY user_id''').fetchall()
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows]
+
+
+def test_incremental_stats_match_the_trades(database):
+    rng = random.Random(7)
+    database.add_user(1, 'alice', 1_000_000)
+    trades = sell_rounds(database, rng, 1, ['AAPL', 'MSFT', 'TSLA'], 40)
+    pcts = [pct for _, pct, _ in trades]
+
+    stats = database.get_user_trade_stats(1)
+    assert stats['trade_count'] == 40
+    assert stats['wins'] == sum(pl > 0 for _, _, pl in trades)
+    assert stats['losses'] == sum(pl < 0 for _, _, pl in trades)
+    assert stats['total_profit_loss'] == pytest.approx(sum(pl for _, _, pl in trades))
+    assert stats['mean_pct'] == pytest.approx(statistics.fmean(pcts))
+    assert stats['std_pct'] == pytest.approx(statistics.stdev(pcts))
+    assert stats['best_pct'] == pytest.approx(max(pcts))
+    assert stats['worst_pct'] == pytest.approx(min(pcts))
+
+
+def test_rebuild_reproduces_the_incremental_stats(database):
+    rng = random.Random(11)
+    for user_id in (1, 2, 3):
+        database.add_user(user_id, f"user{user_id}", 1_000_000)
+        sell_rounds(database, rng, user_id, ['AAPL', 'MSFT', 'TSLA', 'KO'], 15 * user_id)
+    # Identical best returns on different symbols: both paths keep the earliest trade
+    database.add_user(4, 'tied', 10_000)
+    for symbol in ('MSFT', 'AAPL'):
+        database.execute_buy(4, symbol, 1, 100)
+        database.execute_sell(4, symbol, 1, 150)
+
+    incremental = snapshot(database)
+    database.rebuild_trade_stats()
+    assert snapshot(database) == incremental
+    assert database.get_user_trade_stats(4)['best_symbol'] == 'MSFT'
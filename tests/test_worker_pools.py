@@ -0,0 +1,49 @@
+import ast
+import asyncio
+import os
+import threading
+
+import pytest
+
+import workerPools
+from workerPools import PoolBusyError, WorkerPool
+
+
+def test_pool_rejects_work_beyond_its_queue_limit():
+    pool = WorkerPool('test', max_workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def run():
+        first = asyncio.ensure_future(pool.run(release.wait))
+        second = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0)
+        assert pool.pending == 2
+        with pytest.raises(PoolBusyError):
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+        assert pool.pending == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+
+def test_pool_status_reports_every_pool():
+    assert set(workerPools.pool_status()) == {'io', 'db', 'model', 'cpu'}
+
+
+def test_commands_let_pool_busy_errors_reach_the_error_handler():
+    with open(os.path.join(os.path.dirname(workerPools.__file__), 'main.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    commands = [node for node in tree.body if isinstance(node, ast.AsyncFunctionDef)
+                and any('command' in ast.unparse(decorator) for decorator in node.decorator_list)]
+    assert commands
+    for command in commands:
+        for node in ast.walk(command):
+            if not isinstance(node, ast.Try):
+                continue
+            caught = [ast.unparse(handler.type) if handler.type else 'BaseException' for handler in node.handlers]
+            if 'Exception' in caught:
+                assert 'PoolBusyError' in caught[:caught.index('Exception')], command.name